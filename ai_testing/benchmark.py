@@ -0,0 +1,292 @@
+"""
+Latency Benchmark - Percentile latency per style with regression gating
+
+Runs warmup + timed iterations of every style against the real Groq API or
+any OpenAI-compatible endpoint (--api-url, e.g. a local mock server), then
+reports p50/p95/p99 latency, tokens in/out and throughput per style.
+
+Results are saved as JSON so runs can be compared; with --baseline the run
+fails (exit code 1) when any style's latency regresses beyond --threshold.
+
+--compare-prompts alternates requests with the full system prompt and the
+per-style slice (build_system_prompt) and reports, per style, the prompt
+token reduction and the latency change.
+
+Usage:
+    python benchmark.py --iterations 20 --warmup 2
+    python benchmark.py --api-url http://127.0.0.1:8000/openai/v1/chat/completions
+    python benchmark.py --save-baseline output/benchmarks/baseline.json
+    python benchmark.py --baseline output/benchmarks/baseline.json --threshold 0.15
+    python benchmark.py --compare-prompts -i 10
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import requests
+
+from config import GROQ_API_KEY, GROQ_API_URL, GROQ_MODEL, OUTPUT_DIR, STYLES
+from promptstyler import style_payload
+from rate_limiter import estimate_tokens
+from response_cache import prompt_fingerprint
+from transport import post_chat, stream_chat, get_transport
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# A request that raises one of these is a failed sample, not the end of the run
+REQUEST_ERRORS = (requests.exceptions.RequestException,) + ((httpx.HTTPError,) if httpx is not None else ())
+
+BENCHMARK_DIR = f"{OUTPUT_DIR}/benchmarks"
+
+DEFAULT_PROMPTS = [
+    "help me write a python script that sorts a list of numbers",
+    "explain machine learning to a beginner",
+    "i need to create a todo app with tasks and due dates"
+]
+
+# Metrics compared against a baseline (lower is better)
+GATED_METRICS = ["p50_ms", "p95_ms", "p99_ms"]
+
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = min(max(1, math.ceil(pct / 100 * len(ordered))), len(ordered))
+    return ordered[rank - 1]
+
+
+def run_once(prompt: str, style: str, api_key: str, url: str, stream: bool, sliced: bool = None) -> dict:
+    """
+    One timed request, never retried (a retry would not be one latency sample).
+    Returns latency, token counts and (streaming) TTFT; a timeout or
+    connection error is returned as a sample with ok False.
+    """
+    start = time.perf_counter()
+    try:
+        return _timed_request(prompt, style, api_key, url, stream, sliced)
+    except REQUEST_ERRORS:
+        return {"ok": False, "latency": time.perf_counter() - start, "ttft": None, "tokens_in": 0, "tokens_out": 0}
+
+
+def _timed_request(prompt: str, style: str, api_key: str, url: str, stream: bool, sliced: bool) -> dict:
+    payload = style_payload(prompt, style, sliced)
+    # Only the real API needs the rate limiter; a local mock should be hit flat out
+    limited = url == GROQ_API_URL
+
+    if stream:
+        if limited:
+            response = stream_chat(payload, api_key, url=url, max_attempts=1)
+        else:
+            response = get_transport().stream(payload, api_key, url=url)
+        for _ in response:
+            pass
+        metrics = response.metrics()
+        usage = response.usage
+        sample = {"latency": metrics["total"], "ttft": metrics["ttft"]}
+    else:
+        if limited:
+            response = post_chat(payload, api_key, url=url, max_attempts=1)
+        else:
+            response = get_transport().post(payload, api_key, url=url)
+        usage = response.json().get("usage", {}) if response.status_code == 200 else {}
+        sample = {"latency": response.timing["total"], "ttft": response.timing["ttfb"]}
+
+    sample["ok"] = response.status_code == 200
+    sample["tokens_in"] = usage.get("prompt_tokens", 0)
+    sample["tokens_out"] = usage.get("completion_tokens", 0)
+    return sample
+
+
+def summarize(samples: list) -> dict:
+    ok = [s for s in samples if s["ok"]]
+    latencies = [s["latency"] * 1000 for s in ok]
+    ttfts = [s["ttft"] * 1000 for s in ok if s["ttft"] is not None]
+    busy = sum(s["latency"] for s in ok)
+    tokens_out = sum(s["tokens_out"] for s in ok)
+
+    def ms(value):
+        return round(value, 1) if value is not None else None
+
+    return {
+        "requests": len(samples),
+        "errors": len(samples) - len(ok),
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "mean_ms": ms(sum(latencies) / len(latencies)) if latencies else None,
+        "ttft_p50_ms": ms(percentile(ttfts, 50)),
+        "ttft_p95_ms": ms(percentile(ttfts, 95)),
+        "tokens_in_avg": round(sum(s["tokens_in"] for s in ok) / len(ok), 1) if ok else 0,
+        "tokens_out_avg": round(tokens_out / len(ok), 1) if ok else 0,
+        "tokens_per_sec": round(tokens_out / busy, 1) if busy else None,
+        "requests_per_sec": round(len(ok) / busy, 2) if busy else None
+    }
+
+
+def run_benchmark(styles: list, prompts: list, iterations: int, warmup: int,
+                  api_key: str, url: str, stream: bool = False) -> dict:
+    results = {}
+    for style in styles:
+        print(f"\n--- {style.upper()} ---")
+        for i in range(warmup):
+            run_once(prompts[i % len(prompts)], style, api_key, url, stream)
+
+        samples = []
+        for i in range(iterations):
+            sample = run_once(prompts[i % len(prompts)], style, api_key, url, stream)
+            samples.append(sample)
+            status = f"{sample['latency']*1000:.0f}ms" if sample["ok"] else "ERROR"
+            print(f"  [{i + 1}/{iterations}] {status}")
+
+        results[style] = summarize(samples)
+        r = results[style]
+        print(f"  p50 {r['p50_ms']}ms | p95 {r['p95_ms']}ms | p99 {r['p99_ms']}ms | "
+              f"{r['tokens_per_sec']} tok/s | errors {r['errors']}")
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "model": GROQ_MODEL,
+            "api_url": url,
+            "iterations": iterations,
+            "warmup": warmup,
+            "stream": stream,
+            "system_prompt": prompt_fingerprint()[:12],
+            "transport": get_transport().summary()
+        },
+        "styles": results
+    }
+
+
+def compare_prompts(styles: list, prompts: list, iterations: int, warmup: int,
+                    api_key: str, url: str, stream: bool = False) -> dict:
+    """
+    Full vs per-style system prompt. Requests alternate between the two so
+    drift in server latency affects both equally.
+    """
+    results = {}
+    for style in styles:
+        print(f"\n--- {style.upper()} ---")
+        for i in range(warmup):
+            run_once(prompts[i % len(prompts)], style, api_key, url, stream, sliced=False)
+            run_once(prompts[i % len(prompts)], style, api_key, url, stream, sliced=True)
+
+        samples = {"full": [], "sliced": []}
+        for i in range(iterations):
+            for variant in ("full", "sliced"):
+                samples[variant].append(run_once(prompts[i % len(prompts)], style, api_key, url, stream,
+                                                 sliced=variant == "sliced"))
+
+        full, sliced = summarize(samples["full"]), summarize(samples["sliced"])
+        tokens_full = estimate_tokens(style_payload(prompts[0], style, sliced=False))
+        tokens_sliced = estimate_tokens(style_payload(prompts[0], style, sliced=True))
+        change = None
+        if full["p50_ms"] and sliced["p50_ms"]:
+            change = round(sliced["p50_ms"] / full["p50_ms"] - 1, 3)
+        results[style] = {
+            "prompt_tokens_full": tokens_full,
+            "prompt_tokens_sliced": tokens_sliced,
+            "token_reduction": round(1 - tokens_sliced / tokens_full, 3),
+            "p50_full_ms": full["p50_ms"],
+            "p50_sliced_ms": sliced["p50_ms"],
+            "p50_change": change,
+            "full": full,
+            "sliced": sliced
+        }
+        r = results[style]
+        print(f"  prompt tokens {tokens_full} -> {tokens_sliced} (-{r['token_reduction']:.0%}) | "
+              f"p50 {r['p50_full_ms']}ms -> {r['p50_sliced_ms']}ms"
+              + (f" ({change:+.0%})" if change is not None else ""))
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "model": GROQ_MODEL,
+            "api_url": url,
+            "iterations": iterations,
+            "warmup": warmup,
+            "stream": stream,
+            "mode": "compare_prompts",
+            "system_prompt": prompt_fingerprint()[:12]
+        },
+        "styles": results
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """Return regressions as (style, metric, baseline, current) tuples."""
+    regressions = []
+    for style, stats in current["styles"].items():
+        base = baseline.get("styles", {}).get(style)
+        if not base:
+            continue
+        for metric in GATED_METRICS:
+            before, after = base.get(metric), stats.get(metric)
+            if before and after and after > before * (1 + threshold):
+                regressions.append((style, metric, before, after))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PromptStyler latency benchmark")
+    parser.add_argument("--styles", default=",".join(s["name"] for s in STYLES),
+                        help="Comma-separated styles (default: all)")
+    parser.add_argument("--prompts", help="File with one test prompt per line")
+    parser.add_argument("--iterations", "-i", type=int, default=10)
+    parser.add_argument("--warmup", "-w", type=int, default=1)
+    parser.add_argument("--api-url", default=GROQ_API_URL, help="OpenAI-compatible chat completions URL")
+    parser.add_argument("--stream", action="store_true", help="Measure over SSE (adds TTFT)")
+    parser.add_argument("--output", "-o", help="Result file (default: output/benchmarks/bench_<time>.json)")
+    parser.add_argument("--baseline", help="Baseline result file to gate against")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="Allowed slowdown vs baseline as a fraction (default 0.15 = 15%%)")
+    parser.add_argument("--save-baseline", help="Also write this run to the given baseline path")
+    parser.add_argument("--compare-prompts", action="store_true",
+                        help="Measure full vs per-style system prompt (tokens and latency per style)")
+    args = parser.parse_args()
+
+    api_key = GROQ_API_KEY or "mock"
+    if not GROQ_API_KEY and args.api_url == GROQ_API_URL:
+        print("ERROR: No API key found! Set GROQ_API_KEY or point --api-url at a mock server.")
+        sys.exit(2)
+
+    prompts = DEFAULT_PROMPTS
+    if args.prompts:
+        with open(args.prompts, "r", encoding="utf-8") as f:
+            prompts = [line.strip() for line in f if line.strip()]
+
+    styles = [s.strip() for s in args.styles.split(",") if s.strip()]
+    if args.compare_prompts:
+        report = compare_prompts(styles, prompts, args.iterations, args.warmup, api_key, args.api_url, args.stream)
+    else:
+        report = run_benchmark(styles, prompts, args.iterations, args.warmup, api_key, args.api_url, args.stream)
+
+    os.makedirs(BENCHMARK_DIR, exist_ok=True)
+    output = args.output or f"{BENCHMARK_DIR}/bench_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    for path in filter(None, [output, args.save_baseline]):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved to {path}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"\nREGRESSION (>{args.threshold:.0%} slower than {args.baseline}):")
+            for style, metric, before, after in regressions:
+                print(f"  {style:12} {metric:7} {before}ms -> {after}ms (+{(after / before - 1):.0%})")
+            sys.exit(1)
+        print(f"\nNo regressions vs {args.baseline} (threshold {args.threshold:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+# Columnar - Parquet / Arrow IPC copy of the training data
+# Rows live in a hive-partitioned dataset (style=.../category=.../part-*.parquet)
+# next to training_data.jsonl, so analytics are column scans instead of
+# json.loads over every line. JSONL stays the source of truth; `convert`
+# rebuilds the dataset from it at any time. Requires `pip install pyarrow`.
+#
+# Usage:
+#   python columnar.py convert                       # training_data.jsonl -> output/training_data/
+#   python columnar.py convert output/shards/ --format arrow
+#   python columnar.py stats
+
+import os
+import uuid
+import shutil
+import argparse
+from config import COLUMNAR_DIR, COLUMNAR_FORMAT, TRAINING_DATA_FILE
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+except ImportError:
+    pa = None
+
+PARTITIONING = ["style", "category"]
+FORMATS = {"parquet": ("parquet", "parquet"), "arrow": ("ipc", "arrow")}
+
+if pa is not None:
+    SCHEMA = pa.schema([
+        ("input", pa.string()),
+        ("output", pa.string()),
+        ("style", pa.string()),
+        ("label", pa.string()),
+        ("score", pa.float64()),
+        ("category", pa.string())
+    ])
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("Columnar storage needs pyarrow: pip install pyarrow")
+
+
+def _row(record: dict) -> dict:
+    return {
+        "input": record.get("input", ""),
+        "output": record.get("output", ""),
+        "style": record.get("style") or "unknown",
+        "label": record.get("label", "DONT"),
+        "score": float(record.get("score") or 0),
+        # Partition values can't be empty
+        "category": record.get("category") or "unknown"
+    }
+
+
+class ColumnarWriter:
+    """
+    Buffers training rows and writes them to the partitioned dataset in
+    batches of `batch_rows`, so each flush produces a few large files
+    instead of one tiny file per task. Call close() to write the rest.
+    """
+
+    def __init__(self, root: str = COLUMNAR_DIR, fmt: str = COLUMNAR_FORMAT, batch_rows: int = 5000):
+        _require_pyarrow()
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown columnar format {fmt!r}; use one of {', '.join(FORMATS)}")
+        self.root = root
+        self.format, self.extension = FORMATS[fmt]
+        self.batch_rows = batch_rows
+        self.rows = []
+        self.written = 0
+
+    def write(self, records: list):
+        self.rows.extend(_row(r) for r in records)
+        if len(self.rows) >= self.batch_rows:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        table = pa.Table.from_pylist(self.rows, schema=SCHEMA)
+        ds.write_dataset(
+            table, self.root, format=self.format,
+            partitioning=PARTITIONING, partitioning_flavor="hive",
+            basename_template=f"part-{uuid.uuid4().hex}-{{i}}.{self.extension}",
+            existing_data_behavior="overwrite_or_ignore"
+        )
+        self.written += len(self.rows)
+        self.rows = []
+
+    def close(self):
+        self.flush()
+
+
+def convert(inputs: list = None, root: str = COLUMNAR_DIR, fmt: str = COLUMNAR_FORMAT,
+            batch_rows: int = 50000) -> int:
+    """Rebuild the dataset at `root` from JSONL inputs (files, shard dirs, globs). Returns rows."""
+    from extract_examples import expand_inputs, iter_records
+
+    _require_pyarrow()
+    if os.path.isdir(root):
+        shutil.rmtree(root)
+
+    writer = ColumnarWriter(root, fmt, batch_rows)
+    batch = []
+    for record in iter_records(expand_inputs(inputs or [TRAINING_DATA_FILE])):
+        batch.append(record)
+        if len(batch) >= batch_rows:
+            writer.write(batch)
+            batch = []
+    writer.write(batch)
+    writer.close()
+
+    print(f"Wrote {writer.written} rows to {root} ({fmt})")
+    return writer.written
+
+
+def dataset_root(output_file: str) -> str:
+    """Dataset directory for a JSONL file: output/training_data.jsonl -> output/training_data."""
+    return os.path.splitext(output_file)[0]
+
+
+def detect_format(root: str) -> str:
+    """Format of an existing dataset, from its file extensions."""
+    for _, _, files in os.walk(root):
+        for name in files:
+            for fmt, (_, extension) in FORMATS.items():
+                if name.endswith("." + extension):
+                    return fmt
+    return COLUMNAR_FORMAT
+
+
+def load_dataset(root: str = COLUMNAR_DIR, fmt: str = None):
+    _require_pyarrow()
+    fmt = fmt or detect_format(root)
+    return ds.dataset(root, format=FORMATS[fmt][0], partitioning="hive")
+
+
+def is_dataset(path: str) -> bool:
+    """True for a directory written by ColumnarWriter (hive style=... partitions)."""
+    return os.path.isdir(path) and any(name.startswith("style=") for name in os.listdir(path))
+
+
+def iter_records(root: str = COLUMNAR_DIR, fmt: str = None, columns: list = None, filter=None):
+    """Yield rows as dicts, one record batch at a time."""
+    for batch in load_dataset(root, fmt).to_batches(columns=columns, filter=filter):
+        yield from batch.to_pylist()
+
+
+def label_counts_by_style(root: str = COLUMNAR_DIR, fmt: str = None) -> dict:
+    """{style: {"DO": n, "DONT": n}} from the style and label columns only."""
+    table = load_dataset(root, fmt).to_table(columns=["style", "label"])
+    grouped = table.group_by(["style", "label"]).aggregate([([], "count_all")])
+    counts = {}
+    for row in grouped.to_pylist():
+        counts.setdefault(row["style"], {"DO": 0, "DONT": 0})[row["label"]] = row["count_all"]
+    return counts
+
+
+def mean_score_by_category(root: str = COLUMNAR_DIR, fmt: str = None) -> dict:
+    """{category: mean score} from the category and score columns only."""
+    table = load_dataset(root, fmt).to_table(columns=["category", "score"])
+    grouped = table.group_by("category").aggregate([("score", "mean")])
+    return {row["category"]: round(row["score_mean"], 2) for row in grouped.to_pylist()}
+
+
+def summary(root: str = COLUMNAR_DIR, fmt: str = None) -> dict:
+    """Total, DO and DONT counts."""
+    labels = load_dataset(root, fmt).to_table(columns=["label"])["label"]
+    total = len(labels)
+    do_count = pc.sum(pc.equal(labels, "DO")).as_py() or 0
+    return {"total": total, "do": do_count, "dont": total - do_count}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Columnar (Parquet/Arrow) training data")
+    sub = parser.add_subparsers(dest="command", required=True)
+    conv = sub.add_parser("convert", help="Rebuild the dataset from JSONL")
+    conv.add_argument("inputs", nargs="*", help="JSONL files (.gz/.zst ok), shard directories or globs")
+    conv.add_argument("--format", choices=list(FORMATS), default=COLUMNAR_FORMAT)
+    conv.add_argument("--root", default=COLUMNAR_DIR)
+    stats = sub.add_parser("stats", help="DO/DONT by style and mean score by category")
+    stats.add_argument("--format", choices=list(FORMATS), help="Default: detected from the files")
+    stats.add_argument("--root", default=COLUMNAR_DIR)
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        convert(args.inputs, args.root, args.format)
+    else:
+        totals = summary(args.root, args.format)
+        print(f"Samples: {totals['total']} | DO: {totals['do']} | DONT: {totals['dont']}\n")
+        print("By style:")
+        for style, counts in sorted(label_counts_by_style(args.root, args.format).items()):
+            print(f"  {style:12} DO {counts['DO']:6} | DONT {counts['DONT']:6}")
+        print("\nMean score by category:")
+        for category, mean in sorted(mean_score_by_category(args.root, args.format).items()):
+            print(f"  {category:12} {mean}")
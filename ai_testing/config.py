@@ -8,11 +8,69 @@ import os
 # Set your API key as environment variable: GROQ_API_KEY
 # Get your free API key at: https://console.groq.com
 GROQ_API_KEY = os.environ.get("GROQ_API_KEY", "")
-GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
+# Several keys (comma-separated) enable sharded generation: pipeline.py --sharded
+GROQ_API_KEYS = [k.strip() for k in os.environ.get("GROQ_API_KEYS", "").split(",") if k.strip()] \
+    or ([GROQ_API_KEY] if GROQ_API_KEY else [])
+# Point at a local stand-in for offline load tests (see mock_groq.py)
+GROQ_API_URL = os.environ.get("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions")
 GROQ_MODEL = "llama-3.3-70b-versatile"
 
-# Rate limiting for Groq (14,400 requests/day = ~10 req/min to be safe)
-GROQ_DELAY_MS = 100  # Minimal delay, Groq is fast
+# Rate limiting for Groq - budgets for the shared token-bucket limiter
+# (rate_limiter.py). Free tier: 14,400 requests/day, 500K tokens/day.
+# The limiter tightens or loosens these from x-ratelimit-* response headers.
+# Override via env (e.g. GROQ_REQUESTS_PER_MINUTE=100000 against mock_groq.py).
+GROQ_REQUESTS_PER_MINUTE = int(os.environ.get("GROQ_REQUESTS_PER_MINUTE", "30"))
+GROQ_TOKENS_PER_MINUTE = int(os.environ.get("GROQ_TOKENS_PER_MINUTE", "12000"))
+GROQ_REQUESTS_PER_DAY = int(os.environ.get("GROQ_REQUESTS_PER_DAY", "14400"))
+GROQ_TOKENS_PER_DAY = int(os.environ.get("GROQ_TOKENS_PER_DAY", "500000"))
+
+# Connection pooling (transport.py) - keep-alive connections per host.
+# GROQ_HTTP2=1 switches to HTTP/2 when httpx[http2] is installed.
+GROQ_POOL_SIZE = int(os.environ.get("GROQ_POOL_SIZE", "16"))
+GROQ_HTTP2 = os.environ.get("GROQ_HTTP2", "") == "1"
+
+# ============================================
+# RETRIES (retry_policy.py)
+# ============================================
+# Every request is retried on 429 / 5xx / network errors with full-jitter
+# exponential backoff (or the server's retry-after, up to RETRY_AFTER_LIMIT
+# seconds; a longer one, like a daily quota reset, fails the request).
+# A run may retry at most RETRY_BUDGET_MIN + RETRY_BUDGET_RATIO x requests
+# sent. After CIRCUIT_FAILURES consecutive failures every worker pauses for
+# CIRCUIT_COOLDOWN seconds, then one probe request decides whether to resume.
+RETRY_MAX_ATTEMPTS = int(os.environ.get("PROMPTSTYLER_RETRY_ATTEMPTS", "4"))
+RETRY_BASE_DELAY = float(os.environ.get("PROMPTSTYLER_RETRY_BASE_DELAY", "1.0"))
+RETRY_MAX_DELAY = 30.0
+RETRY_AFTER_LIMIT = 120.0
+RETRY_BUDGET_RATIO = 0.2
+RETRY_BUDGET_MIN = 10
+CIRCUIT_FAILURES = 5
+CIRCUIT_COOLDOWN = float(os.environ.get("PROMPTSTYLER_CIRCUIT_COOLDOWN", "30"))
+
+# ============================================
+# TOKEN BUDGETS (token_budget.py)
+# ============================================
+# Requests are counted with the local tokenizer before sending; one whose
+# prompt + max_tokens would exceed the run budget or today's budget for its
+# key is refused (BudgetExceeded) and the run stops, resumable with --resume.
+# 0 = no limit. PROMPTSTYLER_RUN_TOKENS or pipeline.py --token-budget sets
+# the run budget.
+TOKEN_USAGE_PATH = "output/token_usage.sqlite"
+RUN_TOKEN_BUDGET = int(os.environ.get("PROMPTSTYLER_RUN_TOKENS", "0"))
+DAY_TOKEN_BUDGET = GROQ_TOKENS_PER_DAY
+# Completion cap per style: compact formats need far fewer tokens than CoT,
+# and a lower cap shortens worst-case generation time
+STYLE_MAX_TOKENS = {
+    "professional": 384,
+    "markdown": 768,
+    "json": 512,
+    "toon": 384,
+    "persona": 512,
+    "cot": 1024,
+    "fewshot": 768
+}
+DEFAULT_MAX_TOKENS = 1024
+GENERATE_MAX_TOKENS = 256   # one raw prompt is 10-100 words
 
 # ============================================
 # PROMPTSTYLER STYLES (from popup.js)
@@ -26,6 +84,10 @@ STYLES = [
     {"name": "cot", "description": "Chain-of-Thought with reasoning"},
     {"name": "fewshot", "description": "Pattern-based with examples"}
 ]
+# Send only the requested styles' sections of the system prompt
+# (shared/system_prompt.build_system_prompt). PROMPTSTYLER_SLICED_PROMPT=0
+# sends the full prompt, like the extension does.
+SLICED_SYSTEM_PROMPT = os.environ.get("PROMPTSTYLER_SLICED_PROMPT", "1") != "0"
 
 # ============================================
 # TASK CATEGORIES
@@ -47,9 +109,81 @@ TASK_CATEGORIES = {
 RATING_CRITERIA = ["clarity", "structure", "completeness", "style_compliance", "token_efficiency", "actionability"]
 DO_THRESHOLD = 7.0      # Score >= 7.0 = DO example
 DONT_THRESHOLD = 5.0    # Score < 5.0 = strong DON'T example
+# Outputs that fail a fatal local check (style_validators.py: invalid JSON or
+# TOON, no Markdown headers, no CoT Final Answer, ...) are labeled DONT without
+# a judge call. PROMPTSTYLER_VALIDATE=0 sends everything to the judge.
+LOCAL_VALIDATION = os.environ.get("PROMPTSTYLER_VALIDATE", "1") != "0"
+# Judge replies (judge_parser.py): requested in JSON mode unless
+# PROMPTSTYLER_JUDGE_JSON_MODE=0; a reply that does not parse is rewritten
+# by JUDGE_REPAIR_MODEL (PROMPTSTYLER_REPAIR_MODEL) instead of re-rated.
+JUDGE_JSON_MODE = os.environ.get("PROMPTSTYLER_JUDGE_JSON_MODE", "1") != "0"
+JUDGE_REPAIR_MODEL = os.environ.get("PROMPTSTYLER_REPAIR_MODEL", "llama-3.1-8b-instant")
+JUDGE_REPAIR_MAX_TOKENS = 200   # per rating in the reply
 
 # ============================================
 # OUTPUT PATHS
 # ============================================
 OUTPUT_DIR = "output"
 TRAINING_DATA_FILE = f"{OUTPUT_DIR}/training_data.jsonl"
+SHARD_DIR = f"{OUTPUT_DIR}/shards"
+# Columnar copy of the training data (columnar.py, needs pyarrow),
+# partitioned by style/category. Format: "parquet" or "arrow" (Arrow IPC).
+COLUMNAR_DIR = f"{OUTPUT_DIR}/training_data"
+COLUMNAR_FORMAT = os.environ.get("PROMPTSTYLER_COLUMNAR_FORMAT", "parquet")
+
+# ============================================
+# FEEDBACK LOOP (shared/feedback_store.py, pipeline.py --feedback-loop)
+# ============================================
+# Rated rows are stored like the extension stores user feedback (DO = thumbs
+# up, DONT = thumbs down); every styling request then gets the style's top
+# FEEDBACK_EXAMPLES positive examples appended to its system prompt.
+FEEDBACK_DB_PATH = f"{OUTPUT_DIR}/feedback.sqlite"
+FEEDBACK_EXAMPLES = 3
+
+# ============================================
+# SIMILAR EXAMPLES (example_index.py, pipeline.py --similar-examples)
+# ============================================
+# DO rows are embedded and indexed per style; each styling request gets the
+# EXAMPLE_K examples whose inputs are most similar to its own (at least
+# EXAMPLE_MIN_SIMILARITY cosine). EXAMPLE_EMBED_MODEL is a sentence-transformers
+# model, used when installed and already downloaded (it is never fetched);
+# "" = hashed TF-IDF only.
+EXAMPLE_INDEX_DIR = f"{OUTPUT_DIR}/example_index"
+EXAMPLE_EMBED_MODEL = os.environ.get("PROMPTSTYLER_EMBED_MODEL", "all-MiniLM-L6-v2")
+EXAMPLE_K = 3
+EXAMPLE_MIN_SIMILARITY = 0.2
+
+# ============================================
+# NEAR-DUPLICATE PROMPTS (dedup_index.py)
+# ============================================
+# Generated raw prompts at or above DEDUP_THRESHOLD estimated Jaccard
+# similarity to an earlier one are regenerated (up to DEDUP_MAX_ATTEMPTS)
+# before any styling call is made. PROMPTSTYLER_DEDUP=0 turns this off.
+DEDUP_ENABLED = os.environ.get("PROMPTSTYLER_DEDUP", "1") != "0"
+DEDUP_INDEX_PATH = f"{OUTPUT_DIR}/prompt_index.sqlite"
+DEDUP_THRESHOLD = 0.7
+DEDUP_MAX_ATTEMPTS = 3
+
+# ============================================
+# BULK PROMPT GENERATION (prompt_prefetch.py)
+# ============================================
+# With --bulk-generate, raw prompts are requested BULK_PROMPTS_PER_CALL at a
+# time by a background thread that keeps up to PREFETCH_QUEUE_SIZE ready.
+BULK_PROMPTS_PER_CALL = 10
+PREFETCH_QUEUE_SIZE = 20
+
+# ============================================
+# STAGED PIPELINE (stages.py, pipeline.py --staged)
+# ============================================
+# Default generator pool size (styler and rater pools default to --concurrency)
+# and how often per-stage queue depth and throughput are printed.
+STAGE_GENERATE_WORKERS = 2
+STAGE_REPORT_INTERVAL = 5.0
+
+# ============================================
+# RESPONSE CACHE (response_cache.py)
+# ============================================
+# Set PROMPTSTYLER_CACHE=0 to always hit the API
+CACHE_ENABLED = os.environ.get("PROMPTSTYLER_CACHE", "1") != "0"
+CACHE_PATH = f"{OUTPUT_DIR}/response_cache.sqlite"
+CACHE_MAX_BYTES = 256 * 1024 * 1024
@@ -0,0 +1,176 @@
+# Dataset Stats - Incrementally maintained summary of a training data file
+# A JSON sidecar (training_data.jsonl.stats.json) holds counts by
+# style/label/category, score histograms and running means, and the byte
+# offset of the JSONL it covers. run_batch updates it at every checkpoint,
+# so summaries cost O(1) however large the file gets. If the file grew
+# without it (e.g. merge_shards) only the new bytes are scanned; if the
+# covered bytes changed it is rebuilt from scratch.
+#
+# Usage:
+#   python dataset_stats.py                          # summary of output/training_data.jsonl
+#   python dataset_stats.py output/shards/training_data.shard00.jsonl --json
+#   python dataset_stats.py --rebuild
+
+import os
+import json
+import hashlib
+import argparse
+from config import TRAINING_DATA_FILE
+
+HISTOGRAM_BINS = 11     # scores 0-10, one bin per integer
+TAIL_BYTES = 4096       # bytes before the offset hashed to detect rewrites
+
+
+def stats_path(output_file: str) -> str:
+    return f"{output_file}.stats.json"
+
+
+def _tail_hash(path: str, offset: int) -> str:
+    """Hash of the last TAIL_BYTES covered by the stats."""
+    if offset == 0:
+        return ""
+    with open(path, "rb") as f:
+        start = max(0, offset - TAIL_BYTES)
+        f.seek(start)
+        return hashlib.sha1(f.read(offset - start)).hexdigest()
+
+
+class DatasetStats:
+    """Running totals for one JSONL training data file."""
+
+    def __init__(self, output_file: str = TRAINING_DATA_FILE):
+        self.output_file = output_file
+        self.path = stats_path(output_file)
+        self._reset()
+
+    def _reset(self):
+        self.offset = 0
+        self.tail = ""
+        self.total = 0
+        self.labels = {}        # label -> n
+        self.by_style = {}      # style -> {label: n, "score_sum": s, "histogram": [...]}
+        self.by_category = {}   # category -> {label: n, "score_sum": s}
+
+    # ─── Updating ───────────────────────────────────────
+    def add(self, record: dict):
+        label = record.get("label", "DONT")
+        score = float(record.get("score") or 0)
+        style = self.by_style.setdefault(record.get("style", ""), {"score_sum": 0.0, "histogram": [0] * HISTOGRAM_BINS})
+        category = self.by_category.setdefault(record.get("category", ""), {"score_sum": 0.0})
+
+        self.total += 1
+        self.labels[label] = self.labels.get(label, 0) + 1
+        for group in (style, category):
+            group[label] = group.get(label, 0) + 1
+            group["score_sum"] += score
+        style["histogram"][min(HISTOGRAM_BINS - 1, max(0, int(score)))] += 1
+
+    def add_many(self, records: list):
+        for record in records:
+            self.add(record)
+
+    def _scan(self, start: int):
+        """Add every record from byte `start` to the end of the file."""
+        with open(self.output_file, "rb") as f:
+            f.seek(start)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # partial last line; picked up once it is complete
+                start += len(line)
+                if line.strip():
+                    try:
+                        self.add(json.loads(line))
+                    except ValueError:
+                        pass
+        self.offset = start
+
+    def sync(self) -> "DatasetStats":
+        """Bring the stats up to date with the file, scanning only what is new."""
+        size = os.path.getsize(self.output_file) if os.path.exists(self.output_file) else 0
+        if self.offset > size or _tail_hash(self.output_file, self.offset) != self.tail:
+            self._reset()
+        if size > self.offset:
+            self._scan(self.offset)
+            self.tail = _tail_hash(self.output_file, self.offset)
+        return self
+
+    def save(self, offset: int = None):
+        """Persist the stats as covering the file up to `offset` (default: what was synced)."""
+        if offset is not None:
+            self.offset = offset
+            self.tail = _tail_hash(self.output_file, offset)
+        data = {
+            "offset": self.offset,
+            "tail": self.tail,
+            "total": self.total,
+            "labels": self.labels,
+            "by_style": self.by_style,
+            "by_category": self.by_category
+        }
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+    @classmethod
+    def open(cls, output_file: str = TRAINING_DATA_FILE, rebuild: bool = False) -> "DatasetStats":
+        """Load the sidecar (if any), sync it with the file and save it back."""
+        stats = cls(output_file)
+        if not rebuild and os.path.exists(stats.path):
+            try:
+                with open(stats.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                stats.offset = data["offset"]
+                stats.tail = data["tail"]
+                stats.total = data["total"]
+                stats.labels = data["labels"]
+                stats.by_style = data["by_style"]
+                stats.by_category = data["by_category"]
+            except (ValueError, KeyError):
+                stats._reset()
+
+        before = (stats.offset, stats.total)
+        stats.sync()
+        if (stats.offset, stats.total) != before or not os.path.exists(stats.path):
+            stats.save()
+        return stats
+
+    # ─── Queries ────────────────────────────────────────
+    @staticmethod
+    def _mean(group: dict) -> float:
+        n = sum(v for k, v in group.items() if k not in ("score_sum", "histogram"))
+        return round(group["score_sum"] / n, 2) if n else 0.0
+
+    def summary(self) -> dict:
+        return {
+            "total": self.total,
+            "do": self.labels.get("DO", 0),
+            "dont": self.labels.get("DONT", 0),
+            "mean_score_by_style": {s: self._mean(g) for s, g in sorted(self.by_style.items())},
+            "mean_score_by_category": {c: self._mean(g) for c, g in sorted(self.by_category.items())},
+            "labels_by_style": {
+                s: {"DO": g.get("DO", 0), "DONT": g.get("DONT", 0)} for s, g in sorted(self.by_style.items())
+            },
+            "histogram_by_style": {s: g["histogram"] for s, g in sorted(self.by_style.items())}
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Training data summary from the stats sidecar")
+    parser.add_argument("file", nargs="?", default=TRAINING_DATA_FILE)
+    parser.add_argument("--rebuild", action="store_true", help="Ignore the sidecar and rescan the file")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    args = parser.parse_args()
+
+    summary = DatasetStats.open(args.file, rebuild=args.rebuild).summary()
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(f"Samples: {summary['total']} | DO: {summary['do']} | DONT: {summary['dont']}\n")
+        print(f"{'Style':12} {'DO':>6} {'DONT':>6} {'Mean':>6}  Histogram (0-10)")
+        for style, counts in summary["labels_by_style"].items():
+            histogram = " ".join(str(n) for n in summary["histogram_by_style"][style])
+            print(f"{style:12} {counts['DO']:6} {counts['DONT']:6} {summary['mean_score_by_style'][style]:6}  {histogram}")
+        print("\nMean score by category:")
+        for category, mean in summary["mean_score_by_category"].items():
+            print(f"  {category:12} {mean}")
@@ -0,0 +1,267 @@
+# Dedup Index - MinHash/LSH near-duplicate detection for raw prompts
+# Each prompt becomes a MinHash signature over character 5-gram shingles;
+# LSH bands (stored in SQLite) find candidate matches in a few indexed
+# lookups, and candidates are confirmed by estimated Jaccard similarity.
+# The index persists across runs, so generate_task never pays to style and
+# rate a prompt we already have. Also dedupes existing JSONL files.
+#
+# Usage:
+#   python dedup_index.py dedupe output/training_data.jsonl -o output/training_data.dedup.jsonl
+#   python dedup_index.py build output/training_data.jsonl     # seed the persistent index
+#   python dedup_index.py stats
+
+import re
+import os
+import json
+import random
+import struct
+import sqlite3
+import hashlib
+import argparse
+import threading
+from config import DEDUP_ENABLED, DEDUP_INDEX_PATH, DEDUP_THRESHOLD
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SHINGLE_SIZE = 5
+NUM_PERM = 128
+BANDS = 32              # 32 bands x 4 rows: candidates from ~0.4 similarity up
+ROWS = NUM_PERM // BANDS
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# Fixed seed: signatures must be comparable across runs. 32-bit coefficients
+# keep a * h + b below 2**64, so the numpy path matches pure Python exactly.
+_rng = random.Random(1)
+_PERMUTATIONS = [(_rng.randrange(1, _MAX_HASH), _rng.randrange(0, _MAX_HASH)) for _ in range(NUM_PERM)]
+if np is not None:
+    _A = np.array([a for a, _ in _PERMUTATIONS], dtype=np.uint64)[:, None]
+    _B = np.array([b for _, b in _PERMUTATIONS], dtype=np.uint64)[:, None]
+
+
+def normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", "", (text or "").lower())).strip()
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set:
+    """Character n-grams of the normalized text (robust to typos and word order tweaks)."""
+    text = normalize(text)
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def signature(text: str) -> list:
+    """MinHash signature: the minimum of each permuted shingle hash."""
+    hashes = [struct.unpack("<I", hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest())[0]
+              for s in shingles(text)]
+    if np is not None:
+        h = np.array(hashes, dtype=np.uint64)[None, :]
+        return (((_A * h + _B) % np.uint64(_PRIME)) & np.uint64(_MAX_HASH)).min(axis=1).tolist()
+    return [min(((a * h + b) % _PRIME) & _MAX_HASH for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def similarity(sig_a: list, sig_b: list) -> float:
+    """Estimated Jaccard similarity of the underlying shingle sets."""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+
+def _band_keys(sig: list) -> list:
+    """One signed 64-bit bucket key per band (fits an SQLite INTEGER)."""
+    keys = []
+    for band in range(BANDS):
+        blob = struct.pack(f"<I{ROWS}I", band, *sig[band * ROWS:(band + 1) * ROWS])
+        keys.append(int.from_bytes(hashlib.blake2b(blob, digest_size=8).digest(), "little", signed=True))
+    return keys
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha1(normalize(text).encode("utf-8")).hexdigest()
+
+
+class DedupIndex:
+    """
+    Persistent LSH index of prompt signatures. Safe to share across threads;
+    check_and_add is atomic across processes too (sharded runs share the file).
+    """
+
+    def __init__(self, path: str = DEDUP_INDEX_PATH, threshold: float = DEDUP_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS prompts (
+                id INTEGER PRIMARY KEY,
+                text_hash TEXT UNIQUE,
+                signature BLOB,
+                text TEXT,
+                owner TEXT
+            );
+            CREATE TABLE IF NOT EXISTS bands (key INTEGER, prompt_id INTEGER);
+            CREATE INDEX IF NOT EXISTS idx_bands_key ON bands(key);
+        """)
+
+    def _find(self, text: str, sig: list, keys: list, owner: str = None):
+        row = self.db.execute("SELECT id, owner FROM prompts WHERE text_hash = ?", (_text_hash(text),)).fetchone()
+        if row:
+            return None if owner and row[1] == owner else (row[0], 1.0)
+
+        placeholders = ",".join("?" * len(keys))
+        candidates = self.db.execute(
+            f"SELECT DISTINCT prompt_id FROM bands WHERE key IN ({placeholders})", keys
+        ).fetchall()
+
+        best = None
+        for (prompt_id,) in candidates:
+            blob, other = self.db.execute("SELECT signature, owner FROM prompts WHERE id = ?", (prompt_id,)).fetchone()
+            if owner and other == owner:
+                continue
+            score = similarity(sig, list(struct.unpack(f"<{NUM_PERM}I", blob)))
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (prompt_id, score)
+        return best
+
+    def _add(self, text: str, sig: list, keys: list, owner: str = None) -> int:
+        cursor = self.db.execute(
+            "INSERT OR IGNORE INTO prompts (text_hash, signature, text, owner) VALUES (?, ?, ?, ?)",
+            (_text_hash(text), struct.pack(f"<{NUM_PERM}I", *sig), text, owner)
+        )
+        if not cursor.rowcount:
+            return None  # already indexed under its owner
+        prompt_id = cursor.lastrowid
+        self.db.executemany("INSERT INTO bands VALUES (?, ?)", [(key, prompt_id) for key in keys])
+        return prompt_id
+
+    def find(self, text: str):
+        """(prompt_id, similarity) of the closest indexed near-duplicate, or None."""
+        sig = signature(text)
+        with self._lock:
+            return self._find(text, sig, _band_keys(sig))
+
+    def check_and_add(self, text: str, owner: str = None):
+        """
+        Add `text` unless it near-duplicates an indexed prompt.
+        Returns None when added, else (prompt_id, similarity) of the match.
+        Entries with the same `owner` (e.g. one task of one run) never count
+        as duplicates, so a resumed task can re-add its own prompt.
+        """
+        sig = signature(text)
+        keys = _band_keys(sig)
+        with self._lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                match = self._find(text, sig, keys, owner)
+                if match is None:
+                    self._add(text, sig, keys, owner)
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+        return match
+
+    def text(self, prompt_id: int) -> str:
+        with self._lock:
+            row = self.db.execute("SELECT text FROM prompts WHERE id = ?", (prompt_id,)).fetchone()
+        return row[0] if row else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            count = self.db.execute("SELECT COUNT(*) FROM prompts").fetchone()[0]
+        return {"prompts": count, "threshold": self.threshold, "path": self.path}
+
+    def close(self):
+        self.db.close()
+
+
+# Singleton
+_index = None
+_index_lock = threading.Lock()
+
+def get_index():
+    """Shared persistent index, or None when disabled (PROMPTSTYLER_DEDUP=0)."""
+    global _index
+    if not DEDUP_ENABLED:
+        return None
+    with _index_lock:
+        if _index is None:
+            _index = DedupIndex()
+    return _index
+
+
+def dedupe_file(input_file: str, output_file: str, index: DedupIndex = None) -> dict:
+    """
+    Copy input_file to output_file without near-duplicate raw prompts.
+    The first occurrence of an input is kept with all of its styles; later
+    inputs that near-duplicate it are dropped with all of theirs.
+    Uses a fresh in-memory index unless one is given.
+    """
+    from extract_examples import open_jsonl
+
+    index = index or DedupIndex(":memory:")
+    decisions = {}      # text hash -> keep?
+    kept = dropped = 0
+    dropped_inputs = 0
+
+    with open_jsonl(input_file) as f, open(output_file, "w", encoding="utf-8") as out:
+        for line in f:
+            if not line.strip():
+                continue
+            raw = json.loads(line).get("input", "")
+            key = _text_hash(raw)
+            if key not in decisions:
+                decisions[key] = index.check_and_add(raw) is None
+                dropped_inputs += 0 if decisions[key] else 1
+            if decisions[key]:
+                out.write(line if line.endswith("\n") else line + "\n")
+                kept += 1
+            else:
+                dropped += 1
+
+    result = {"kept": kept, "dropped": dropped, "unique_inputs": len(decisions) - dropped_inputs,
+              "dropped_inputs": dropped_inputs}
+    print(f"Kept {kept} samples, dropped {dropped} ({dropped_inputs} near-duplicate prompts) -> {output_file}")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Near-duplicate prompt index")
+    parser.add_argument("--threshold", type=float, default=DEDUP_THRESHOLD,
+                        help=f"Estimated Jaccard similarity counted as a duplicate (default {DEDUP_THRESHOLD})")
+    parser.add_argument("--index", default=DEDUP_INDEX_PATH, help="Persistent index path")
+    sub = parser.add_subparsers(dest="command", required=True)
+    dedupe = sub.add_parser("dedupe", help="Write a copy of a JSONL file without near-duplicate prompts")
+    dedupe.add_argument("input")
+    dedupe.add_argument("--output", "-o", required=True)
+    dedupe.add_argument("--against-index", action="store_true",
+                        help="Also drop prompts already in the persistent index")
+    build = sub.add_parser("build", help="Add the raw prompts of JSONL files to the persistent index")
+    build.add_argument("inputs", nargs="+")
+    sub.add_parser("stats", help="Show index size")
+    args = parser.parse_args()
+
+    if args.command == "dedupe":
+        index = DedupIndex(args.index if args.against_index else ":memory:", args.threshold)
+        dedupe_file(args.input, args.output, index)
+    elif args.command == "build":
+        from extract_examples import expand_inputs, iter_records
+
+        index = DedupIndex(args.index, args.threshold)
+        seen = set()
+        added = 0
+        for record in iter_records(expand_inputs(args.inputs)):
+            raw = record.get("input", "")
+            if raw and raw not in seen:
+                seen.add(raw)
+                added += index.check_and_add(raw) is None
+        print(f"Indexed {added} new prompts ({len(seen) - added} near-duplicates skipped)")
+        print(json.dumps(index.stats(), indent=2))
+    else:
+        print(json.dumps(DedupIndex(args.index, args.threshold).stats(), indent=2))
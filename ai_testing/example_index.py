@@ -0,0 +1,536 @@
+# Example Index - Similar DO examples for few-shot prompts
+# DO rows are embedded by their raw prompt and indexed per style, so
+# apply_style can inject the k examples closest to the input instead of the
+# best-scored ones regardless of topic. Embeddings come from a local
+# sentence-transformers model when it is installed and available offline
+# (EXAMPLE_EMBED_MODEL), else hashed TF-IDF over word unigrams and bigrams.
+# Search uses hnswlib (HNSW) or faiss (exact inner product) when installed,
+# else a numpy flat scan. Rows and their vectors live in SQLite next to the
+# saved ANN files; new rows are embedded in batches and appended in place.
+# TF-IDF weights are refitted (and the vectors rebuilt) each time the corpus
+# has doubled since the last fit. Requires `pip install numpy`.
+#
+# Usage:
+#   python example_index.py build output/training_data.jsonl
+#   python example_index.py query "sort a list of numbers in python" --style json -k 3
+#   python example_index.py stats
+
+import re
+import os
+import sys
+import json
+import math
+import sqlite3
+import hashlib
+import argparse
+import threading
+from config import (
+    EXAMPLE_INDEX_DIR, EXAMPLE_EMBED_MODEL, EXAMPLE_K, EXAMPLE_MIN_SIMILARITY, TRAINING_DATA_FILE
+)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.feedback_store import SEPARATOR, truncate
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+TFIDF_DIM = 1024
+EMBED_BATCH = 256
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("The example index needs numpy: pip install numpy")
+
+
+def _row_hash(style: str, text: str, output: str) -> str:
+    return hashlib.sha1(f"{style}\x00{text}\x00{output}".encode("utf-8")).hexdigest()
+
+
+# ─── Embedders ───────────────────────────────────────────
+
+class HashedTfidf:
+    """
+    TF-IDF over word unigrams and bigrams, hashed (with a sign bit) into a
+    fixed number of buckets so vectors never change size as the vocabulary
+    grows. `fit` sets the IDF weights from a corpus.
+    """
+
+    name = "tfidf"
+    needs_fit = True
+
+    def __init__(self, dim: int = TFIDF_DIM, idf=None):
+        self.dim = dim
+        self.idf = idf if idf is not None else np.ones(dim, dtype=np.float32)
+
+    def _features(self, text: str) -> dict:
+        words = _TOKEN.findall((text or "").lower())
+        counts = {}
+        for term in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            h = int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+            key = (h % self.dim, 1.0 if h >> 63 else -1.0)
+            counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    def fit(self, texts: list):
+        df = np.zeros(self.dim, dtype=np.float64)
+        for text in texts:
+            df[list({bucket for bucket, _ in self._features(text)})] += 1
+        self.idf = (np.log((1 + len(texts)) / (1 + df)) + 1).astype(np.float32)
+
+    def embed(self, texts: list):
+        """L2-normalized float32 matrix, one row per text."""
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for (bucket, sign), count in self._features(text).items():
+                vectors[row, bucket] += sign * (1 + math.log(count))
+        vectors *= self.idf
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+
+class SentenceEmbedder:
+    """A local sentence-transformers model (CPU), normalized embeddings."""
+
+    needs_fit = False
+
+    def __init__(self, model):
+        self.model = model
+        self.name = f"st:{EXAMPLE_EMBED_MODEL}"
+        self.dim = model.get_sentence_embedding_dimension()
+
+    def embed(self, texts: list):
+        return self.model.encode(texts, batch_size=64, normalize_embeddings=True,
+                                 convert_to_numpy=True, show_progress_bar=False).astype(np.float32)
+
+
+def load_embedder():
+    """The sentence-transformers model if installed and loadable offline, else hashed TF-IDF."""
+    _require_numpy()
+    if EXAMPLE_EMBED_MODEL:
+        try:
+            from sentence_transformers import SentenceTransformer
+            # Never download: a model that is not already cached means TF-IDF
+            return SentenceEmbedder(SentenceTransformer(EXAMPLE_EMBED_MODEL, device="cpu", local_files_only=True))
+        except Exception:
+            pass
+    return HashedTfidf()
+
+
+# ─── Vector indexes (one per style) ──────────────────────
+
+class FlatIndex:
+    """Exact inner-product scan with numpy. Rebuilt from SQLite on open (nothing saved)."""
+
+    kind = "flat"
+
+    def __init__(self, dim: int):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+
+    def add(self, ids, vectors):
+        self.ids = np.concatenate([self.ids, ids])
+        self.vectors = np.vstack([self.vectors, vectors])
+
+    def search(self, vector, k: int) -> list:
+        if not len(self.ids):
+            return []
+        sims = self.vectors @ vector
+        k = min(k, len(sims))
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+        return [(int(self.ids[i]), float(sims[i])) for i in top]
+
+    def save(self, path: str):
+        pass
+
+    @classmethod
+    def load(cls, path: str, dim: int):
+        return None
+
+
+class HnswIndex:
+    """Approximate search with hnswlib (cosine via inner product on normalized vectors)."""
+
+    kind = "hnsw"
+
+    def __init__(self, dim: int, index=None):
+        self.dim = dim
+        self.index = index
+        if index is None:
+            self.index = hnswlib.Index(space="ip", dim=dim)
+            self.index.init_index(max_elements=1024, ef_construction=HNSW_EF_CONSTRUCTION, M=HNSW_M)
+        self.index.set_ef(HNSW_EF_SEARCH)
+
+    @property
+    def ids(self):
+        return np.asarray(self.index.get_ids_list(), dtype=np.int64)
+
+    def add(self, ids, vectors):
+        needed = self.index.get_current_count() + len(ids)
+        if needed > self.index.get_max_elements():
+            self.index.resize_index(max(needed, 2 * self.index.get_max_elements()))
+        self.index.add_items(vectors, ids)
+
+    def search(self, vector, k: int) -> list:
+        k = min(k, self.index.get_current_count())
+        if not k:
+            return []
+        labels, distances = self.index.knn_query(vector[None, :], k=k)
+        return [(int(i), 1.0 - float(d)) for i, d in zip(labels[0], distances[0])]
+
+    def save(self, path: str):
+        self.index.save_index(path)
+
+    @classmethod
+    def load(cls, path: str, dim: int):
+        index = hnswlib.Index(space="ip", dim=dim)
+        index.load_index(path)
+        return cls(dim, index)
+
+
+class FaissIndex:
+    """Exact inner-product search with faiss (IndexFlatIP keyed by row id)."""
+
+    kind = "faiss"
+
+    def __init__(self, dim: int, index=None):
+        self.index = index if index is not None else faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+
+    @property
+    def ids(self):
+        return faiss.vector_to_array(self.index.id_map).astype(np.int64)
+
+    def add(self, ids, vectors):
+        self.index.add_with_ids(np.ascontiguousarray(vectors, dtype=np.float32), ids.astype(np.int64))
+
+    def search(self, vector, k: int) -> list:
+        k = min(k, self.index.ntotal)
+        if not k:
+            return []
+        sims, labels = self.index.search(vector[None, :].astype(np.float32), k)
+        return [(int(i), float(s)) for i, s in zip(labels[0], sims[0]) if i >= 0]
+
+    def save(self, path: str):
+        faiss.write_index(self.index, path)
+
+    @classmethod
+    def load(cls, path: str, dim: int):
+        return cls(dim, faiss.read_index(path))
+
+
+def vector_backend():
+    """The best installed vector index class."""
+    if hnswlib is not None:
+        return HnswIndex
+    if faiss is not None:
+        return FaissIndex
+    return FlatIndex
+
+
+# ─── Example index ───────────────────────────────────────
+
+class ExampleIndex:
+    """
+    DO examples per style with their embeddings. Safe to share across
+    threads; several processes can add to the same directory (rows are
+    deduplicated, and each process picks up the others' rows on its next
+    search).
+    """
+
+    def __init__(self, root: str = EXAMPLE_INDEX_DIR, embedder=None, backend=None):
+        _require_numpy()
+        self.root = root
+        self.backend = backend or vector_backend()
+        self._indexes = {}      # style -> (vector index, max row id in it)
+        self._lock = threading.Lock()
+
+        os.makedirs(root, exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(root, "examples.sqlite"), timeout=30,
+                                  check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS examples (
+                id INTEGER PRIMARY KEY,
+                style TEXT,
+                row_hash TEXT UNIQUE,
+                input TEXT,
+                output TEXT,
+                score REAL,
+                vector BLOB
+            );
+            CREATE INDEX IF NOT EXISTS idx_examples_style ON examples(style, id);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);
+        """)
+
+        self.embedder = embedder or load_embedder()
+        self._load_meta()
+        if self._count() and self._meta("embedder") != self.embedder.name:
+            # Index was built with another embedding: vectors are not comparable
+            self._reembed()
+
+    # ─── Metadata ──
+
+    def _meta(self, key: str, default=None):
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key: str, value):
+        self.db.execute("INSERT INTO meta (key, value) VALUES (?, ?) "
+                        "ON CONFLICT (key) DO UPDATE SET value = excluded.value", (key, value))
+
+    def _load_meta(self):
+        """Pick up the current generation (and TF-IDF weights) from the database."""
+        self.generation = int(self._meta("generation", 0))
+        idf = self._meta("idf")
+        if self.embedder.needs_fit and idf is not None and self._meta("embedder") == self.embedder.name:
+            self.embedder.idf = np.frombuffer(idf, dtype=np.float32).copy()
+        self._data_version = self.db.execute("PRAGMA data_version").fetchone()[0]
+
+    def _count(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM examples").fetchone()[0]
+
+    # ─── Writes ──
+
+    def _reembed(self):
+        """Refit (TF-IDF) and recompute every vector; bumps the generation so saved ANN files are dropped."""
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self.db.execute("SELECT id, input FROM examples ORDER BY id").fetchall()
+            if self.embedder.needs_fit:
+                self.embedder.fit([text for _, text in rows])
+                self._set_meta("idf", self.embedder.idf.tobytes())
+            for start in range(0, len(rows), EMBED_BATCH):
+                batch = rows[start:start + EMBED_BATCH]
+                vectors = self.embedder.embed([text for _, text in batch])
+                self.db.executemany("UPDATE examples SET vector = ? WHERE id = ?",
+                                    [(v.tobytes(), row_id) for (row_id, _), v in zip(batch, vectors)])
+            self.generation += 1
+            self._set_meta("generation", self.generation)
+            self._set_meta("embedder", self.embedder.name)
+            self._set_meta("fitted", len(rows))
+            self.db.execute("COMMIT")
+        except Exception:
+            self.db.execute("ROLLBACK")
+            raise
+        self._indexes = {}
+        self._data_version = self.db.execute("PRAGMA data_version").fetchone()[0]
+
+    def add_rows(self, rows: list) -> int:
+        """
+        Index the DO rows among `rows` (training data lines: input, output,
+        style, label, score). Returns the number of new examples.
+        """
+        new = {}
+        for row in rows:
+            if row.get("label") != "DO" or not row.get("input") or not row.get("output"):
+                continue
+            style = (row.get("style") or "").lower()
+            new.setdefault(_row_hash(style, row["input"], row["output"]), (style, row))
+        if not new:
+            return 0
+
+        with self._lock:
+            self._refresh()
+            hashes = list(new)
+            for start in range(0, len(hashes), 500):
+                chunk = hashes[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for (known,) in self.db.execute(f"SELECT row_hash FROM examples WHERE row_hash IN ({placeholders})",
+                                                chunk):
+                    new.pop(known, None)
+            if not new:
+                return 0
+
+            items = list(new.items())
+            added = 0
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                for start in range(0, len(items), EMBED_BATCH):
+                    batch = items[start:start + EMBED_BATCH]
+                    vectors = self.embedder.embed([row["input"] for _, (_, row) in batch])
+                    cursor = self.db.executemany(
+                        "INSERT OR IGNORE INTO examples (style, row_hash, input, output, score, vector) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        [(style, h, row["input"], row["output"], row.get("score", 0), v.tobytes())
+                         for (h, (style, row)), v in zip(batch, vectors)]
+                    )
+                    added += cursor.rowcount
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+
+            # Refit TF-IDF each time the corpus doubles: O(log n) rebuilds in total
+            if self.embedder.needs_fit and self._count() >= 2 * int(self._meta("fitted", 0)):
+                self._reembed()
+        return added
+
+    # ─── Search ──
+
+    def _refresh(self):
+        """Drop in-memory indexes if another process re-embedded the corpus. Caller holds the lock."""
+        version = self.db.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            self._data_version = version
+            if int(self._meta("generation", 0)) != self.generation:
+                self._load_meta()
+                self._indexes = {}
+
+    def _path(self, style: str) -> str:
+        return os.path.join(self.root, f"{style}.g{self.generation}.{self.backend.kind}")
+
+    def _sync(self, style: str):
+        """The style's vector index, loaded from disk if saved and caught up with SQLite."""
+        if style not in self._indexes:
+            index = None
+            if os.path.exists(self._path(style)):
+                index = self.backend.load(self._path(style), self.embedder.dim)
+            if index is None:
+                index = self.backend(self.embedder.dim)
+            ids = index.ids
+            self._indexes[style] = (index, int(ids.max()) if len(ids) else 0)
+
+        index, max_id = self._indexes[style]
+        rows = self.db.execute("SELECT id, vector FROM examples WHERE style = ? AND id > ? ORDER BY id",
+                               (style, max_id)).fetchall()
+        if rows:
+            ids = np.array([row_id for row_id, _ in rows], dtype=np.int64)
+            vectors = np.frombuffer(b"".join(blob for _, blob in rows), dtype=np.float32).reshape(len(rows), -1)
+            index.add(ids, vectors)
+            self._indexes[style] = (index, int(ids[-1]))
+        return index
+
+    def search(self, text: str, style: str, k: int = EXAMPLE_K, min_similarity: float = EXAMPLE_MIN_SIMILARITY) -> list:
+        """
+        The k DO examples of `style` whose inputs are most similar to `text`:
+        [{"id", "input", "output", "score", "similarity"}], most similar first.
+        Examples for the same input are skipped.
+        """
+        style = style.lower()
+        vector = self.embedder.embed([text])[0]
+        with self._lock:
+            self._refresh()
+            # Over-fetch a little: exact-input matches are dropped below
+            hits = [(i, s) for i, s in self._sync(style).search(vector, k + 2) if s >= min_similarity]
+            if not hits:
+                return []
+            placeholders = ",".join("?" * len(hits))
+            rows = {row[0]: row for row in self.db.execute(
+                f"SELECT id, input, output, score FROM examples WHERE id IN ({placeholders})", [i for i, _ in hits]
+            )}
+        results = []
+        for row_id, similarity in hits:
+            row_id, example_input, output, score = rows[row_id]
+            if example_input.strip() == text.strip():
+                continue
+            results.append({"id": row_id, "input": example_input, "output": output, "score": score,
+                            "similarity": round(similarity, 4)})
+        return results[:k]
+
+    def few_shot_block(self, text: str, style: str, k: int = EXAMPLE_K) -> str:
+        """System prompt addition with the most similar examples ('' if none is similar enough)."""
+        examples = self.search(text, style, k)
+        if not examples:
+            return ""
+        parts = [
+            f"\n\n{SEPARATOR}\n",
+            "RATED EXAMPLES FOR SIMILAR INPUTS\n",
+            f"{SEPARATOR}\n",
+            "These outputs were rated good for inputs like this one. Match their structure:\n\n"
+        ]
+        for i, ex in enumerate(examples):
+            parts.append(f"Example {i + 1}:\n")
+            parts.append(f"Input: {truncate(ex['input'], 200)}\n")
+            parts.append(f"Output: {truncate(ex['output'], 500)}\n\n")
+        parts.append("Follow the style rules above; use the examples only as a guide.\n")
+        return "".join(parts)
+
+    # ─── Persistence ──
+
+    def save(self):
+        """Write the loaded vector indexes next to the database (old generations are removed)."""
+        with self._lock:
+            self._refresh()
+            for style in list(self._indexes):
+                index = self._sync(style)
+                path = self._path(style)
+                index.save(path + ".tmp")
+                if os.path.exists(path + ".tmp"):
+                    os.replace(path + ".tmp", path)
+            for name in os.listdir(self.root):
+                parts = name.split(".")
+                if len(parts) == 3 and parts[1] != f"g{self.generation}" and parts[2] in ("hnsw", "faiss"):
+                    os.remove(os.path.join(self.root, name))
+
+    def stats(self) -> dict:
+        with self._lock:
+            by_style = dict(self.db.execute("SELECT style, COUNT(*) FROM examples GROUP BY style").fetchall())
+        return {"examples": sum(by_style.values()), "by_style": by_style, "embedder": self.embedder.name,
+                "index": self.backend.kind, "generation": self.generation, "path": self.root}
+
+    def close(self):
+        self.db.close()
+
+
+# Singleton
+_index = None
+_index_lock = threading.Lock()
+
+def get_example_index() -> ExampleIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = ExampleIndex()
+    return _index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Similar few-shot example index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Index the DO rows of JSONL files, shard dirs or a columnar dataset")
+    build.add_argument("inputs", nargs="*", default=[TRAINING_DATA_FILE])
+    query = sub.add_parser("query", help="Most similar DO examples for a prompt")
+    query.add_argument("text")
+    query.add_argument("--style", default="professional")
+    query.add_argument("-k", type=int, default=EXAMPLE_K)
+    sub.add_parser("stats")
+    args = parser.parse_args()
+
+    index = ExampleIndex()
+    if args.command == "build":
+        from extract_examples import expand_inputs, iter_records
+
+        added, batch = 0, []
+        for record in iter_records(expand_inputs(args.inputs)):
+            batch.append(record)
+            if len(batch) >= 5000:
+                added += index.add_rows(batch)
+                batch = []
+        added += index.add_rows(batch)
+        index.save()
+        print(f"Added {added} examples")
+        print(json.dumps(index.stats(), indent=2))
+    elif args.command == "query":
+        for ex in index.search(args.text, args.style, args.k):
+            print(f"[{ex['similarity']:.3f}] score {ex['score']} | {truncate(ex['input'], 100)}")
+            print(f"    {truncate(ex['output'], 200)}")
+    else:
+        print(json.dumps(index.stats(), indent=2))
@@ -1,53 +1,197 @@
 """
 Extract best DO and DONT examples from training data for few-shot prompting.
+
+Streams the input once, keeping only bounded top-k / bottom-k heaps per style
+(and optionally per category), so memory stays O(k) however large the corpus.
+Inputs may be plain, gzip (.gz) or zstd (.zst, needs `zstandard`) JSONL files,
+directories of shards, glob patterns, or a columnar dataset (columnar.py).
+
+Usage:
+    python extract_examples.py
+    python extract_examples.py output/shards/ -k 5 --per-category
+    python extract_examples.py "archive/*.jsonl.gz" --do-threshold 8 --dont-threshold 4
 """
+import io
+import os
+import glob
+import gzip
 import json
+import heapq
+import argparse
+from config import STYLES, TRAINING_DATA_FILE, OUTPUT_DIR
+import columnar
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+EXAMPLES_FILE = f"{OUTPUT_DIR}/fewshot_examples.json"
+JSONL_SUFFIXES = (".jsonl", ".jsonl.gz", ".jsonl.zst")
+
+
+def open_jsonl(path: str):
+    """Open a JSONL file for text reading, decompressing by extension."""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise ImportError(f"{path}: reading .zst files needs `pip install zstandard`")
+        stream = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+        return io.TextIOWrapper(stream, encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def expand_inputs(inputs: list) -> list:
+    """Files, shard directories and glob patterns -> sorted list of JSONL files."""
+    paths = []
+    for item in inputs:
+        if columnar.is_dataset(item):
+            paths.append(item)
+        elif os.path.isdir(item):
+            paths.extend(sorted(
+                os.path.join(item, name) for name in os.listdir(item) if name.endswith(JSONL_SUFFIXES)
+            ))
+        elif os.path.exists(item):
+            paths.append(item)
+        else:
+            paths.extend(sorted(glob.glob(item)))
+    return paths
+
+
+def iter_records(paths: list):
+    """Yield one dict per valid JSONL line across all files; bad lines are skipped."""
+    for path in paths:
+        if columnar.is_dataset(path):
+            yield from columnar.iter_records(path)
+            continue
+        with open_jsonl(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+class ExampleHeaps:
+    """
+    Best k DO and worst k DONT samples seen so far for one group.
+    Heap roots are the entries to evict next, so each push is O(log k).
+    Ties keep the earlier sample, matching a stable sort of the full list.
+    """
+
+    def __init__(self, k: int):
+        self.k = k
+        self.do = []      # min-heap of (score, -seq, record)
+        self.dont = []    # min-heap of (-score, -seq, record)
+        self.do_count = 0
+        self.dont_count = 0
+
+    def _push(self, heap: list, entry: tuple):
+        if len(heap) < self.k:
+            heapq.heappush(heap, entry)
+        elif entry[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, entry)
+
+    def add_do(self, score: float, seq: int, record: dict):
+        self.do_count += 1
+        if self.k:
+            self._push(self.do, (score, -seq, record))
+
+    def add_dont(self, score: float, seq: int, record: dict):
+        self.dont_count += 1
+        if self.k:
+            self._push(self.dont, (-score, -seq, record))
+
+    def result(self) -> dict:
+        return {
+            "do_examples": [e[2] for e in sorted(self.do, key=lambda e: e[:2], reverse=True)],
+            "dont_examples": [e[2] for e in sorted(self.dont, key=lambda e: e[:2], reverse=True)],
+            "stats": {"do_count": self.do_count, "dont_count": self.dont_count}
+        }
+
+
+def extract_examples(inputs: list = None, output_file: str = EXAMPLES_FILE, k: int = 2,
+                     do_threshold: float = None, dont_threshold: float = None,
+                     per_category: bool = False) -> dict:
+    """
+    Single pass over `inputs` (default: training_data.jsonl) keeping the k
+    highest-scored DO and k lowest-scored DONT samples per style.
+    do_threshold / dont_threshold additionally require score >= / < the value.
+    With per_category, each style also gets a `by_category` breakdown.
+    """
+    paths = expand_inputs(inputs or [TRAINING_DATA_FILE])
+    if not paths:
+        print(f"No input files found: {inputs}")
+        return {}
+
+    styles = [s["name"] for s in STYLES]
+    heaps = {style: ExampleHeaps(k) for style in styles}
+    category_heaps = {style: {} for style in styles}
+
+    seen = 0
+    for seq, record in enumerate(iter_records(paths)):
+        seen += 1
+        style = record.get("style")
+        if style not in heaps:
+            continue
+
+        label = record.get("label")
+        score = record.get("score", 0)
+        if label == "DO" and (do_threshold is None or score >= do_threshold):
+            add = "add_do"
+        elif label == "DONT" and (dont_threshold is None or score < dont_threshold):
+            add = "add_dont"
+        else:
+            continue
+
+        getattr(heaps[style], add)(score, seq, record)
+        if per_category:
+            category = record.get("category", "unknown")
+            group = category_heaps[style].setdefault(category, ExampleHeaps(k))
+            getattr(group, add)(score, seq, record)
 
-def extract_examples():
-    with open('output/training_data.jsonl', 'r', encoding='utf-8') as f:
-        data = [json.loads(line) for line in f if line.strip()]
-    
-    styles = ['professional', 'markdown', 'json', 'toon', 'persona', 'cot', 'fewshot']
-    
     examples = {}
-    
     for style in styles:
-        style_data = [d for d in data if d.get('style') == style]
-        
-        # Best DO (highest score)
-        do_samples = [d for d in style_data if d.get('label') == 'DO']
-        do_samples.sort(key=lambda x: x.get('score', 0), reverse=True)
-        
-        # Best DONT (lowest score)
-        dont_samples = [d for d in style_data if d.get('label') == 'DONT']
-        dont_samples.sort(key=lambda x: x.get('score', 0))
-        
-        # Take top 2 of each
-        examples[style] = {
-            'do_examples': do_samples[:2] if do_samples else [],
-            'dont_examples': dont_samples[:2] if dont_samples else [],
-            'stats': {
-                'do_count': len(do_samples),
-                'dont_count': len(dont_samples)
+        examples[style] = heaps[style].result()
+        if per_category:
+            examples[style]["by_category"] = {
+                category: group.result() for category, group in sorted(category_heaps[style].items())
             }
-        }
-        
+
+        do_examples = examples[style]["do_examples"]
+        dont_examples = examples[style]["dont_examples"]
+        stats = examples[style]["stats"]
         print(f"=== {style.upper()} ===")
-        print(f"DO: {len(do_samples)}, DONT: {len(dont_samples)}")
-        if do_samples:
-            print(f"Best DO (score {do_samples[0].get('score')}):")
-            print(f"  Input: {do_samples[0].get('input', '')[:80]}...")
-        if dont_samples:
-            print(f"Worst DONT (score {dont_samples[0].get('score')}):")
-            print(f"  Input: {dont_samples[0].get('input', '')[:80]}...")
+        print(f"DO: {stats['do_count']}, DONT: {stats['dont_count']}")
+        if do_examples:
+            print(f"Best DO (score {do_examples[0].get('score')}):")
+            print(f"  Input: {do_examples[0].get('input', '')[:80]}...")
+        if dont_examples:
+            print(f"Worst DONT (score {dont_examples[0].get('score')}):")
+            print(f"  Input: {dont_examples[0].get('input', '')[:80]}...")
         print()
-    
+
     # Save extracted examples
-    with open('output/fewshot_examples.json', 'w', encoding='utf-8') as f:
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    with open(output_file, "w", encoding="utf-8") as f:
         json.dump(examples, f, indent=2, ensure_ascii=False)
-    
-    print("Saved to output/fewshot_examples.json")
+
+    print(f"Scanned {seen} samples from {len(paths)} file(s)")
+    print(f"Saved to {output_file}")
     return examples
 
+
 if __name__ == "__main__":
-    extract_examples()
+    parser = argparse.ArgumentParser(description="Extract few-shot DO/DONT examples from training data")
+    parser.add_argument("inputs", nargs="*", help="JSONL files (.gz/.zst ok), shard directories or globs")
+    parser.add_argument("--output", "-o", default=EXAMPLES_FILE)
+    parser.add_argument("-k", type=int, default=2, help="Examples to keep per style and label (default 2)")
+    parser.add_argument("--do-threshold", type=float, help="Only DO samples scoring at least this")
+    parser.add_argument("--dont-threshold", type=float, help="Only DONT samples scoring below this")
+    parser.add_argument("--per-category", action="store_true", help="Also keep top/bottom k per category")
+    args = parser.parse_args()
+
+    extract_examples(args.inputs, args.output, args.k, args.do_threshold, args.dont_threshold, args.per_category)
@@ -1,15 +1,13 @@
 # Groq Client - Fast LLM API for task generation
-# Rate limit: 30 requests/min
+# Rate limit: shared token-bucket limiter (rate_limiter.py)
+# HTTP: pooled keep-alive transport (transport.py)
 
 import os
-import time
-import requests
 import json
-from config import GROQ_API_KEY
-
-GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
-GROQ_MODEL = "llama-3.3-70b-versatile"
-GROQ_DELAY_SEC = 2.1  # 30 req/min = 2 sec between calls + buffer
+from config import GROQ_API_KEY, GROQ_MODEL
+from transport import post_chat
+from token_budget import BudgetExceeded
+import response_cache
 
 class GroqClient:
     """Groq API client with rate limiting."""
@@ -18,56 +16,50 @@ class GroqClient:
         self.api_key = api_key or GROQ_API_KEY or os.environ.get("GROQ_API_KEY")
         if not self.api_key:
             raise ValueError("GROQ_API_KEY required")
-        self.last_call = 0
-    
-    def _rate_limit(self):
-        """Enforce rate limit."""
-        elapsed = time.time() - self.last_call
-        if elapsed < GROQ_DELAY_SEC:
-            time.sleep(GROQ_DELAY_SEC - elapsed)
-        self.last_call = time.time()
     
-    def generate(self, prompt: str, temperature: float = 0.7) -> str:
-        """Generate text with rate limiting."""
-        self._rate_limit()
-        
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
+    def generate(self, prompt: str, temperature: float = 0.7, variant=None, max_tokens: int = 1024,
+                 cache: bool = True) -> str:
+        """
+        Generate text with rate limiting.
+        Responses are cached; pass a distinct `variant` per sample when
+        repeated calls with the same prompt should produce different outputs,
+        or cache=False for a fresh sample that is not stored either.
+        """
         
         payload = {
             "model": GROQ_MODEL,
             "messages": [{"role": "user", "content": prompt}],
             "temperature": temperature,
-            "max_tokens": 2048
+            "max_tokens": max_tokens
         }
         
+        cache_key, cached = response_cache.lookup(payload, variant) if cache else (None, None)
+        if cached is not None:
+            return cached
+        
         try:
-            response = requests.post(
-                GROQ_API_URL,
-                headers=headers,
-                json=payload,
-                timeout=30
-            )
+            response = post_chat(payload, self.api_key, timeout=30)
             
             if response.status_code == 200:
                 data = response.json()
-                return data["choices"][0]["message"]["content"].strip()
+                text = data["choices"][0]["message"]["content"].strip()
+                response_cache.store(cache_key, text)
+                return text
             else:
                 print(f"  Groq error {response.status_code}: {response.text[:100]}")
                 return None
                 
+        except BudgetExceeded:
+            raise
         except Exception as e:
             print(f"  Groq error: {e}")
             return None
 
 
-# Singleton
-_client = None
+# One client per API key
+_clients = {}
 
 def get_client(api_key: str = None) -> GroqClient:
-    global _client
-    if _client is None:
-        _client = GroqClient(api_key)
-    return _client
+    if api_key not in _clients:
+        _clients[api_key] = GroqClient(api_key)
+    return _clients[api_key]
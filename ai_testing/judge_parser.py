@@ -0,0 +1,160 @@
+# Judge Parser - Structured-output parsing for judge replies
+# Judge requests ask for JSON mode (response_format json_object) where the
+# model supports it. Replies are still parsed tolerantly: every '{' is tried
+# with JSONDecoder.raw_decode, so prose around the object, code fences or a
+# second object after it do not matter, and the first object with the
+# expected shape wins. Ratings are validated against the criteria schema and
+# scores are clamped to 1-10. A reply that still does not parse gets one
+# cheap repair request (a small model, only the broken text, temperature 0)
+# instead of a full re-rate. Replies, failures and repairs are counted per
+# judge model.
+
+import re
+import json
+import threading
+from config import RATING_CRITERIA, JUDGE_JSON_MODE, JUDGE_REPAIR_MODEL
+
+JSON_MODE = {"type": "json_object"}
+REPAIR_INPUT_CHARS = 4000       # a rating reply is well under this
+
+_decoder = json.JSONDecoder()
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_SCORE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*(?:/\s*10)?\s*$")
+
+
+def iter_objects(text: str):
+    """Every JSON object in `text`, outermost first, skipping braces that do not start one."""
+    i = text.find("{")
+    while i != -1:
+        try:
+            obj, end = _decoder.raw_decode(text, i)
+        except ValueError:
+            i = text.find("{", i + 1)
+            continue
+        if isinstance(obj, dict):
+            yield obj
+        i = text.find("{", end)
+
+
+def extract_json(text: str, accept=None) -> dict:
+    """
+    The first object in `text` for which accept(obj) is true (any object if
+    accept is None). Trailing commas are forgiven. Raises ValueError if
+    there is none.
+    """
+    text = text or ""
+    for candidate in (text, _TRAILING_COMMA.sub(r"\1", text)):
+        for obj in iter_objects(candidate):
+            if accept is None or accept(obj):
+                return obj
+    raise ValueError("No matching JSON object in reply")
+
+
+def score(value):
+    """A criterion score clamped to 1-10; numeric strings ("8", "8/10") count. None if not a number."""
+    if isinstance(value, str):
+        match = _SCORE.match(value)
+        if not match:
+            return None
+        value = float(match.group(1))
+        value = int(value) if value.is_integer() else value
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value != value:
+        return None
+    return min(10, max(1, value))
+
+
+def normalize_rating(entry) -> dict:
+    """
+    A rating with every criterion scored 1-10, or None if any is missing or
+    not a number. A missing or invalid overall becomes the mean of the
+    criteria. Extra keys (verdict, ...) are kept.
+    """
+    if not isinstance(entry, dict):
+        return None
+    rating = dict(entry)
+    for c in RATING_CRITERIA:
+        rating[c] = score(entry.get(c))
+        if rating[c] is None:
+            return None
+    overall = score(entry.get("overall"))
+    rating["overall"] = overall if overall is not None else \
+        round(sum(rating[c] for c in RATING_CRITERIA) / len(RATING_CRITERIA), 1)
+    rating["feedback"] = str(entry.get("feedback") or "")
+    return rating
+
+
+def is_rating(obj: dict) -> bool:
+    return any(c in obj for c in RATING_CRITERIA)
+
+
+def repair_payload(text: str, schema: str, max_tokens: int) -> dict:
+    """A short request that rewrites a broken judge reply into `schema`."""
+    prompt = f"""Rewrite the reply below as valid JSON with exactly this shape. Keep its scores and feedback; do not re-rate.
+
+SHAPE: {schema}
+
+REPLY:
+{text[:REPAIR_INPUT_CHARS]}
+
+Return ONLY JSON."""
+    return with_json_mode({
+        "model": JUDGE_REPAIR_MODEL,
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": 0,
+        "max_tokens": max_tokens
+    })
+
+
+# ─── JSON mode ───────────────────────────────────────────
+
+_no_json_mode = set()
+_json_mode_lock = threading.Lock()
+
+def with_json_mode(payload: dict) -> dict:
+    """`payload` with response_format json_object, unless disabled or the model rejected it."""
+    with _json_mode_lock:
+        if not JUDGE_JSON_MODE or payload["model"] in _no_json_mode:
+            return payload
+    return dict(payload, response_format=JSON_MODE)
+
+
+def disable_json_mode(model: str):
+    with _json_mode_lock:
+        if model not in _no_json_mode:
+            _no_json_mode.add(model)
+            print(f"  {model} does not support JSON mode, sending judge requests without it")
+
+
+# ─── Per-model parse stats ───────────────────────────────
+
+class ParseStats:
+    """Judge replies per model: parsed first time, repaired, or lost."""
+
+    def __init__(self):
+        self.models = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, event: str):
+        """event: "reply" (every fresh reply), "failed", "repaired" or "lost"."""
+        with self._lock:
+            counts = self.models.setdefault(model, {"reply": 0, "failed": 0, "repaired": 0, "lost": 0})
+            counts[event] += 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                model: dict(counts, failure_rate=round(counts["failed"] / counts["reply"], 4) if counts["reply"] else 0)
+                for model, counts in self.models.items()
+            }
+
+
+# Singleton: one set of counters for the whole run
+_stats = None
+_stats_lock = threading.Lock()
+
+def get_parse_stats() -> ParseStats:
+    global _stats
+    with _stats_lock:
+        if _stats is None:
+            _stats = ParseStats()
+    return _stats
@@ -4,36 +4,32 @@
 import os
 import json
 import random
-import requests
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from groq_client import get_client as get_groq
-from config import STYLES, TASK_CATEGORIES, RATING_CRITERIA, DO_THRESHOLD, GROQ_API_URL, GROQ_MODEL, GROQ_API_KEY, OUTPUT_DIR
-from promptstyler import apply_style
+from config import (
+    STYLES, TASK_CATEGORIES, DO_THRESHOLD, GROQ_MODEL, GROQ_API_KEY, OUTPUT_DIR,
+    DEDUP_MAX_ATTEMPTS, BULK_PROMPTS_PER_CALL, STAGE_REPORT_INTERVAL, STAGE_GENERATE_WORKERS, LOCAL_VALIDATION,
+    GENERATE_MAX_TOKENS, FEEDBACK_DB_PATH, JUDGE_REPAIR_MAX_TOKENS
+)
+from promptstyler import apply_style, apply_styles
+from shared.feedback_store import get_store as get_feedback_store
+from transport import post_chat
+from run_manifest import RunManifest, manifest_path
+from dataset_stats import DatasetStats
+from prompt_prefetch import PromptPrefetcher
+from stages import Stage, StageMonitor, DONE
+from style_validators import validate, local_rating
+from token_budget import BudgetExceeded, get_ledger
+from retry_policy import get_policy
+import dedup_index
+import judge_parser
+import response_cache
 
 CHECKPOINT_INTERVAL = 20
 
-class JudgeRaterAI:
-    """
-    Unified Groq pipeline:
-    1. Generate raw prompts (Groq)
-    2. Apply styles (Groq via promptstyler) 
-    3. Rate outputs (Groq)
-    """
-    
-    def __init__(self, groq_key: str = None):
-        self.groq = get_groq(groq_key)
-        self.api_key = groq_key or GROQ_API_KEY
-        self.styles = [s["name"] for s in STYLES]
-        self.categories = list(TASK_CATEGORIES.keys())
-    
-    def generate_task(self, category: str, difficulty: str = "medium") -> dict:
-        """Generate raw prompt using Groq."""
-        
-        prompt = f"""Generate a raw, unstructured user prompt for testing AI prompt styling.
-
-Category: {category}
-Difficulty: {difficulty}
-
-CRITICAL: Humans write prompts in MANY different styles. Pick ONE style randomly:
+# How real users write prompts; shared by single and bulk generation
+PROMPT_GUIDE = """CRITICAL: Humans write prompts in MANY different styles. Pick ONE style randomly:
 
 1. DIRECT COMMAND: "Make a website for my bakery"
 2. QUESTION: "what's the best way to learn python?"
@@ -61,11 +57,67 @@ Rules:
 - NEVER start with "I want" or "I need" every time
 - Typos and grammar mistakes are OK
 - Do NOT mention formats (json, markdown, etc)
-- Length: 10-100 words
+- Length: 10-100 words"""
+
+
+class JudgeRaterAI:
+    """
+    Unified Groq pipeline:
+    1. Generate raw prompts (Groq)
+    2. Apply styles (Groq via promptstyler) 
+    3. Rate outputs (Groq)
+    """
+    
+    def __init__(self, groq_key: str = None, batch_styles: bool = False, batch_rating: bool = False,
+                 columnar: bool = False, bulk_generate: bool = False, feedback_loop: bool = False,
+                 similar_examples: bool = False):
+        """
+        batch_styles=True styles all pending styles of a task in one request (apply_styles).
+        batch_rating=True rates all styled outputs of a task in one judge request (rate_outputs).
+        columnar=True also writes rows to a Parquet/Arrow dataset next to the JSONL (columnar.py).
+        bulk_generate=True generates raw prompts several per request, prefetched in the background.
+        feedback_loop=True stores rated rows as feedback (shared/feedback_store.py) and styles
+        every request with the style's top examples, like the extension's learning loop.
+        similar_examples=True indexes DO rows (example_index.py) and styles every request
+        with the DO examples most similar to its input.
+        """
+        self.groq = get_groq(groq_key)
+        self.api_key = groq_key or GROQ_API_KEY
+        self.styles = [s["name"] for s in STYLES]
+        self.categories = list(TASK_CATEGORIES.keys())
+        self.batch_styles = batch_styles
+        self.batch_rating = batch_rating
+        self.columnar = columnar
+        self.bulk_generate = bulk_generate
+        self.prefetcher = None
+        self.feedback = get_feedback_store(FEEDBACK_DB_PATH) if feedback_loop else None
+        self.examples = None
+        if similar_examples:
+            from example_index import get_example_index
+            self.examples = get_example_index()
+        self.manifest = None
+        self._stats = None
+        self._columnar = None
+        self.local_rejects = 0      # outputs labeled DONT by style_validators, no judge call
+    
+    def generate_task(self, category: str, difficulty: str = "medium", variant=None, cache: bool = True) -> dict:
+        """
+        Generate raw prompt using Groq.
+        `variant` (e.g. the task id) keeps cached samples distinct per task;
+        cache=False always asks for a fresh one.
+        """
+        
+        prompt = f"""Generate a raw, unstructured user prompt for testing AI prompt styling.
+
+Category: {category}
+Difficulty: {difficulty}
+
+{PROMPT_GUIDE}
 
 Output ONLY the raw prompt text, nothing else."""
 
-        raw_prompt = self.groq.generate(prompt, temperature=0.95)
+        raw_prompt = self.groq.generate(prompt, temperature=0.95, variant=variant, max_tokens=GENERATE_MAX_TOKENS,
+                                        cache=cache)
         
         return {
             "category": category,
@@ -73,9 +125,124 @@ Output ONLY the raw prompt text, nothing else."""
             "raw_prompt": raw_prompt
         }
     
+    def generate_tasks(self, specs: list, variant=None) -> list:
+        """
+        Generate one raw prompt per (category, difficulty) slot in a single
+        request. Returns the valid prompts as task dicts; slots that are
+        missing, malformed or repeated in the reply are left out.
+        """
+        
+        slots = "\n".join(f"{i}. category={c} difficulty={d}" for i, (c, d) in enumerate(specs, 1))
+        prompt = f"""Generate {len(specs)} raw, unstructured user prompts for testing AI prompt styling.
+
+Write one prompt per slot, for that slot's category and difficulty:
+{slots}
+
+{PROMPT_GUIDE}
+- Every prompt must be about a different topic and use a different style
+
+Return ONLY JSON:
+{{"prompts":[{{"slot":1,"prompt":"..."}},{{"slot":2,"prompt":"..."}}]}}"""
+        
+        text = self.groq.generate(prompt, temperature=0.95, variant=variant,
+                                  max_tokens=min(200 * len(specs) + 100, 4096))
+        try:
+            entries = judge_parser.extract_json(text, lambda obj: "prompts" in obj)["prompts"]
+        except ValueError:
+            return []
+        
+        tasks = []
+        seen = set()
+        for entry in entries if isinstance(entries, list) else []:
+            if not isinstance(entry, dict):
+                continue
+            slot, raw = entry.get("slot"), entry.get("prompt")
+            if not isinstance(slot, int) or not 1 <= slot <= len(specs) or slot in seen:
+                continue
+            # The same 10-100 word range PROMPT_GUIDE asks for
+            if not isinstance(raw, str) or not 10 <= len(raw.split()) <= 100:
+                continue
+            seen.add(slot)
+            category, difficulty = specs[slot - 1]
+            tasks.append({"category": category, "difficulty": difficulty, "raw_prompt": raw.strip()})
+        return tasks
+    
+    def _new_task(self, task_id: int) -> dict:
+        """Raw prompt for a task: from the bulk prefetch queue, or one generate call."""
+        task = self._prefetched_task(task_id) if self.prefetcher is not None else None
+        return task if task is not None else self._generated_task(task_id)
+    
+    def _prefetched_task(self, task_id: int):
+        """A task from the bulk prefetch queue, or None when it has to be generated directly."""
+        index = dedup_index.get_index()
+        owner = f"{self.manifest.run_id}:{task_id}" if self.manifest is not None else None
+        for attempt in range(DEDUP_MAX_ATTEMPTS):
+            task = self.prefetcher.get()
+            if task is None:
+                # Producer gave up or fell behind: stop it, or it keeps making prompts nobody takes
+                self.prefetcher.stop()
+                return None
+            if index is None:
+                return task
+            match = index.check_and_add(task["raw_prompt"], owner)
+            if match is None:
+                return task
+            self.prefetcher.reject()
+            print(f"  [Task {task_id}] Near-duplicate prompt ({match[1]:.0%} similar), taking the next one "
+                  f"({attempt + 1}/{DEDUP_MAX_ATTEMPTS})")
+        task["duplicate"] = True
+        return task
+    
+    def _generated_task(self, task_id: int) -> dict:
+        category = random.choice(self.categories)
+        difficulty = random.choice(["easy", "medium", "hard"])
+        print(f"[Task {task_id}] Generating {category} prompt (Groq)...")
+        return self.generate_unique_task(category, difficulty, task_id)
+    
+    def generate_unique_task(self, category: str, difficulty: str, task_id: int) -> dict:
+        """
+        generate_task, regenerated while the prompt near-duplicates one already
+        in the dedup index. After DEDUP_MAX_ATTEMPTS duplicates the task is
+        marked `duplicate` so no styling or rating calls are spent on it.
+        """
+        index = dedup_index.get_index()
+        owner = f"{self.manifest.run_id}:{task_id}" if self.manifest is not None else None
+        # Task ids restart at 1 every run: keyed by task id alone, a rerun would
+        # get an earlier run's cached prompt back
+        variant = owner or task_id
+        for attempt in range(DEDUP_MAX_ATTEMPTS):
+            # Regenerate attempts skip the cache: a cached retry can only replay a prompt
+            # already seen, which the index would reject again on every later run
+            task = self.generate_task(category, difficulty, variant=variant, cache=attempt == 0)
+            if index is None or not task["raw_prompt"]:
+                return task
+            match = index.check_and_add(task["raw_prompt"], owner)
+            if match is None:
+                return task
+            print(f"  [Task {task_id}] Near-duplicate prompt ({match[1]:.0%} similar), regenerating "
+                  f"({attempt + 1}/{DEDUP_MAX_ATTEMPTS})")
+        task["duplicate"] = True
+        return task
+    
+    def _prejudge(self, style: str, styled_output: str):
+        """DONT rating for output that fails a fatal local check, else None (judge it)."""
+        if not LOCAL_VALIDATION:
+            return None
+        result = validate(style, styled_output)
+        if not result["failed"]:
+            return None
+        self.local_rejects += 1
+        return local_rating(result)
+    
     def rate_output(self, raw_prompt: str, style: str, styled_output: str) -> dict:
-        """Rate using Groq API."""
+        """Rate using Groq API. Clearly broken output is rated locally instead."""
+        
+        rejected = self._prejudge(style, styled_output)
+        if rejected is not None:
+            return rejected
         
+        schema = ('{"clarity":N,"structure":N,"completeness":N,"style_compliance":N,"token_efficiency":N,'
+                  '"actionability":N,"overall":N,"verdict":"DO/DONT","feedback":"..."}')
         rating_prompt = f"""Rate this styled prompt quality objectively.
 
 ORIGINAL: {raw_prompt}
@@ -85,13 +252,8 @@ OUTPUT: {styled_output}
 Rate 1-10: clarity, structure, completeness, style_compliance, token_efficiency, actionability
 
 Return ONLY JSON:
-{{"clarity":N,"structure":N,"completeness":N,"style_compliance":N,"token_efficiency":N,"actionability":N,"overall":N,"verdict":"DO/DONT","feedback":"..."}}"""
+{schema}"""
 
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        
         payload = {
             "model": GROQ_MODEL,
             "messages": [{"role": "user", "content": rating_prompt}],
@@ -100,112 +262,725 @@ Return ONLY JSON:
         }
         
         try:
-            response = requests.post(
-                GROQ_API_URL,
-                headers=headers,
-                json=payload,
-                timeout=60
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                text = data["choices"][0]["message"]["content"].strip()
-                if "{" in text:
-                    start = text.find("{")
-                    end = text.rfind("}") + 1
-                    result = json.loads(text[start:end])
-                    
-                    if "overall" not in result:
-                        scores = [result.get(c, 5) for c in RATING_CRITERIA]
-                        result["overall"] = round(sum(scores) / len(scores), 1)
-                    
-                    result["verdict"] = "DO" if result.get("overall", 0) >= DO_THRESHOLD else "DONT"
-                    return result
+            result = self._judge(payload, self._parse_rating, schema)
+            if result is not None:
+                return result
+        except BudgetExceeded:
+            raise
         except Exception as e:
             print(f"  Rating error: {e}")
         
-        return {"error": "Rating failed", "overall": 0, "verdict": "DONT"}
+        # A failed rating is not a low score: the unit is recorded as failed and retried on --resume
+        return {"error": "Rating failed"}
+    
+    def _judge(self, payload: dict, parse, schema: str, ratings: int = 1):
+        """
+        Send a judge request and parse the reply with `parse` (text -> result,
+        None or empty if it does not parse). A reply that does not parse is
+        sent for one repair request (judge_parser.repair_payload) rather than
+        re-rated. The judge text is cached, so parsing changes still apply to
+        hits, but only once it has parsed.
+        """
+        model = payload["model"]
+        stats = judge_parser.get_parse_stats()
+        payload = judge_parser.with_json_mode(payload)
+        cache_key, text = response_cache.lookup(payload)
+        cached = text is not None
+        if not cached:
+            text = self._judge_reply(payload)
+            if not text:
+                return None
+            stats.record(model, "reply")
+        
+        result = parse(text)
+        if not result and not cached:
+            stats.record(model, "failed")
+            repair = judge_parser.repair_payload(text, schema, JUDGE_REPAIR_MAX_TOKENS * ratings)
+            text = self._judge_reply(repair)
+            result = parse(text) if text else None
+            stats.record(model, "repaired" if result else "lost")
+        if result and not cached:
+            response_cache.store(cache_key, text)
+        return result
+    
+    def _judge_reply(self, payload: dict) -> str:
+        """The reply text of a judge request, or None."""
+        response = post_chat(payload, self.api_key, timeout=60)
+        if response.status_code == 200:
+            return response.json()["choices"][0]["message"]["content"].strip()
+        if response.status_code == 400 and "response_format" in payload:
+            try:
+                error = response.json().get("error") or {}
+            except ValueError:
+                error = {}
+            # JSON mode refused the model's output; the tolerant parser may still read it
+            if error.get("failed_generation"):
+                return error["failed_generation"].strip()
+            if "response_format" in str(error.get("message", "")):
+                judge_parser.disable_json_mode(payload["model"])
+                return self._judge_reply({k: v for k, v in payload.items() if k != "response_format"})
+        return None
+    
+    @staticmethod
+    def _finish_rating(result: dict) -> dict:
+        """Set the verdict from overall."""
+        result["verdict"] = "DO" if result["overall"] >= DO_THRESHOLD else "DONT"
+        return result
+    
+    def _parse_rating(self, text: str) -> dict:
+        try:
+            rating = judge_parser.normalize_rating(judge_parser.extract_json(text, judge_parser.is_rating))
+        except ValueError:
+            return None
+        return self._finish_rating(rating) if rating is not None else None
+    
+    def _parse_batch_ratings(self, text: str) -> dict:
+        """{style: rating} for the entries that pass validation; the rest are dropped."""
+        try:
+            data = judge_parser.extract_json(
+                text, lambda obj: "ratings" in obj or any(isinstance(v, dict) for v in obj.values()))
+        except ValueError:
+            return {}
+        ratings = data.get("ratings", data)
+        if isinstance(ratings, list):
+            ratings = {e.get("style", ""): e for e in ratings if isinstance(e, dict)}
+        if not isinstance(ratings, dict):
+            return {}
+        valid = {}
+        for style, entry in ratings.items():
+            rating = judge_parser.normalize_rating(entry)
+            if rating is not None:
+                valid[style.lower()] = self._finish_rating(rating)
+        return valid
+    
+    def rate_outputs(self, raw_prompt: str, outputs: dict, max_retries: int = 2) -> dict:
+        """
+        Rate all styled outputs of one task in a single judge request.
+        `outputs` maps style -> styled output. Entries missing from or invalid
+        in the reply are re-requested on their own (up to max_retries rounds),
+        then fall back to rate_output. Returns {style: rating}.
+        """
+        
+        ratings = {}
+        pending = {}
+        for style, output in outputs.items():
+            rejected = self._prejudge(style, output)
+            if rejected is not None:
+                ratings[style] = rejected
+            else:
+                pending[style] = output
+        
+        for attempt in range(max_retries):
+            if not pending:
+                break
+            
+            blocks = "\n\n".join(f"--- STYLE: {style} ---\n{output}" for style, output in pending.items())
+            schema = "{\"ratings\":{" + ",".join(
+                f'"{style}":{{"clarity":N,"structure":N,"completeness":N,"style_compliance":N,'
+                f'"token_efficiency":N,"actionability":N,"overall":N,"feedback":"..."}}'
+                for style in pending
+            ) + "}}"
+            rating_prompt = f"""Rate each styled prompt below objectively. All were rewritten from the same original.
+
+ORIGINAL: {raw_prompt}
+
+{blocks}
+
+For EACH style rate 1-10: clarity, structure, completeness, style_compliance, token_efficiency, actionability
+
+Return ONLY JSON with one entry per style, exactly these keys:
+{schema}"""
+            
+            payload = {
+                "model": GROQ_MODEL,
+                "messages": [{"role": "user", "content": rating_prompt}],
+                "temperature": 0.3,
+                "max_tokens": 200 * len(pending) + 100
+            }
+            
+            try:
+                got = self._judge(payload, self._parse_batch_ratings, schema, len(pending)) or {}
+            except BudgetExceeded:
+                raise
+            except Exception as e:
+                print(f"  Batch rating error: {e}")
+                got = {}
+            
+            for style in list(pending):
+                if style in got:
+                    ratings[style] = got[style]
+                    del pending[style]
+            
+            if pending:
+                print(f"  Batch rating missing {', '.join(pending)} (attempt {attempt + 1}/{max_retries})")
+        
+        for style, output in pending.items():
+            ratings[style] = self.rate_output(raw_prompt, style, output)
+        
+        return ratings
+    
+    def _load_task(self, task_id: int):
+        """Raw prompt already generated for this task in a resumed run, if any."""
+        if self.manifest is None:
+            return None
+        return self.manifest.get_task(task_id)
+    
+    def _record_task(self, task_id: int, task: dict):
+        if self.manifest is not None and task["raw_prompt"] and not task.get("duplicate"):
+            self.manifest.save_task(task_id, task["category"], task["difficulty"], task["raw_prompt"])
+    
+    def _load_unit(self, task_id: int, style: str):
+        """Finished (style, rating) unit from a resumed run, if any."""
+        if self.manifest is None:
+            return None
+        return self.manifest.get_unit(task_id, style)
+    
+    def _record_unit(self, task_id: int, sr: dict):
+        if self.manifest is not None:
+            self.manifest.save_unit(task_id, sr["style"], sr)
+    
+    @staticmethod
+    def _unit(style: str, styled: str, rating: dict) -> dict:
+        """style_result for a rated output; a failed rating makes a failed unit, never a 0 score."""
+        if "error" in rating:
+            return {"style": style, "error": rating["error"]}
+        return {"style": style, "styled_output": styled, "rating": rating}
+    
+    def _style_batch(self, task_id: int, raw_prompt: str, done: dict) -> dict:
+        """Batched styling of every style not already finished; {} when batching is off."""
+        if not self.batch_styles:
+            return {}
+        pending = [style for style in self.styles if not done[style]]
+        if not pending:
+            return {}
+        print(f"  [Task {task_id}] Styling {len(pending)} styles (batched)...")
+        return apply_styles(raw_prompt, pending, api_key=self.api_key, feedback=self.feedback,
+                            examples=self.examples)
+    
+    def _rate_batch(self, task_id: int, raw_prompt: str, done: dict, styled: dict) -> list:
+        """
+        Rate every freshly styled output of a task with one rate_outputs call
+        and return the task's style_results in style order.
+        """
+        ratings = self.rate_outputs(raw_prompt, {s: o for s, o in styled.items() if o}) if any(styled.values()) else {}
+        
+        style_results = []
+        for style in self.styles:
+            if done[style]:
+                style_results.append(done[style])
+                continue
+            if styled.get(style):
+                sr = self._unit(style, styled[style], ratings[style])
+            else:
+                sr = {"style": style, "error": "Failed"}
+            self._record_unit(task_id, sr)
+            style_results.append(sr)
+        return style_results
     
     def process_task(self, task_id: int) -> dict:
         """Process one task with all 7 styles."""
         
-        category = random.choice(self.categories)
-        difficulty = random.choice(["easy", "medium", "hard"])
-        
-        print(f"\n[Task {task_id}] Generating {category} prompt (Groq)...")
-        task = self.generate_task(category, difficulty)
+        task = self._load_task(task_id)
+        if task:
+            print(f"\n[Task {task_id}] Resuming {task['category']} prompt")
+        else:
+            print()
+            task = self._new_task(task_id)
+            self._record_task(task_id, task)
         
+        if task.get("duplicate"):
+            return {"error": "Near-duplicate prompt", "task_id": task_id}
         if not task["raw_prompt"]:
             return {"error": "Failed to generate", "task_id": task_id}
         
         print(f"  Raw: {task['raw_prompt'][:50]}...")
         
-        style_results = []
-        for style in self.styles:
-            print(f"  [{style}] Styling...")
-            styled = apply_style(task["raw_prompt"], style, api_key=self.api_key)
+        done = {style: self._load_unit(task_id, style) for style in self.styles}
+        prestyled = self._style_batch(task_id, task["raw_prompt"], done)
+        
+        if self.batch_rating:
+            styled = {}
+            for style in self.styles:
+                if done[style]:
+                    continue
+                if style in prestyled:
+                    styled[style] = prestyled[style]
+                else:
+                    print(f"  [{style}] Styling...")
+                    styled[style] = apply_style(task["raw_prompt"], style, api_key=self.api_key,
+                                                feedback=self.feedback, examples=self.examples)
             
-            if styled:
-                print(f"  [{style}] Rating...")
-                rating = self.rate_output(task["raw_prompt"], style, styled)
-                style_results.append({
-                    "style": style,
-                    "styled_output": styled,
-                    "rating": rating
-                })
-            else:
-                style_results.append({"style": style, "error": "Failed"})
+            print(f"  [Task {task_id}] Rating {len([o for o in styled.values() if o])} styles (batched)...")
+            style_results = self._rate_batch(task_id, task["raw_prompt"], done, styled)
+        else:
+            style_results = []
+            for style in self.styles:
+                sr = done[style]
+                if sr:
+                    style_results.append(sr)
+                    continue
+                
+                if style in prestyled:
+                    styled = prestyled[style]
+                else:
+                    print(f"  [{style}] Styling...")
+                    styled = apply_style(task["raw_prompt"], style, api_key=self.api_key, feedback=self.feedback,
+                                         examples=self.examples)
+                
+                if styled:
+                    print(f"  [{style}] Rating...")
+                    rating = self.rate_output(task["raw_prompt"], style, styled)
+                    sr = self._unit(style, styled, rating)
+                else:
+                    sr = {"style": style, "error": "Failed"}
+                self._record_unit(task_id, sr)
+                style_results.append(sr)
         
         return {
             "task_id": task_id,
-            "category": category,
-            "difficulty": difficulty,
+            "category": task["category"],
+            "difficulty": task["difficulty"],
             "raw_prompt": task["raw_prompt"],
             "style_results": style_results
         }
     
-    def run_batch(self, count: int, output_file: str) -> int:
-        """Run batch and save as flat JSONL."""
+    async def process_task_async(self, task_id: int, semaphore: asyncio.Semaphore) -> dict:
+        """
+        Async variant of process_task.
+        Fans out the style -> rate chains for all styles at once; every
+        blocking request holds a slot of `semaphore` while in flight.
+        """
+        
+        task = await asyncio.to_thread(self._load_task, task_id)
+        if not task:
+            if self.prefetcher is not None:
+                # Waiting on the queue is not a request in flight
+                task = await asyncio.to_thread(self._prefetched_task, task_id)
+            if not task:
+                async with semaphore:
+                    task = await asyncio.to_thread(self._generated_task, task_id)
+            await asyncio.to_thread(self._record_task, task_id, task)
+        
+        if task.get("duplicate"):
+            return {"error": "Near-duplicate prompt", "task_id": task_id}
+        if not task["raw_prompt"]:
+            return {"error": "Failed to generate", "task_id": task_id}
+        
+        done = {}
+        for style in self.styles:
+            done[style] = await asyncio.to_thread(self._load_unit, task_id, style)
+        
+        prestyled = {}
+        if self.batch_styles:
+            async with semaphore:
+                prestyled = await asyncio.to_thread(self._style_batch, task_id, task["raw_prompt"], done)
+        
+        if self.batch_rating:
+            pending = [style for style in self.styles if not done[style]]
+            outputs = await asyncio.gather(
+                *(self._style_async(task["raw_prompt"], style, semaphore, prestyled) for style in pending)
+            )
+            async with semaphore:
+                style_results = await asyncio.to_thread(
+                    self._rate_batch, task_id, task["raw_prompt"], done, dict(zip(pending, outputs))
+                )
+            print(f"  [Task {task_id}] Rated {len(pending)} styles (batched)")
+        else:
+            style_results = await asyncio.gather(
+                *(self._style_and_rate_async(task_id, task["raw_prompt"], style, semaphore, done, prestyled)
+                  for style in self.styles)
+            )
+        
+        return {
+            "task_id": task_id,
+            "category": task["category"],
+            "difficulty": task["difficulty"],
+            "raw_prompt": task["raw_prompt"],
+            "style_results": list(style_results)
+        }
+    
+    async def _style_async(self, raw_prompt: str, style: str, semaphore: asyncio.Semaphore, prestyled: dict) -> str:
+        """Styled output for one style, from the batched result when there is one."""
+        if style in prestyled:
+            return prestyled[style]
+        async with semaphore:
+            return await asyncio.to_thread(apply_style, raw_prompt, style, api_key=self.api_key,
+                                           feedback=self.feedback, examples=self.examples)
+    
+    async def _style_and_rate_async(self, task_id: int, raw_prompt: str, style: str, semaphore: asyncio.Semaphore,
+                                    done: dict, prestyled: dict) -> dict:
+        """
+        Style then rate one output, releasing the slot between the two calls.
+        Units finished in a resumed run are returned as-is; styles present in
+        `prestyled` (batched mode) skip the styling call.
+        """
+        
+        if done.get(style):
+            return done[style]
+        
+        styled = await self._style_async(raw_prompt, style, semaphore, prestyled)
+        
+        if not styled:
+            print(f"  [Task {task_id}][{style}] Styling failed")
+            sr = {"style": style, "error": "Failed"}
+        else:
+            async with semaphore:
+                rating = await asyncio.to_thread(self.rate_output, raw_prompt, style, styled)
+            
+            status = rating["error"] if "error" in rating else f"Rated {rating['overall']}"
+            print(f"  [Task {task_id}][{style}] {status}")
+            sr = self._unit(style, styled, rating)
+        
+        await asyncio.to_thread(self._record_unit, task_id, sr)
+        return sr
+    
+    def _write_result(self, f, result: dict) -> int:
+        """
+        Write one processed task as flat JSONL lines. Returns lines written.
+        The task's lines go out in a single write; units already in the file
+        from an earlier (resumed) run are skipped.
+        """
+        
+        raw = result.get("raw_prompt", "")
+        category = result.get("category", "")
+        lines = []
+        
+        for sr in result.get("style_results", []):
+            if "error" not in sr and not sr.get("written"):
+                line = {
+                    "input": raw,
+                    "output": sr.get("styled_output", ""),
+                    "style": sr.get("style", ""),
+                    "label": sr.get("rating", {}).get("verdict", "DONT"),
+                    "score": sr.get("rating", {}).get("overall", 0),
+                    "category": category
+                }
+                lines.append(json.dumps(line, ensure_ascii=False) + "\n")
+                self._unflushed.append((result["task_id"], sr["style"]))
+                self._unflushed_rows.append(line)
+        
+        f.write("".join(lines))
+        f.flush()
+        
+        self._tasks_since_checkpoint += 1
+        if self._tasks_since_checkpoint >= CHECKPOINT_INTERVAL:
+            self._checkpoint(f)
+        
+        return len(lines)
+    
+    def _checkpoint(self, f):
+        """fsync the output and record how far it is known to be good."""
+        
+        f.flush()
+        os.fsync(f.fileno())
+        if self.manifest is not None:
+            self.manifest.checkpoint(self._unflushed, f.tell())
+        # Only rows that are durable in the JSONL reach the stats and the
+        # columnar copy, so a resumed run never counts them twice
+        if self._stats is not None:
+            self._stats.add_many(self._unflushed_rows)
+            self._stats.save(f.tell())
+        if self._columnar is not None:
+            # Flushed now: --resume skips these rows, so a buffered copy lost in a crash would never be rewritten
+            self._columnar.write(self._unflushed_rows)
+            self._columnar.flush()
+        if self.feedback is not None:
+            self.feedback.add_rated(self._unflushed_rows)
+        if self.examples is not None:
+            self.examples.add_rows(self._unflushed_rows)
+        self._unflushed = []
+        self._unflushed_rows = []
+        self._tasks_since_checkpoint = 0
+    
+    async def _run_batch_async(self, task_ids: list, f, concurrency: int):
+        """Run the given tasks with at most `concurrency` requests in flight."""
+        
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=concurrency))
+        
+        semaphore = asyncio.Semaphore(concurrency)
+        pending = iter(task_ids)
+        
+        async def worker():
+            # Each worker owns one task at a time; the shared semaphore,
+            # not the worker count, is what bounds requests in flight.
+            for task_id in pending:
+                result = await self.process_task_async(task_id, semaphore)
+                # Writes happen on the event loop thread, so no lock is needed
+                ok = self._write_result(f, result)
+                print(f"  → [Task {task_id}] {ok}/{len(self.styles)} written")
+        
+        await asyncio.gather(*(worker() for _ in range(min(concurrency, len(task_ids)))))
+    
+    async def _run_batch_staged(self, task_ids: list, f, workers: dict):
+        """
+        Generate -> style -> rate as separate worker pools joined by bounded
+        queues, feeding a single writer. `workers` sizes each pool
+        ({"generate": n, "style": n, "rate": n}), so all three kinds of
+        request are in flight at once and a slow stage backs up the others
+        instead of buffering unbounded work.
+        """
+        
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=sum(workers.values())))
+        
+        # A job is one task moving through the stages; the writer gets it
+        # once every style has a result
+        async def finish_unit(job: dict, sr: dict):
+            await asyncio.to_thread(self._record_unit, job["task_id"], sr)
+            job["results"][sr["style"]] = sr
+            if len(job["results"]) == len(self.styles):
+                await writer.inbox.put(job)
+        
+        async def rate_when_styled(job: dict):
+            """Batch rating: once every pending style is styled or failed, rate the styled ones in one call."""
+            if all(s in job["styled"] or s in job["results"] for s in job["pending"]) \
+                    and any(s not in job["results"] for s in job["pending"]):
+                await rater.inbox.put((job, None))
+        
+        async def generate(task_id: int):
+            task = await asyncio.to_thread(self._load_task, task_id)
+            if not task:
+                task = await asyncio.to_thread(self._new_task, task_id)
+                await asyncio.to_thread(self._record_task, task_id, task)
+            
+            job = {"task_id": task_id, "task": task, "results": {}, "styled": {}}
+            if task.get("duplicate") or not task["raw_prompt"]:
+                job["error"] = "Near-duplicate prompt" if task.get("duplicate") else "Failed to generate"
+                await writer.inbox.put(job)
+                return
+            
+            for style in self.styles:
+                sr = await asyncio.to_thread(self._load_unit, task_id, style)
+                if sr:
+                    job["results"][style] = sr
+            job["pending"] = [style for style in self.styles if style not in job["results"]]
+            
+            if not job["pending"]:
+                await writer.inbox.put(job)
+            elif self.batch_styles:
+                await styler.inbox.put((job, None))
+            else:
+                for style in job["pending"]:
+                    await styler.inbox.put((job, style))
+        
+        async def style(item: tuple):
+            job, style = item
+            raw = job["task"]["raw_prompt"]
+            if style is None:
+                done = {s: job["results"].get(s) for s in self.styles}
+                job["styled"].update(await asyncio.to_thread(self._style_batch, job["task_id"], raw, done))
+                styled_now = job["pending"]
+            else:
+                job["styled"][style] = await asyncio.to_thread(apply_style, raw, style, api_key=self.api_key,
+                                                               feedback=self.feedback, examples=self.examples)
+                styled_now = [style]
+            
+            if self.batch_rating:
+                await rate_when_styled(job)
+                return
+            for s in styled_now:
+                if job["styled"].get(s):
+                    await rater.inbox.put((job, s))
+                else:
+                    print(f"  [Task {job['task_id']}][{s}] Styling failed")
+                    await finish_unit(job, {"style": s, "error": "Failed"})
+        
+        async def rate(item: tuple):
+            job, style = item
+            raw = job["task"]["raw_prompt"]
+            if style is None:
+                done = {s: job["results"].get(s) for s in self.styles}
+                style_results = await asyncio.to_thread(self._rate_batch, job["task_id"], raw, done, job["styled"])
+                job["results"] = {sr["style"]: sr for sr in style_results}
+                print(f"  [Task {job['task_id']}] Rated {len(job['styled'])} styles (batched)")
+                await writer.inbox.put(job)
+                return
+            
+            rating = await asyncio.to_thread(self.rate_output, raw, style, job["styled"][style])
+            status = rating["error"] if "error" in rating else f"Rated {rating['overall']}"
+            print(f"  [Task {job['task_id']}][{style}] {status}")
+            await finish_unit(job, self._unit(style, job["styled"][style], rating))
+        
+        async def fail(item, error: Exception):
+            """A handler raised: record the item's unfinished units as failed, so the job still reaches the writer."""
+            message = f"{type(error).__name__}: {error}"
+            if not isinstance(item, tuple):
+                # generate: no job yet, the item is the task id
+                for style in self.styles:
+                    if not await asyncio.to_thread(self._load_unit, item, style):
+                        await asyncio.to_thread(self._record_unit, item, {"style": style, "error": message})
+                await writer.inbox.put({"task_id": item, "error": message})
+                return
+            job, style = item
+            for s in job["pending"] if style is None else [style]:
+                if s not in job["results"]:
+                    await finish_unit(job, {"style": s, "error": message})
+            if self.batch_rating:
+                await rate_when_styled(job)
+        
+        async def write(job: dict):
+            if "error" in job:
+                result = {"error": job["error"], "task_id": job["task_id"]}
+            else:
+                result = {
+                    "task_id": job["task_id"],
+                    "category": job["task"]["category"],
+                    "difficulty": job["task"]["difficulty"],
+                    "raw_prompt": job["task"]["raw_prompt"],
+                    "style_results": [job["results"][s] for s in self.styles]
+                }
+            # The writer is the only stage touching the file, so no lock is needed
+            ok = self._write_result(f, result)
+            print(f"  → [Task {job['task_id']}] {ok}/{len(self.styles)} written")
+        
+        generator = Stage("generate", generate, workers["generate"], abort_on=(BudgetExceeded,), on_error=fail)
+        styler = Stage("style", style, workers["style"], abort_on=(BudgetExceeded,), on_error=fail)
+        rater = Stage("rate", rate, workers["rate"], abort_on=(BudgetExceeded,), on_error=fail)
+        writer = Stage("write", write, 1, queue_size=sum(workers.values()))
+        monitor = StageMonitor([generator, styler, rater, writer], STAGE_REPORT_INTERVAL)
+        
+        async def feed():
+            for task_id in task_ids:
+                await generator.inbox.put(task_id)
+            await generator.inbox.put(DONE)
+        
+        reporter = asyncio.create_task(monitor.run())
+        try:
+            await asyncio.gather(feed(), generator.run(styler), styler.run(rater), rater.run(writer), writer.run())
+        finally:
+            reporter.cancel()
+            print(f"  [stages] {monitor.line()}")
+    
+    def _open_manifest(self, count: int, output_file: str, resume: bool, start_id: int) -> tuple:
+        """Prepare the run manifest. Returns the (count, start_id) to run."""
+        
+        path = manifest_path(output_file)
+        if resume and not os.path.exists(path):
+            print(f"No manifest at {path}; starting a fresh run")
+            resume = False
+        
+        self.manifest = RunManifest(path)
+        
+        if resume:
+            count = self.manifest.count
+            start_id = self.manifest.start_id
+            # Anything past the last checkpoint may be partial; it is rewritten
+            # from the manifest, so no API call is repeated.
+            with open(output_file, "a", encoding="utf-8") as f:
+                f.truncate(self.manifest.committed_offset)
+            print(f"Resuming {count} tasks: {self.manifest.progress()}")
+        else:
+            start_offset = os.path.getsize(output_file) if os.path.exists(output_file) else 0
+            self.manifest.reset(count, start_offset, start_id)
+        
+        return count, start_id
+    
+    def run_batch(self, count: int, output_file: str, concurrency: int = 1, resume: bool = False,
+                  start_id: int = 1, stage_workers: dict = None) -> int:
+        """
+        Run batch and save as flat JSONL.
+        With concurrency > 1, tasks run on the asyncio engine with that many
+        requests in flight; the output format is the same either way.
+        With stage_workers ({"generate": n, "style": n, "rate": n}) they run
+        as pipelined stages with those pool sizes instead.
+        Progress is kept in a manifest next to the output file; resume=True
+        skips finished (task, style) units and retries only failed ones.
+        Task ids run from start_id, so shards can own disjoint id ranges.
+        """
         
         os.makedirs(OUTPUT_DIR, exist_ok=True)
+        count, start_id = self._open_manifest(count, output_file, resume, start_id)
+        self._unflushed = []
+        self._unflushed_rows = []
+        self._tasks_since_checkpoint = 0
+        self._stats = DatasetStats.open(output_file)
+        if self.columnar:
+            from columnar import ColumnarWriter, dataset_root
+            self._columnar = ColumnarWriter(dataset_root(output_file))
         
-        print(f"\nProcessing {count} tasks")
+        task_ids = [i for i in range(start_id, start_id + count) if not self.manifest.is_complete(i, self.styles)]
+        
+        print(f"\nProcessing {len(task_ids)} tasks")
         print(f"Generator: Groq {GROQ_MODEL}")
         print(f"Styles: {', '.join(self.styles)}")
-        print(f"Format: JSONL\n")
+        if stage_workers:
+            print(f"Stages: " + " | ".join(f"{name} {n}" for name, n in stage_workers.items()))
+        else:
+            print(f"Concurrency: {concurrency}")
+        print(f"Format: JSONL" + (f" + {self._columnar.extension}" if self._columnar else "") + "\n")
+        
+        to_generate = sum(1 for i in task_ids if not self.manifest.get_task(i))
+        if self.bulk_generate and to_generate:
+            print(f"Bulk generation: {BULK_PROMPTS_PER_CALL} prompts per call, prefetched\n")
+            self.prefetcher = PromptPrefetcher(self.generate_tasks, self.categories, to_generate,
+                                               variant_prefix=f"bulk:{self.manifest.run_id}").start()
         
         with open(output_file, "a", encoding="utf-8") as f:
-            for i in range(count):
-                result = self.process_task(i + 1)
-                
-                raw = result.get("raw_prompt", "")
-                category = result.get("category", "")
-                
-                for sr in result.get("style_results", []):
-                    if "error" not in sr:
-                        line = {
-                            "input": raw,
-                            "output": sr.get("styled_output", ""),
-                            "style": sr.get("style", ""),
-                            "label": sr.get("rating", {}).get("verdict", "DONT"),
-                            "score": sr.get("rating", {}).get("overall", 0),
-                            "category": category
-                        }
-                        f.write(json.dumps(line, ensure_ascii=False) + "\n")
-                        f.flush()
-                
-                ok = len([s for s in result.get("style_results", []) if "error" not in s])
-                print(f"  → {ok}/7 written\n")
+            try:
+                if stage_workers:
+                    asyncio.run(self._run_batch_staged(task_ids, f, stage_workers))
+                elif concurrency > 1:
+                    asyncio.run(self._run_batch_async(task_ids, f, concurrency))
+                else:
+                    for task_id in task_ids:
+                        result = self.process_task(task_id)
+                        ok = self._write_result(f, result)
+                        print(f"  → {ok}/7 written\n")
+            except BudgetExceeded as e:
+                print(f"\nStopping: {e}. Rerun with --resume once budget is available.")
+            finally:
+                self._checkpoint(f)
+                if self._columnar is not None:
+                    self._columnar.close()
+                if self.prefetcher is not None:
+                    self.prefetcher.stop()
+                    self.prefetcher = None
+                if self.examples is not None:
+                    self.examples.save()
         
-        with open(output_file, "r") as f:
-            total = sum(1 for _ in f)
+        progress = self.manifest.progress()
+        if progress["failed"]:
+            print(f"{progress['failed']} units failed; rerun with --resume to retry them")
+        if self.local_rejects:
+            print(f"{self.local_rejects} outputs failed local validation (labeled DONT without a judge call)")
+        if self.feedback is not None:
+            stats = self.feedback.get_stats()
+            print(f"Feedback store: {stats['positive']} positive / {stats['total']} records, "
+                  f"{self.feedback.hits}/{self.feedback.lookups} few-shot lookups cached")
+        if self.examples is not None:
+            stats = self.examples.stats()
+            print(f"Example index: {stats['examples']} DO examples ({stats['embedder']}, {stats['index']} index)")
+        retries = get_policy().summary()
+        if retries["retries"] or retries["denied"] or retries["circuit_trips"]:
+            print(f"Retries: {retries['retries']} of {retries['requests']} requests"
+                  + (f", {retries['denied']} refused by the retry budget" if retries["denied"] else "")
+                  + (f", circuit opened {retries['circuit_trips']}x" if retries["circuit_trips"] else ""))
+        for model, parsed in judge_parser.get_parse_stats().summary().items():
+            if parsed["failed"]:
+                print(f"Judge replies ({model}): {parsed['failed']} of {parsed['reply']} did not parse "
+                      f"({parsed['failure_rate']:.1%}), {parsed['repaired']} repaired, {parsed['lost']} lost")
+        tokens = get_ledger().summary()
+        run = tokens["run"]
+        print(f"Tokens: {run['prompt_tokens']:,} prompt + {run['completion_tokens']:,} completion "
+              f"in {run['requests']} requests (run budget {tokens['run_budget'] or 'unlimited'})"
+              + (f", {run['truncated']} hit max_tokens" if run["truncated"] else ""))
         
+        total = self._stats.total
         print(f"Saved {total} samples to {output_file}")
         return total
 
 
 if __name__ == "__main__":
     import sys
-    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10
-    ai = JudgeRaterAI()
-    ai.run_batch(count, "output/training_data.jsonl")
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    count = int(args[0]) if len(args) > 0 else 10
+    concurrency = int(args[1]) if len(args) > 1 else 1
+    ai = JudgeRaterAI(batch_styles="--batch-styles" in sys.argv, batch_rating="--batch-rating" in sys.argv,
+                      columnar="--columnar" in sys.argv, bulk_generate="--bulk-generate" in sys.argv,
+                      feedback_loop="--feedback-loop" in sys.argv,
+                      similar_examples="--similar-examples" in sys.argv)
+    # --staged: generate/style/rate pools; styling and rating get `concurrency` workers each
+    stage_workers = {"generate": STAGE_GENERATE_WORKERS, "style": concurrency, "rate": concurrency} if "--staged" in sys.argv else None
+    ai.run_batch(count, "output/training_data.jsonl", concurrency=concurrency, resume="--resume" in sys.argv,
+                 stage_workers=stage_workers)
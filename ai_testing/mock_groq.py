@@ -0,0 +1,404 @@
+"""
+Mock Groq Server - OpenAI-compatible stand-in for offline load testing
+
+Answers POST .../chat/completions with canned, style-aware replies:
+  - single style rewrites ("Style: MARKDOWN ...")
+  - batched rewrites with === STYLE === markers (promptstyler.apply_styles)
+  - judge ratings, single and batched (judge_rater_ai)
+  - raw task prompts, single and bulk (generate_task / generate_tasks)
+Supports streaming (SSE), configurable latency distributions and 429/5xx
+injection with retry-after, and sends x-ratelimit-* headers like Groq.
+--rate-malformed wraps judge replies in prose or breaks their JSON; in JSON
+mode (response_format) those come back as Groq's 400 json_validate_failed.
+
+Usage:
+    python mock_groq.py --port 8000 --latency lognormal --latency-ms 300
+    python mock_groq.py --rate-429 0.05 --rate-5xx 0.01 --retry-after 2
+    python mock_groq.py --rpm 600          # enforce a server-side request limit
+    python mock_groq.py --rate-malformed 0.2
+
+    export GROQ_API_URL=http://127.0.0.1:8000/openai/v1/chat/completions
+    export GROQ_API_KEY=mock GROQ_REQUESTS_PER_MINUTE=1000000 GROQ_TOKENS_PER_MINUTE=100000000
+    python pipeline.py -n 200 --concurrency 64
+
+GET /stats returns request, error and latency counters.
+"""
+import re
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DISTRIBUTIONS = ["fixed", "uniform", "normal", "lognormal", "exponential"]
+
+# Raw prompts are assembled from these parts, so generated tasks are diverse
+# enough to pass the near-duplicate check (dedup_index.py)
+PROMPT_OPENERS = ["help me", "can u", "I would like assistance to", "yo so like i need to", "pls",
+                  "ugh how do i", "quick q: how to", "need someone to"]
+PROMPT_TASKS = ["write a python script that sorts", "explain", "build a dashboard for", "fix the bug in",
+                "make charts from", "write an essay about", "plan a launch for", "summarize",
+                "design a database for", "write unit tests for", "translate", "optimize"]
+PROMPT_SUBJECTS = ["my bakery's orders", "Q3 sales numbers", "a todo app", "climate change", "our regex parser",
+                   "the customer survey", "a CSV of salaries", "machine learning basics", "my thesis notes",
+                   "the onboarding docs", "a weather API", "inventory spreadsheets", "a chess engine",
+                   "the marketing budget", "a recipe website", "server logs"]
+PROMPT_TAILS = ["", "before friday", "idk where to start tbh", "with pandas maybe?", "for a demo tomorrow!!!",
+                "in under 100 lines", "for beginners", "my boss is asking"]
+# At least 6 words, so every prompt is within the 10-100 words generate_tasks accepts
+PROMPT_CONTEXTS = ["i have been stuck on this all day", "it is for a class i am taking",
+                   "we ship it to customers next week", "please keep it simple and easy to follow",
+                   "the last attempt did not work at all", "it needs to run on my old laptop"]
+
+CRITERIA = ["clarity", "structure", "completeness", "style_compliance", "token_efficiency", "actionability"]
+
+
+class MockConfig:
+    """Server behaviour knobs (see --help)."""
+
+    def __init__(self, latency: str = "fixed", latency_ms: float = 0, jitter_ms: float = 0,
+                 token_ms: float = 0, rate_429: float = 0, rate_5xx: float = 0,
+                 retry_after: float = 1, rpm: int = 0, seed: int = None, rate_malformed: float = 0):
+        self.latency = latency
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.token_ms = token_ms
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.retry_after = retry_after
+        self.rpm = rpm
+        self.seed = seed
+        self.rate_malformed = rate_malformed
+
+
+def sample_latency(config: MockConfig, rng: random.Random) -> float:
+    """Seconds of simulated processing time before the response starts."""
+    mean, spread = config.latency_ms, config.jitter_ms
+    if config.latency == "uniform":
+        ms = rng.uniform(mean - spread, mean + spread)
+    elif config.latency == "normal":
+        ms = rng.gauss(mean, spread)
+    elif config.latency == "lognormal":
+        # latency_ms is the median; jitter_ms sets the (log-space) spread
+        sigma = math.log1p(spread / mean) if mean > 0 else 0
+        ms = mean * math.exp(rng.gauss(0, sigma))
+    elif config.latency == "exponential":
+        ms = rng.expovariate(1 / mean) if mean > 0 else 0
+    else:
+        ms = mean
+    return max(0.0, ms) / 1000
+
+
+# ─── Canned replies ─────────────────────────────────
+def styled_text(style: str, raw: str) -> str:
+    """A plausible rewrite of `raw` in the given style."""
+    style = style.lower()
+    task = raw.strip().rstrip(".!?") or "Complete the task"
+    if style == "markdown":
+        return f"## Task\n{task}\n\n## Requirements\n- Clear steps\n- Working example\n\n## Output\nConcise answer"
+    if style == "json":
+        return json.dumps({"task": task, "requirements": ["clear steps", "working example"], "output": "concise answer"})
+    if style == "toon":
+        return f"task: {task}\nrequirements[2]: clear steps,working example\noutput: concise answer"
+    if style == "persona":
+        return f"You are an expert assistant. {task}. Give clear steps and a working example."
+    if style == "cot":
+        return (f"Task: {task}\n\nThink step by step:\n1. Understand the goal\n2. Plan the approach\n\n"
+                f"### Final Answer:\n{task}, with clear steps and a working example")
+    if style == "fewshot":
+        return (f"Example 1:\nInput: sort [3,1]\nOutput: [1,3]\n\nInput: {task}\n\n"
+                "Now continue this pattern for the user's query.")
+    return f"Task: {task}. Requirements: clear steps, working example. Output: concise answer."
+
+
+def raw_prompt(rng: random.Random) -> str:
+    parts = [rng.choice(PROMPT_OPENERS), rng.choice(PROMPT_TASKS), rng.choice(PROMPT_SUBJECTS),
+             rng.choice(PROMPT_CONTEXTS), rng.choice(PROMPT_TAILS), f"(v{rng.randint(1, 999)})" if rng.random() < 0.3 else ""]
+    return " ".join(p for p in parts if p)
+
+
+def rating(rng: random.Random) -> dict:
+    scores = {c: rng.randint(4, 10) for c in CRITERIA}
+    scores["overall"] = round(sum(scores.values()) / len(CRITERIA), 1)
+    scores["feedback"] = "Mock rating"
+    return scores
+
+
+def malform(text: str, rng: random.Random) -> str:
+    """A judge reply as models sometimes write it: prose around the JSON, a second object, or broken quoting."""
+    kind = rng.choice(["prose", "second", "trailing_comma", "quotes"])
+    if kind == "prose":
+        return f"Here is my rating:\n```json\n{text}\n```\nLet me know if you need more detail."
+    if kind == "second":
+        return f'{text}\n\nNote: {{"confidence": "high"}}'
+    if kind == "trailing_comma":
+        return text[:-1] + ",}"
+    return text.replace('"', "'")
+
+
+def canned_reply(payload: dict, rng: random.Random) -> str:
+    """Pick a reply matching whichever PromptStyler call `payload` is."""
+    user = next((m.get("content", "") for m in reversed(payload.get("messages", []))
+                 if m.get("role") == "user"), "")
+    raw = user.split("User Input:\n", 1)[-1].split("\n\n", 1)[0] if "User Input:" in user else ""
+
+    if user.startswith("Styles: "):
+        styles = [s.strip() for s in user.splitlines()[0][len("Styles: "):].split(",")]
+        return "\n".join(f"=== STYLE: {s} ===\n{styled_text(s, raw)}\n=== END {s} ===" for s in styles)
+
+    if user.startswith("Style: "):
+        return styled_text(user.splitlines()[0][len("Style: "):], raw)
+
+    if user.startswith("Rate each styled prompt"):
+        styles = re.findall(r"^--- STYLE: (\S+) ---$", user, re.M)
+        return json.dumps({"ratings": {s: rating(rng) for s in styles}})
+
+    if user.startswith("Rate this styled prompt"):
+        result = rating(rng)
+        result["verdict"] = "DO" if result["overall"] >= 7 else "DONT"
+        return json.dumps(result)
+
+    if user.startswith("Rewrite the reply below as valid JSON"):
+        # Undo what malform() does
+        broken = user.split("REPLY:\n", 1)[-1].rsplit("\n\nReturn ONLY JSON.", 1)[0]
+        fixed = re.sub(r",\s*}", "}", broken.replace("'", '"'))
+        start = fixed.find("{")
+        obj, _ = json.JSONDecoder().raw_decode(fixed, start)
+        return json.dumps(obj)
+
+    if re.match(r"Generate \d+ raw", user):
+        slots = re.findall(r"^(\d+)\. category=", user, re.M)
+        return json.dumps({"prompts": [{"slot": int(n), "prompt": raw_prompt(rng)} for n in slots]})
+
+    if user.startswith("Generate a raw"):
+        return raw_prompt(rng)
+
+    return "Mock response"
+
+
+# ─── Server ─────────────────────────────────────────
+class MockState:
+    """Counters shared by all handler threads."""
+
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.lock = threading.Lock()
+        self.window = deque()
+        self.stats = {"requests": 0, "ok": 0, "429": 0, "5xx": 0, "streamed": 0, "malformed": 0, "latency_ms": 0.0}
+
+    def admit(self) -> tuple:
+        """Decide this request's fate: (status, latency seconds, rng seed, remaining)."""
+        with self.lock:
+            self.stats["requests"] += 1
+            now = time.monotonic()
+            while self.window and now - self.window[0] > 60:
+                self.window.popleft()
+
+            remaining = None
+            if self.config.rpm:
+                remaining = max(0, self.config.rpm - len(self.window))
+
+            roll = self.rng.random()
+            if self.config.rpm and remaining == 0:
+                status = 429
+            elif roll < self.config.rate_429:
+                status = 429
+            elif roll < self.config.rate_429 + self.config.rate_5xx:
+                status = self.rng.choice([500, 502, 503])
+            else:
+                status = 200
+                self.window.append(now)
+
+            latency = sample_latency(self.config, self.rng)
+            self.stats["ok" if status == 200 else ("429" if status == 429 else "5xx")] += 1
+            self.stats["latency_ms"] += latency * 1000
+            return status, latency, self.rng.random(), remaining
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            stats = dict(self.stats)
+        stats["avg_latency_ms"] = round(stats.pop("latency_ms") / max(stats["requests"], 1), 1)
+        return stats
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None  # set by make_server
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict, headers: dict = None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/stats"):
+            self._send_json(200, self.state.snapshot())
+        else:
+            self._send_json(404, {"error": {"message": "Not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "Invalid JSON"}})
+            return
+
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "Not found"}})
+            return
+
+        config = self.state.config
+        status, latency, seed, remaining = self.state.admit()
+        time.sleep(latency)
+
+        headers = {}
+        if remaining is not None:
+            headers["x-ratelimit-limit-requests"] = str(config.rpm)
+            headers["x-ratelimit-remaining-requests"] = str(max(0, remaining - 1))
+            headers["x-ratelimit-reset-requests"] = "60s"
+
+        if status == 429:
+            headers["retry-after"] = str(config.retry_after)
+            self._send_json(429, {"error": {"message": "Rate limit reached", "type": "tokens"}}, headers)
+            return
+        if status != 200:
+            headers["retry-after"] = str(config.retry_after)
+            self._send_json(status, {"error": {"message": "Mock server error"}}, headers)
+            return
+
+        rng = random.Random(seed)
+        text = canned_reply(payload, rng)
+        judged = text.startswith(('{"clarity"', '{"ratings"'))
+        if judged and rng.random() < config.rate_malformed:
+            text = malform(text, rng)
+            with self.state.lock:
+                self.state.stats["malformed"] += 1
+            if payload.get("response_format", {}).get("type") == "json_object":
+                self._send_json(400, {"error": {"message": "Failed to generate JSON. Please adjust your prompt.",
+                                                "type": "invalid_request_error", "code": "json_validate_failed",
+                                                "failed_generation": text}}, headers)
+                return
+        prompt_chars = sum(len(m.get("content", "")) for m in payload.get("messages", []))
+        usage = {
+            "prompt_tokens": max(1, prompt_chars // 4),
+            "completion_tokens": max(1, len(text) // 4)
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        if payload.get("stream"):
+            self._stream(payload, text, usage, headers)
+            return
+
+        self._send_json(200, {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "model": payload.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": usage
+        }, headers)
+
+    def _stream(self, payload: dict, text: str, usage: dict, headers: dict):
+        """Send `text` as SSE chunks, word by word, with Groq's x_groq usage at the end."""
+        with self.state.lock:
+            self.state.stats["streamed"] += 1
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+
+        def send(event):
+            data = (f"data: {event}\n\n" if isinstance(event, str) else f"data: {json.dumps(event)}\n\n").encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        base = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "model": payload.get("model")}
+        for token in re.findall(r"\S+\s*|\s+", text):
+            send(dict(base, choices=[{"index": 0, "delta": {"content": token}}]))
+            if self.state.config.token_ms:
+                time.sleep(self.state.config.token_ms / 1000)
+        send(dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}], x_groq={"usage": usage}))
+        send("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        # Clients closing keep-alive connections at exit is normal under load
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+
+def make_server(config: MockConfig = None, host: str = "127.0.0.1", port: int = 8000):
+    """Build a mock server (not yet serving). Its MockState is at server.state."""
+    state = MockState(config or MockConfig())
+    handler = type("BoundMockHandler", (MockHandler,), {"state": state})
+    server = _Server((host, port), handler)
+    server.state = state
+    return server
+
+
+def start(config: MockConfig = None, host: str = "127.0.0.1", port: int = 8000):
+    """Serve in a background thread (for scripts and load tests); returns the server."""
+    server = make_server(config, host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Groq (OpenAI-compatible) server for load testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", "-p", type=int, default=8000)
+    parser.add_argument("--latency", choices=DISTRIBUTIONS, default="fixed", help="Latency distribution")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Mean (median for lognormal) latency")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Spread: stddev / half-range")
+    parser.add_argument("--token-ms", type=float, default=0, help="Delay between streamed chunks")
+    parser.add_argument("--rate-429", type=float, default=0, help="Fraction of requests answered 429")
+    parser.add_argument("--rate-5xx", type=float, default=0, help="Fraction of requests answered 5xx")
+    parser.add_argument("--retry-after", type=float, default=1, help="retry-after seconds on 429/5xx")
+    parser.add_argument("--rpm", type=int, default=0, help="Server-side requests per minute limit (0 = none)")
+    parser.add_argument("--seed", type=int, help="Seed for reproducible runs")
+    parser.add_argument("--rate-malformed", type=float, default=0,
+                        help="Fraction of judge replies with broken or wrapped JSON")
+    args = parser.parse_args()
+
+    config = MockConfig(args.latency, args.latency_ms, args.jitter_ms, args.token_ms,
+                        args.rate_429, args.rate_5xx, args.retry_after, args.rpm, args.seed, args.rate_malformed)
+    server = make_server(config, args.host, args.port)
+
+    print(f"Mock Groq server on http://{args.host}:{args.port}")
+    print(f"  export GROQ_API_URL=http://{args.host}:{args.port}/openai/v1/chat/completions")
+    print(f"  latency: {args.latency} {args.latency_ms}ms ±{args.jitter_ms}ms | "
+          f"429: {args.rate_429:.0%} | 5xx: {args.rate_5xx:.0%} | malformed: {args.rate_malformed:.0%} | "
+          f"rpm: {args.rpm or 'unlimited'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"\n{json.dumps(server.state.snapshot(), indent=2)}")
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,30 @@
 # Groq (generation) → Pollinations (style) → Pollinations (rate)
 
 import os
-import json
 import argparse
-from config import OUTPUT_DIR, TRAINING_DATA_FILE
+from config import OUTPUT_DIR, TRAINING_DATA_FILE, GROQ_API_KEYS, STAGE_GENERATE_WORKERS
+from dataset_stats import DatasetStats
 
-def run_pipeline(count: int = 10):
-    """Run the AI testing pipeline."""
+def run_pipeline(count: int = 10, concurrency: int = 1, resume: bool = False, sharded: bool = False,
+                 batch_styles: bool = False, batch_rating: bool = False, columnar: bool = False,
+                 bulk_generate: bool = False, stage_workers: dict = None, token_budget: int = None,
+                 feedback_loop: bool = False, similar_examples: bool = False):
+    """
+    Run the AI testing pipeline.
+    sharded=True spreads tasks over one process per key in GROQ_API_KEYS
+    and merges the shards into TRAINING_DATA_FILE.
+    batch_styles=True styles all 7 styles of a task in one request.
+    batch_rating=True rates all 7 outputs of a task in one judge request.
+    columnar=True also keeps a Parquet/Arrow copy of the data (columnar.py).
+    bulk_generate=True requests raw prompts several per call, prefetched in the background.
+    stage_workers={"generate": n, "style": n, "rate": n} runs generation, styling
+    and rating as pipelined stages with those pool sizes (stages.py).
+    token_budget caps the tokens this run may spend (split across shards).
+    feedback_loop=True feeds rated rows back as few-shot examples for later
+    styling requests (shared/feedback_store.py).
+    similar_examples=True styles with the DO examples most similar to each
+    input (example_index.py).
+    """
     
     os.makedirs(OUTPUT_DIR, exist_ok=True)
     
@@ -17,21 +35,44 @@ def run_pipeline(count: int = 10):
     print(f"Generator: Groq Llama 70B (2 sec rate limit)")
     print(f"Styler: Pollinations OpenAI (seed=42)")
     print(f"Rater: Pollinations OpenAI (no seed)")
+    if stage_workers:
+        print(f"Stages: " + " | ".join(f"{name} {n}" for name, n in stage_workers.items()))
+    else:
+        print(f"Concurrency: {concurrency}")
+    if sharded:
+        print(f"Shards: {len(GROQ_API_KEYS)} (one per API key)")
     print(f"Output: {TRAINING_DATA_FILE}")
     print("="*60)
     
-    from judge_rater_ai import JudgeRaterAI
+    if sharded:
+        from sharding import run_sharded, merge_shards
+        
+        merge_shards(run_sharded(count, concurrency=concurrency, resume=resume,
+                                 batch_styles=batch_styles, batch_rating=batch_rating,
+                                 bulk_generate=bulk_generate, stage_workers=stage_workers,
+                                 token_budget=token_budget, feedback_loop=feedback_loop,
+                                 similar_examples=similar_examples),
+                     TRAINING_DATA_FILE)
+        if columnar:
+            from columnar import convert, dataset_root
+            convert([TRAINING_DATA_FILE], dataset_root(TRAINING_DATA_FILE))
+    else:
+        from judge_rater_ai import JudgeRaterAI
+        from token_budget import get_ledger
+        
+        if token_budget:
+            get_ledger().run_budget = token_budget
+        ai = JudgeRaterAI(batch_styles=batch_styles, batch_rating=batch_rating, columnar=columnar,
+                          bulk_generate=bulk_generate, feedback_loop=feedback_loop,
+                          similar_examples=similar_examples)
+        ai.run_batch(count, TRAINING_DATA_FILE, concurrency=concurrency, resume=resume,
+                     stage_workers=stage_workers)
     
-    ai = JudgeRaterAI()
-    total_lines = ai.run_batch(count, TRAINING_DATA_FILE)
-    
-    # Summary
-    do_count = 0
-    with open(TRAINING_DATA_FILE, "r") as f:
-        for line in f:
-            data = json.loads(line)
-            if data.get("label") == "DO":
-                do_count += 1
+    # Summary from the stats sidecar; after a shard merge only the
+    # appended bytes are scanned
+    summary = DatasetStats.open(TRAINING_DATA_FILE).summary()
+    total_lines = summary["total"]
+    do_count = summary["do"]
     
     print("\n" + "="*60)
     print("COMPLETE")
@@ -45,5 +86,41 @@ def run_pipeline(count: int = 10):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--count", "-n", type=int, default=10)
+    parser.add_argument("--concurrency", "-c", type=int, default=1,
+                        help="Max requests in flight (>1 uses the asyncio engine)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue the last run from its manifest, skipping finished units")
+    parser.add_argument("--sharded", action="store_true",
+                        help="One worker process per key in GROQ_API_KEYS, merged at the end")
+    parser.add_argument("--batch-styles", action="store_true",
+                        help="Request all styles of a task in one completion (per-style fallback)")
+    parser.add_argument("--batch-rating", action="store_true",
+                        help="Rate all styles of a task in one judge request")
+    parser.add_argument("--columnar", action="store_true",
+                        help="Also write a Parquet/Arrow dataset partitioned by style/category (needs pyarrow)")
+    parser.add_argument("--bulk-generate", action="store_true",
+                        help="Generate raw prompts several per request, prefetched in the background")
+    parser.add_argument("--staged", action="store_true",
+                        help="Run generate/style/rate as separate worker pools joined by bounded queues")
+    parser.add_argument("--generate-workers", type=int, default=STAGE_GENERATE_WORKERS,
+                        help=f"Generator pool size with --staged (default {STAGE_GENERATE_WORKERS})")
+    parser.add_argument("--style-workers", type=int, help="Styler pool size with --staged (default: --concurrency)")
+    parser.add_argument("--rate-workers", type=int, help="Rater pool size with --staged (default: --concurrency)")
+    parser.add_argument("--token-budget", type=int,
+                        help="Stop once this run has used this many tokens (counted locally before each request)")
+    parser.add_argument("--feedback-loop", action="store_true",
+                        help="Store ratings as feedback and style with each style's top-rated examples")
+    parser.add_argument("--similar-examples", action="store_true",
+                        help="Style with the DO examples most similar to each input (embedding index, needs numpy)")
     args = parser.parse_args()
-    run_pipeline(args.count)
+    
+    stage_workers = None
+    if args.staged:
+        stage_workers = {
+            "generate": args.generate_workers,
+            "style": args.style_workers or args.concurrency,
+            "rate": args.rate_workers or args.concurrency
+        }
+    run_pipeline(args.count, args.concurrency, args.resume, args.sharded, args.batch_styles, args.batch_rating,
+                 args.columnar, args.bulk_generate, stage_workers, args.token_budget, args.feedback_loop,
+                 args.similar_examples)
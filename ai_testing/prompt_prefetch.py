@@ -0,0 +1,106 @@
+# Prompt Prefetch - Background bulk generation of raw task prompts
+# One request returns BULK_PROMPTS_PER_CALL prompts (JudgeRaterAI.generate_tasks);
+# a producer thread keeps a bounded queue of them ready, so process_task
+# takes its prompt from the queue instead of waiting on a generation round
+# trip. Production stops once `total` prompts have been handed out.
+
+import time
+import queue
+import random
+import threading
+from config import BULK_PROMPTS_PER_CALL, PREFETCH_QUEUE_SIZE
+
+MAX_FAILURES = 3
+
+
+class PromptPrefetcher:
+    """
+    Producer/consumer queue of generated tasks.
+
+    generate_batch(specs, variant) -> list of task dicts, where specs is a
+    list of (category, difficulty) slots. Rejected prompts (e.g. near
+    duplicates) should be reported with reject() so a replacement is made.
+    """
+
+    def __init__(self, generate_batch, categories: list, total: int, batch_size: int = BULK_PROMPTS_PER_CALL,
+                 queue_size: int = PREFETCH_QUEUE_SIZE, variant_prefix: str = "bulk"):
+        self.generate_batch = generate_batch
+        self.categories = categories
+        self.total = total
+        self.batch_size = batch_size
+        self.variant_prefix = variant_prefix
+        self.queue = queue.Queue(queue_size)
+        self.produced = 0
+        self.rejected = 0
+        self.calls = 0
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> "PromptPrefetcher":
+        self._thread.start()
+        return self
+
+    def _remaining(self) -> int:
+        return self.total + self.rejected - self.produced
+
+    def _run(self):
+        failures = 0
+        while not self._stop.is_set():
+            with self._cond:
+                while self._remaining() <= 0 and not self._stop.is_set():
+                    self._cond.wait()
+                n = min(self.batch_size, self._remaining())
+            if self._stop.is_set():
+                return
+
+            specs = [(random.choice(self.categories), random.choice(["easy", "medium", "hard"])) for _ in range(n)]
+            try:
+                tasks = self.generate_batch(specs, f"{self.variant_prefix}:{self.calls}")
+            except Exception as e:
+                print(f"  Bulk generation error: {e}")
+                tasks = []
+            self.calls += 1
+
+            if not tasks:
+                failures += 1
+                if failures >= MAX_FAILURES:
+                    print(f"  Bulk generation failed {failures} times; falling back to one prompt per call")
+                    return
+                time.sleep(2 ** failures)
+                continue
+            failures = 0
+
+            for task in tasks:
+                while not self._stop.is_set():
+                    try:
+                        self.queue.put(task, timeout=0.5)
+                        break
+                    except queue.Full:
+                        continue
+                with self._cond:
+                    self.produced += 1
+
+    def get(self, timeout: float = 120):
+        """Next generated task, or None if the producer stopped or timed out."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                return self.queue.get(timeout=0.5)
+            except queue.Empty:
+                if self._stop.is_set() or not self._thread.is_alive():
+                    return None
+        print(f"  Prompt prefetch timed out after {timeout:.0f}s; falling back to one prompt per call")
+        return None
+
+    def reject(self):
+        """A handed-out task was unusable; produce one more."""
+        with self._cond:
+            self.rejected += 1
+            self._cond.notify()
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify()
+        self._thread.join(timeout=5)
@@ -2,86 +2,207 @@
 # Uses shared system prompt from shared/system_prompt.py
 
 import os
+import re
 import sys
-import time
-import requests
 
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from config import GROQ_API_KEY, GROQ_API_URL, GROQ_MODEL, GROQ_DELAY_MS, STYLES
-from shared.system_prompt import SYSTEM_PROMPT
+from config import (
+    GROQ_API_KEY, GROQ_MODEL, STYLES, STYLE_MAX_TOKENS, DEFAULT_MAX_TOKENS, SLICED_SYSTEM_PROMPT,
+    FEEDBACK_EXAMPLES, EXAMPLE_K
+)
+from transport import post_chat, stream_chat
+from rate_limiter import estimate_tokens
+from token_budget import BudgetExceeded
+import response_cache
+from shared.system_prompt import SYSTEM_PROMPT, build_system_prompt
 
-last_request_time = 0
+# Batched mode: each style's rewrite is fenced by marker lines
+MARKER_TOKENS = 16      # completion tokens for one style's pair of marker lines
+BATCH_SECTION = re.compile(r"^=== STYLE: ([A-Z]+) ===[ \t]*\n(.*?)\n=== END \1 ===[ \t]*$", re.M | re.S)
 
-def apply_style(raw_prompt: str, style: str, max_retries: int = 3, api_key: str = None) -> str:
+
+def max_tokens_for(style: str) -> int:
+    """Completion cap for one style (STYLE_MAX_TOKENS)."""
+    return STYLE_MAX_TOKENS.get(style.lower(), DEFAULT_MAX_TOKENS)
+
+
+def system_prompt_for(styles: list, sliced: bool = None) -> str:
+    """Full system prompt, or only the sections for `styles` (default: SLICED_SYSTEM_PROMPT)."""
+    if sliced is None:
+        sliced = SLICED_SYSTEM_PROMPT
+    return build_system_prompt(*styles) if sliced else SYSTEM_PROMPT
+
+
+def few_shot_context(raw_prompt: str, style: str, feedback=None, examples=None) -> str:
+    """Few-shot blocks appended to the system prompt for one style ('' if none)."""
+    context = ""
+    if feedback is not None:
+        context += feedback.few_shot_block(style, FEEDBACK_EXAMPLES)
+    if examples is not None:
+        context += examples.few_shot_block(raw_prompt, style, EXAMPLE_K)
+    return context
+
+
+def style_payload(raw_prompt: str, style: str, sliced: bool = None, feedback=None, examples=None) -> dict:
+    """
+    Chat payload for one style, constructed like popup.js does, except
+    that by default the system prompt only carries this style's section.
+    With a `feedback` store (shared/feedback_store.py), the style's top
+    examples are appended as smart_prompt.js does; with an `examples` index
+    (example_index.py), the DO examples most similar to raw_prompt are.
+    """
+    user_prompt = f"Style: {style.upper()}\n\nUser Input:\n{raw_prompt}"
+    system_prompt = system_prompt_for([style], sliced) + few_shot_context(raw_prompt, style, feedback, examples)
+    
+    return {
+        "model": GROQ_MODEL,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ],
+        "temperature": 0.7,
+        "max_tokens": max_tokens_for(style)
+    }
+
+
+def _complete(payload: dict, key: str, max_retries: int = None, use_cache: bool = True, on_token=None) -> str:
+    """
+    Send a payload (up to max_retries attempts, default RETRY_MAX_ATTEMPTS,
+    see retry_policy.py); identical requests come from the response cache.
+    With `on_token`, the completion is streamed and each token is passed to it
+    as it arrives (a cache hit is delivered as one chunk).
+    """
+    
+    cache_key, cached = response_cache.lookup(payload) if use_cache else (None, None)
+    if cached is not None:
+        if on_token:
+            on_token(cached)
+        return cached
+    
+    # Retries (jittered backoff, retry-after, circuit breaker) happen in the transport
+    try:
+        if on_token:
+            stream = stream_chat(payload, key, timeout=60, max_attempts=max_retries)
+            for token in stream:
+                on_token(token)
+            status, text = stream.status_code, stream.text
+        else:
+            response = post_chat(payload, key, timeout=60, max_attempts=max_retries)
+            status, text = response.status_code, None
+            if status == 200:
+                data = response.json()
+                text = data["choices"][0]["message"]["content"].strip()
+        
+        if status == 200:
+            response_cache.store(cache_key, text)
+            return text
+        print(f"Groq Error {status}")
+    except BudgetExceeded:
+        raise
+    except Exception as e:
+        print(f"Request failed: {e}")
+    
+    return None
+
+
+def apply_style(raw_prompt: str, style: str, max_retries: int = None, api_key: str = None, on_token=None,
+                feedback=None, examples=None) -> str:
     """
     Apply a style to a raw prompt using Groq AI.
     Simulates the PromptStyler extension behavior.
-    Includes retry logic with exponential backoff.
+    Retried under the shared retry policy (retry_policy.py).
+    Identical requests are served from the response cache.
+    Pass `on_token` to stream the output token by token.
+    Pass a FeedbackStore as `feedback` to inject its top examples for the
+    style, like the extension's learning loop. Pass an ExampleIndex as
+    `examples` to inject the DO examples most similar to the input.
     """
-    global last_request_time
-    
     # Use provided key or fall back to environment variable
     key = api_key or GROQ_API_KEY
     if not key:
         print("Error: No Groq API key provided. Set GROQ_API_KEY environment variable.")
         return None
     
-    # Rate limiting
-    elapsed_ms = (time.time() * 1000) - last_request_time
-    if elapsed_ms < GROQ_DELAY_MS:
-        time.sleep((GROQ_DELAY_MS - elapsed_ms) / 1000)
-    last_request_time = time.time() * 1000
-    
-    # Construct prompt like popup.js does
-    user_prompt = f"Style: {style.upper()}\n\nUser Input:\n{raw_prompt}"
+    payload = style_payload(raw_prompt, style, feedback=feedback, examples=examples)
+    return _complete(payload, key, max_retries, on_token=on_token)
+
+
+def parse_batch(text: str, styles: list) -> dict:
+    """Extract {style: output} from a batched completion; unparseable sections are left out."""
+    wanted = {s.upper(): s for s in styles}
+    outputs = {}
+    for name, body in BATCH_SECTION.findall(text or ""):
+        body = body.strip()
+        if name in wanted and body:
+            outputs[wanted[name]] = body
+    return outputs
+
+
+def apply_styles(raw_prompt: str, styles: list, max_retries: int = None, api_key: str = None,
+                 report: dict = None, use_cache: bool = True, feedback=None, examples=None) -> dict:
+    """
+    Apply several styles to a raw prompt in a single completion, so the
+    system prompt is sent once instead of once per style.
+    With a `feedback` store or an `examples` index, each style's few-shot
+    examples are added to the system prompt under that style's name.
+    Any style whose section is missing or malformed falls back to apply_style.
+    Returns {style: output or None}. If `report` is a dict it is filled with
+    batched/fallback style lists and the estimated prompt tokens saved.
+    """
+    key = api_key or GROQ_API_KEY
+    if not key:
+        print("Error: No Groq API key provided. Set GROQ_API_KEY environment variable.")
+        return {style: None for style in styles}
     
+    markers = "\n".join(f"=== STYLE: {s.upper()} ===\n<{s.upper()} rewrite>\n=== END {s.upper()} ===" for s in styles)
+    user_prompt = (
+        f"Styles: {', '.join(s.upper() for s in styles)}\n\n"
+        f"User Input:\n{raw_prompt}\n\n"
+        "Rewrite the user input once for EACH style above, following that style's rules. "
+        "Output every rewrite between its marker lines, exactly like this, with nothing outside the markers:\n"
+        f"{markers}"
+    )
+    system_prompt = system_prompt_for(styles)
+    for style in styles:
+        context = few_shot_context(raw_prompt, style, feedback, examples)
+        if context:
+            # The blocks say "FOR THIS STYLE": name the style each one belongs to
+            system_prompt += f"\n\nExamples for {style.upper()}:{context}"
     payload = {
         "model": GROQ_MODEL,
         "messages": [
-            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt}
         ],
         "temperature": 0.7,
-        "max_tokens": 2048
+        "max_tokens": min(sum(max_tokens_for(s) + MARKER_TOKENS for s in styles), 8192)
     }
     
-    headers = {
-        "Authorization": f"Bearer {key}",
-        "Content-Type": "application/json"
-    }
+    text = _complete(payload, key, max_retries, use_cache)
+    outputs = parse_batch(text, styles)
+    fallback = [s for s in styles if s not in outputs]
     
-    # Retry logic with exponential backoff
-    for attempt in range(max_retries):
-        try:
-            response = requests.post(
-                GROQ_API_URL,
-                headers=headers,
-                json=payload,
-                timeout=60
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                return data["choices"][0]["message"]["content"].strip()
-            elif response.status_code == 429:
-                print(f"Rate limited (attempt {attempt + 1}/{max_retries})")
-            else:
-                print(f"Groq Error {response.status_code} (attempt {attempt + 1}/{max_retries})")
-                
-        except requests.exceptions.Timeout:
-            print(f"Timeout (attempt {attempt + 1}/{max_retries})")
-        except Exception as e:
-            print(f"Request failed: {e} (attempt {attempt + 1}/{max_retries})")
-        
-        # Exponential backoff before retry
-        if attempt < max_retries - 1:
-            wait_time = 2 ** attempt
-            print(f"Retrying in {wait_time}s...")
-            time.sleep(wait_time)
+    for style in fallback:
+        outputs[style] = _complete(style_payload(raw_prompt, style, feedback=feedback, examples=examples),
+                                   key, max_retries, use_cache)
     
-    return None
+    # Prompt tokens the batched sections would have cost as separate calls,
+    # minus what the batched call itself cost
+    batched = [s for s in styles if s not in fallback]
+    saved = 0
+    if batched:
+        saved = sum(estimate_tokens(style_payload(raw_prompt, s, feedback=feedback, examples=examples))
+                    for s in batched) - estimate_tokens(payload)
+    
+    print(f"  Batched {len(batched)}/{len(styles)} styles in one call (~{saved} prompt tokens saved)"
+          + (f", fallback: {', '.join(fallback)}" if fallback else ""))
+    
+    if report is not None:
+        report.update({"batched": batched, "fallback": fallback, "tokens_saved": saved})
+    
+    return {style: outputs.get(style) for style in styles}
 
 
 def get_style_info(style_name: str) -> dict:
@@ -0,0 +1,202 @@
+# Rate Limiter - Shared token-bucket throttle for all Groq calls
+# One limiter enforces request and token budgets per minute and per day.
+# Thread-safe (lock around bucket state). The asyncio and staged engines run
+# requests in worker threads (asyncio.to_thread), so acquire() blocks only
+# that thread, never the event loop.
+
+import re
+import time
+import threading
+from config import (
+    GROQ_REQUESTS_PER_MINUTE, GROQ_TOKENS_PER_MINUTE,
+    GROQ_REQUESTS_PER_DAY, GROQ_TOKENS_PER_DAY
+)
+from tokenizer import count_tokens
+
+MINUTE = 60.0
+DAY = 86400.0
+MESSAGE_OVERHEAD = 4    # role and separator tokens per chat message
+
+
+def estimate_tokens(payload: dict) -> int:
+    """Prompt tokens of a chat payload, counted with the local tokenizer."""
+    messages = payload.get("messages", [])
+    return max(1, sum(count_tokens(m.get("content", "")) + MESSAGE_OVERHEAD for m in messages))
+
+
+def parse_reset(value: str) -> float:
+    """Parse Groq reset durations like '7.66s', '2m59.56s' or '120ms' into seconds."""
+    if not value:
+        return 0.0
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    seconds = 0.0
+    for amount, unit in re.findall(r"([\d.]+)(ms|h|m|s)", value):
+        amount = float(amount)
+        if unit == "ms":
+            seconds += amount / 1000
+        elif unit == "h":
+            seconds += amount * 3600
+        elif unit == "m":
+            seconds += amount * 60
+        else:
+            seconds += amount
+    return seconds
+
+
+class TokenBucket:
+    """Classic token bucket: `capacity` units refilled evenly over `period` seconds."""
+
+    def __init__(self, capacity: float, period: float):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` units are available (0 if available now)."""
+        self._refill(now)
+        # A single request larger than the bucket would never fit; cap it.
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+    def update(self, limit: float, remaining: float, reset: float, now: float):
+        """Adopt the server's view of this budget."""
+        self._refill(now)
+        if limit > 0:
+            self.capacity = float(limit)
+        self.level = min(self.capacity, float(remaining))
+        # `reset` is the time until the bucket is full again, which gives
+        # the real refill rate without knowing the server's window length.
+        if reset > 0 and self.capacity > self.level:
+            self.rate = (self.capacity - self.level) / reset
+
+
+def synced_tokens(headers) -> bool:
+    """True if `headers` report the remaining minute tokens (update_from_headers syncs to them)."""
+    return bool(headers) and headers.get("x-ratelimit-limit-tokens") is not None \
+        and headers.get("x-ratelimit-remaining-tokens") is not None
+
+
+class RateLimiter:
+    """
+    Request/token budget shared by every call site.
+
+    Usage:
+        reserved = estimate_tokens(payload)
+        limiter.acquire(reserved)
+        response = requests.post(...)
+        limiter.observe(response, reserved)
+    """
+
+    def __init__(self, rpm: int = GROQ_REQUESTS_PER_MINUTE, tpm: int = GROQ_TOKENS_PER_MINUTE,
+                 rpd: int = GROQ_REQUESTS_PER_DAY, tpd: int = GROQ_TOKENS_PER_DAY):
+        self.requests_minute = TokenBucket(rpm, MINUTE)
+        self.tokens_minute = TokenBucket(tpm, MINUTE)
+        self.requests_day = TokenBucket(rpd, DAY)
+        self.tokens_day = TokenBucket(tpd, DAY)
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens: int) -> float:
+        """Take budget if available; otherwise return seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(
+                self.blocked_until - now,
+                self.requests_minute.wait_time(1, now),
+                self.requests_day.wait_time(1, now),
+                self.tokens_minute.wait_time(tokens, now),
+                self.tokens_day.wait_time(tokens, now)
+            )
+            if wait <= 0:
+                self.requests_minute.take(1)
+                self.requests_day.take(1)
+                self.tokens_minute.take(tokens)
+                self.tokens_day.take(tokens)
+            return wait
+
+    def acquire(self, tokens: int = 0):
+        """Block the calling thread until one request of `tokens` fits the budget."""
+        while True:
+            wait = self._reserve(tokens)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def record_usage(self, reserved: int, actual: int, synced: bool = False):
+        """
+        Charge the difference between the estimate and the reported total tokens.
+        synced=True: the minute bucket was set from x-ratelimit-remaining-tokens,
+        which already counts this request, so only the daily bucket is corrected.
+        """
+        extra = actual - reserved
+        if extra == 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            for bucket in (self.tokens_day,) if synced else (self.tokens_minute, self.tokens_day):
+                bucket._refill(now)
+                bucket.level = min(bucket.capacity, bucket.level - extra)
+
+    def pause(self, seconds: float):
+        """Stop handing out budget for `seconds` (e.g. after a 429)."""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def update_from_headers(self, headers):
+        """
+        Sync budgets with Groq's x-ratelimit-* headers.
+        Groq reports requests per day and tokens per minute.
+        """
+        if not headers:
+            return
+        with self._lock:
+            now = time.monotonic()
+            for kind, bucket in (("requests", self.requests_day), ("tokens", self.tokens_minute)):
+                limit = headers.get(f"x-ratelimit-limit-{kind}")
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                if limit is None or remaining is None:
+                    continue
+                try:
+                    bucket.update(float(limit), float(remaining),
+                                  parse_reset(headers.get(f"x-ratelimit-reset-{kind}", "")), now)
+                except ValueError:
+                    continue
+
+    def observe(self, response, reserved: int = 0):
+        """Feed a finished response back into the limiter."""
+        self.update_from_headers(response.headers)
+
+        if response.status_code == 429:
+            self.pause(parse_reset(response.headers.get("retry-after", "")) or 1.0)
+        elif response.status_code == 200:
+            try:
+                usage = response.json().get("usage") or {}
+            except ValueError:
+                usage = {}
+            if "total_tokens" in usage:
+                self.record_usage(reserved, usage["total_tokens"], synced_tokens(response.headers))
+
+
+# One limiter per API key - each key has its own quota
+_limiters = {}
+_limiter_lock = threading.Lock()
+
+def get_limiter(api_key: str = None) -> RateLimiter:
+    with _limiter_lock:
+        if api_key not in _limiters:
+            _limiters[api_key] = RateLimiter()
+        return _limiters[api_key]
@@ -0,0 +1,173 @@
+# Response Cache - Content-addressed on-disk cache for chat completions
+# Keyed by a hash of (model, messages, temperature, max_tokens), stored in
+# SQLite with size-bounded LRU eviction. The whole cache is dropped when
+# shared/system_prompt.py changes, so tuning the prompt never serves stale output.
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import CACHE_ENABLED, CACHE_PATH, CACHE_MAX_BYTES
+from shared.system_prompt import SYSTEM_PROMPT
+
+
+def prompt_fingerprint() -> str:
+    """Hash of the current system prompt; a change invalidates the cache."""
+    return hashlib.sha256(SYSTEM_PROMPT.encode("utf-8")).hexdigest()
+
+
+def cache_key(payload: dict, variant=None) -> str:
+    """
+    Content address for a chat payload.
+    `variant` separates calls that must not share an answer even with an
+    identical payload (e.g. several high-temperature samples of one prompt).
+    """
+    material = {
+        "model": payload.get("model"),
+        "messages": payload.get("messages"),
+        "temperature": payload.get("temperature"),
+        "max_tokens": payload.get("max_tokens"),
+        "variant": variant
+    }
+    blob = json.dumps(material, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed LRU cache of completion texts. Safe to share across threads."""
+
+    def __init__(self, path: str = CACHE_PATH, max_bytes: int = CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS entries (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            last_access REAL NOT NULL
+        )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_entries_access ON entries(last_access)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self._check_fingerprint()
+        self.db.commit()
+        # Running total of entry sizes, so a put does not scan the table
+        self.bytes = self._total()
+
+    def _total(self) -> int:
+        return self.db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def _check_fingerprint(self):
+        fingerprint = prompt_fingerprint()
+        row = self.db.execute("SELECT value FROM meta WHERE name = 'system_prompt'").fetchone()
+        if row and row[0] != fingerprint:
+            print("  Response cache: system prompt changed, clearing cache")
+            self.db.execute("DELETE FROM entries")
+        self.db.execute("INSERT OR REPLACE INTO meta VALUES ('system_prompt', ?)", (fingerprint,))
+
+    def get(self, key: str):
+        with self._lock:
+            row = self.db.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.db.commit()
+            return row[0]
+
+    def put(self, key: str, value: str):
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            old = self.db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self.db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                            (key, value, size, time.time()))
+            self.bytes += size - (old[0] if old else 0)
+            self._evict()
+            self.db.commit()
+
+    def _evict(self):
+        """Drop least recently used entries until under max_bytes."""
+        if self.bytes <= self.max_bytes:
+            return
+        # Other processes (shards) share the file: recount before evicting
+        total = self._total()
+        if total <= self.max_bytes:
+            self.bytes = total
+            return
+        # Evict down to 90% so we don't evict on every single put
+        target = int(self.max_bytes * 0.9)
+        for key, size in self.db.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall():
+            if total <= target:
+                break
+            self.db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+        self.bytes = total
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, total = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"entries": count, "bytes": total, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        with self._lock:
+            self.db.execute("DELETE FROM entries")
+            self.db.commit()
+            self.bytes = 0
+
+
+# Singleton
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """Shared cache, or None when disabled (PROMPTSTYLER_CACHE=0)."""
+    global _cache
+    if not CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+    return _cache
+
+
+def lookup(payload: dict, variant=None):
+    """Return (key, cached_text). key is None when caching is disabled."""
+    cache = get_cache()
+    if cache is None:
+        return None, None
+    key = cache_key(payload, variant)
+    return key, cache.get(key)
+
+
+def store(key: str, text: str):
+    """Store a completion under a key from lookup(); no-op when disabled."""
+    if key is None or not text:
+        return
+    get_cache().put(key, text)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or clear the response cache")
+    parser.add_argument("--clear", action="store_true")
+    args = parser.parse_args()
+
+    cache = ResponseCache()
+    if args.clear:
+        cache.clear()
+        print(f"Cleared {CACHE_PATH}")
+    print(json.dumps(cache.stats(), indent=2))
@@ -0,0 +1,222 @@
+# Retry Policy - One retry policy for every Groq call
+# post_chat/stream_chat run each request through it, so the generator, the
+# styler and the judge all retry the same way: 429, 5xx, timeouts and
+# connection errors are retried with full-jitter exponential backoff, or
+# after the server's retry-after when it sends one. Retries spend from a
+# per-run budget (a fraction of the requests sent), so a failing upstream
+# is not hit with several times the normal traffic. A circuit breaker per
+# upstream URL opens after CIRCUIT_FAILURES consecutive failures: every
+# worker then waits out CIRCUIT_COOLDOWN, one probe request goes through,
+# and its outcome closes the circuit or opens it again.
+
+import time
+import random
+import threading
+import requests
+from config import (
+    RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY, RETRY_AFTER_LIMIT,
+    RETRY_BUDGET_RATIO, RETRY_BUDGET_MIN, CIRCUIT_FAILURES, CIRCUIT_COOLDOWN
+)
+from rate_limiter import parse_reset
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = (requests.exceptions.Timeout, requests.exceptions.ConnectionError) + \
+    ((httpx.TimeoutException, httpx.NetworkError) if httpx is not None else ())
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker shared by every worker calling one upstream.
+    While open, before() blocks; after the cooldown one caller is let through
+    as a probe and everyone else keeps waiting for its result.
+    """
+
+    def __init__(self, name: str = "", failures: int = CIRCUIT_FAILURES, cooldown: float = CIRCUIT_COOLDOWN):
+        self.name = name
+        self.failures = failures
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.consecutive = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _admit(self) -> float:
+        """0 if the caller may send now, else seconds to wait."""
+        with self._lock:
+            if self.state == CLOSED:
+                return 0.0
+            now = time.monotonic()
+            if self.state == OPEN:
+                remaining = self.opened_at + self.cooldown - now
+                if remaining > 0:
+                    return remaining
+                self.state = HALF_OPEN
+            if self._probing:
+                return min(1.0, self.cooldown)
+            self._probing = True
+            return 0.0
+
+    def before(self):
+        """Block while the circuit is open (or a probe is in flight)."""
+        while True:
+            wait = self._admit()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def record(self, ok: bool):
+        with self._lock:
+            self._probing = False
+            if ok:
+                if self.state != CLOSED:
+                    print(f"  Circuit closed: {self.name} is responding again")
+                self.state = CLOSED
+                self.consecutive = 0
+                return
+            self.consecutive += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.consecutive >= self.failures):
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self.trips += 1
+                print(f"  Circuit open: {self.consecutive} consecutive failures from {self.name}, "
+                      f"pausing all requests for {self.cooldown:.0f}s")
+
+    def cancel(self):
+        """The admitted request was never sent (e.g. BudgetExceeded): free the probe slot."""
+        with self._lock:
+            self._probing = False
+
+
+class RetryBudget:
+    """Retries allowed this run: RETRY_BUDGET_MIN plus RETRY_BUDGET_RATIO per request sent."""
+
+    def __init__(self, ratio: float = RETRY_BUDGET_RATIO, minimum: int = RETRY_BUDGET_MIN):
+        self.ratio = ratio
+        self.minimum = minimum
+        self.requests = 0
+        self.retries = 0
+        self.denied = 0
+        self._lock = threading.Lock()
+
+    def sent(self):
+        with self._lock:
+            self.requests += 1
+
+    def spend(self) -> bool:
+        """Take one retry from the budget; False once it is used up."""
+        with self._lock:
+            if self.retries < self.minimum + self.ratio * self.requests:
+                self.retries += 1
+                return True
+            self.denied += 1
+            return False
+
+
+def retry_after(headers) -> float:
+    """Seconds from a retry-after header (0 if absent or not a number of seconds)."""
+    return parse_reset((headers or {}).get("retry-after", ""))
+
+
+class RetryPolicy:
+    """
+    Runs a request function under the retry budget and the breaker for its
+    URL. `send` returns a response (anything with status_code and headers)
+    or raises; the final response is returned whatever its status, so call
+    sites keep handling non-200s, and the final exception is re-raised.
+    """
+
+    def __init__(self, max_attempts: int = RETRY_MAX_ATTEMPTS, base_delay: float = RETRY_BASE_DELAY,
+                 max_delay: float = RETRY_MAX_DELAY, budget: RetryBudget = None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget or RetryBudget()
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, url: str) -> CircuitBreaker:
+        with self._lock:
+            if url not in self._breakers:
+                self._breakers[url] = CircuitBreaker(url)
+            return self._breakers[url]
+
+    def backoff(self, attempt: int, wait_hint: float = 0.0) -> float:
+        """The server's retry-after if given, else full jitter: uniform(0, min(max, base * 2^attempt))."""
+        if wait_hint > 0:
+            return wait_hint
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def run(self, send, url: str, max_attempts: int = None, discard=None):
+        """
+        Call `send()` until it returns a non-retryable response, attempts or
+        the retry budget run out. `discard(response)` is called on responses
+        that are retried (e.g. to close a stream).
+        """
+        attempts = max_attempts or self.max_attempts
+        breaker = self.breaker(url)
+        for attempt in range(attempts):
+            breaker.before()
+            try:
+                response = send()
+            except RETRYABLE_ERRORS as e:
+                response, error, wait_hint = None, e, 0.0
+                breaker.record(False)
+            except BaseException:
+                # Not an upstream failure (budget, bad payload, ...): never retried
+                breaker.cancel()
+                raise
+            else:
+                if response.status_code not in RETRYABLE_STATUS:
+                    breaker.record(True)
+                    self.budget.sent()
+                    return response
+                error, wait_hint = f"HTTP {response.status_code}", retry_after(response.headers)
+                # 429 is the server throttling us, not the server failing
+                breaker.record(response.status_code == 429)
+            self.budget.sent()
+
+            if attempt == attempts - 1:
+                break
+            if wait_hint > RETRY_AFTER_LIMIT:
+                print(f"  {error}: retry-after {wait_hint:.0f}s is over the {RETRY_AFTER_LIMIT:.0f}s limit, giving up")
+                break
+            if not self.budget.spend():
+                print(f"  {error}: retry budget used up ({self.budget.retries} retries), not retrying")
+                break
+            wait = self.backoff(attempt, wait_hint)
+            print(f"  {error}, retrying in {wait:.1f}s (attempt {attempt + 2}/{attempts})")
+            if response is not None and discard is not None:
+                discard(response)
+            time.sleep(wait)
+
+        if response is None:
+            raise error
+        return response
+
+    def summary(self) -> dict:
+        with self._lock:
+            trips = sum(b.trips for b in self._breakers.values())
+            open_now = [b.name for b in self._breakers.values() if b.state != CLOSED]
+        return {"requests": self.budget.requests, "retries": self.budget.retries,
+                "denied": self.budget.denied, "circuit_trips": trips, "open": open_now}
+
+
+# Singleton: one budget and one breaker per URL for the whole run
+_policy = None
+_policy_lock = threading.Lock()
+
+def get_policy() -> RetryPolicy:
+    global _policy
+    with _policy_lock:
+        if _policy is None:
+            _policy = RetryPolicy()
+    return _policy
@@ -0,0 +1,155 @@
+# Run Manifest - Durable per-(task, style) state for run_batch
+# Lets an interrupted batch resume without repeating paid API calls:
+# generated prompts and finished style/rating units are stored as they
+# complete, and the output file is only trusted up to the last checkpoint.
+
+import json
+import uuid
+import sqlite3
+import threading
+
+# Unit states
+DONE = "done"
+FAILED = "failed"
+
+
+def manifest_path(output_file: str) -> str:
+    return f"{output_file}.manifest.sqlite"
+
+
+class RunManifest:
+    """
+    SQLite record of one run_batch call.
+
+    tasks: task_id -> category, difficulty, raw_prompt
+    units: (task_id, style) -> status, result JSON, written flag
+    meta:  count, start_id, committed_offset (bytes of the output file known to be good), run_id
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS tasks (
+                task_id INTEGER PRIMARY KEY,
+                category TEXT,
+                difficulty TEXT,
+                raw_prompt TEXT
+            );
+            CREATE TABLE IF NOT EXISTS units (
+                task_id INTEGER,
+                style TEXT,
+                status TEXT,
+                result TEXT,
+                written INTEGER DEFAULT 0,
+                PRIMARY KEY (task_id, style)
+            );
+        """)
+        self.db.commit()
+
+    # ─── Run metadata ───────────────────────────────────
+    def _get_meta(self, name: str, default=None):
+        row = self.db.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _set_meta(self, name: str, value):
+        self.db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (name, json.dumps(value)))
+
+    def reset(self, count: int, start_offset: int, start_id: int = 1):
+        """Start a fresh run, forgetting any previous state."""
+        with self._lock:
+            self.db.execute("DELETE FROM tasks")
+            self.db.execute("DELETE FROM units")
+            self.db.execute("DELETE FROM meta")
+            self._set_meta("count", count)
+            self._set_meta("start_id", start_id)
+            self._set_meta("committed_offset", start_offset)
+            self._set_meta("run_id", uuid.uuid4().hex)
+            self.db.commit()
+
+    @property
+    def count(self) -> int:
+        with self._lock:
+            return self._get_meta("count", 0)
+
+    @property
+    def start_id(self) -> int:
+        with self._lock:
+            return self._get_meta("start_id", 1)
+
+    @property
+    def run_id(self) -> str:
+        """Stable across resumes of the same run."""
+        with self._lock:
+            return self._get_meta("run_id", "")
+
+    @property
+    def committed_offset(self) -> int:
+        with self._lock:
+            return self._get_meta("committed_offset", 0)
+
+    # ─── Tasks ──────────────────────────────────────────
+    def get_task(self, task_id: int):
+        with self._lock:
+            row = self.db.execute(
+                "SELECT category, difficulty, raw_prompt FROM tasks WHERE task_id = ?", (task_id,)
+            ).fetchone()
+        if not row:
+            return None
+        return {"category": row[0], "difficulty": row[1], "raw_prompt": row[2]}
+
+    def save_task(self, task_id: int, category: str, difficulty: str, raw_prompt: str):
+        with self._lock:
+            self.db.execute("INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?)",
+                            (task_id, category, difficulty, raw_prompt))
+            self.db.commit()
+
+    # ─── Units ──────────────────────────────────────────
+    def get_unit(self, task_id: int, style: str):
+        """Finished unit as a style_result dict, or None if it must be (re)run."""
+        with self._lock:
+            row = self.db.execute(
+                "SELECT result, written FROM units WHERE task_id = ? AND style = ? AND status = ?",
+                (task_id, style, DONE)
+            ).fetchone()
+        if not row:
+            return None
+        result = json.loads(row[0])
+        result["written"] = bool(row[1])
+        return result
+
+    def save_unit(self, task_id: int, style: str, result: dict):
+        status = FAILED if "error" in result else DONE
+        with self._lock:
+            self.db.execute("INSERT OR REPLACE INTO units VALUES (?, ?, ?, ?, 0)",
+                            (task_id, style, status, json.dumps(result, ensure_ascii=False)))
+            self.db.commit()
+
+    def is_complete(self, task_id: int, styles: list) -> bool:
+        """True when every style of the task is done and already in the output file."""
+        with self._lock:
+            n = self.db.execute(
+                "SELECT COUNT(*) FROM units WHERE task_id = ? AND status = ? AND written = 1",
+                (task_id, DONE)
+            ).fetchone()[0]
+        return n == len(styles)
+
+    def checkpoint(self, units: list, offset: int):
+        """Mark (task_id, style) units as durably written up to `offset` bytes."""
+        with self._lock:
+            self.db.executemany("UPDATE units SET written = 1 WHERE task_id = ? AND style = ?", units)
+            self._set_meta("committed_offset", offset)
+            self.db.commit()
+
+    def progress(self) -> dict:
+        with self._lock:
+            rows = self.db.execute("SELECT status, COUNT(*) FROM units GROUP BY status").fetchall()
+            tasks = self.db.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+        counts = dict(rows)
+        return {"tasks": tasks, "done": counts.get(DONE, 0), "failed": counts.get(FAILED, 0)}
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,122 @@
+# Sharding - Multi-process dataset generation across several API keys
+# Each worker process gets one key (and so its own client + rate limiter),
+# a deterministic task-id range and its own shard file; merge_shards then
+# folds the shards into one deduplicated training_data.jsonl.
+
+import os
+import json
+import hashlib
+import multiprocessing
+from config import GROQ_API_KEYS, SHARD_DIR, TRAINING_DATA_FILE
+
+
+def shard_ranges(count: int, shards: int) -> list:
+    """Split task ids 1..count into `shards` contiguous (start_id, count) ranges."""
+    base, extra = divmod(count, shards)
+    ranges = []
+    start = 1
+    for i in range(shards):
+        n = base + (1 if i < extra else 0)
+        ranges.append((start, n))
+        start += n
+    return ranges
+
+
+def shard_file(index: int) -> str:
+    return os.path.join(SHARD_DIR, f"training_data.shard{index:02d}.jsonl")
+
+
+def _run_shard(index: int, api_key: str, start_id: int, count: int, concurrency: int, resume: bool,
+               batch_styles: bool, batch_rating: bool, bulk_generate: bool, stage_workers: dict,
+               token_budget: int, feedback_loop: bool, similar_examples: bool) -> int:
+    """Worker entry point: runs one shard in its own process."""
+    from judge_rater_ai import JudgeRaterAI
+    from token_budget import get_ledger
+
+    if token_budget:
+        get_ledger().run_budget = token_budget
+
+    print(f"[Shard {index}] tasks {start_id}-{start_id + count - 1}")
+    ai = JudgeRaterAI(groq_key=api_key, batch_styles=batch_styles, batch_rating=batch_rating,
+                      bulk_generate=bulk_generate, feedback_loop=feedback_loop,
+                      similar_examples=similar_examples)
+    return ai.run_batch(count, shard_file(index), concurrency=concurrency, resume=resume, start_id=start_id,
+                        stage_workers=stage_workers)
+
+
+def run_sharded(count: int, keys: list = None, concurrency: int = 1, resume: bool = False,
+                batch_styles: bool = False, batch_rating: bool = False, bulk_generate: bool = False,
+                stage_workers: dict = None, token_budget: int = None, feedback_loop: bool = False,
+                similar_examples: bool = False) -> list:
+    """
+    Generate `count` tasks across one process per API key.
+    A token_budget is split evenly across the shards. With feedback_loop,
+    all shards share one feedback store; with similar_examples, one
+    example index.
+    Returns the shard files written.
+    """
+    keys = keys or GROQ_API_KEYS
+    if not keys:
+        raise ValueError("GROQ_API_KEYS (or GROQ_API_KEY) required")
+
+    os.makedirs(SHARD_DIR, exist_ok=True)
+    jobs = [
+        (i, key, start_id, n, concurrency, resume, batch_styles, batch_rating, bulk_generate, stage_workers)
+        for i, (key, (start_id, n)) in enumerate(zip(keys, shard_ranges(count, len(keys))))
+        if n > 0
+    ]
+    share = token_budget // len(jobs) if token_budget and jobs else None
+    jobs = [job + (share, feedback_loop, similar_examples) for job in jobs]
+
+    print(f"Sharding {count} tasks across {len(jobs)} keys")
+    with multiprocessing.Pool(len(jobs)) as pool:
+        pool.starmap(_run_shard, jobs)
+
+    return [shard_file(job[0]) for job in jobs]
+
+
+def _record_key(line: str) -> str:
+    """Dedup key: the same raw prompt styled the same way is one sample."""
+    data = json.loads(line)
+    blob = f"{data.get('style', '')}\x00{data.get('input', '')}"
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+
+def merge_shards(shard_files: list, output_file: str = TRAINING_DATA_FILE) -> int:
+    """
+    Append shard records to output_file, skipping any (input, style) already
+    present. The merged file is written to a temp file and swapped in, so a
+    crash mid-merge leaves the original untouched. Returns records added.
+    """
+    seen = set()
+    tmp_file = output_file + ".merge.tmp"
+    added = 0
+
+    with open(tmp_file, "w", encoding="utf-8") as out:
+        if os.path.exists(output_file):
+            with open(output_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        seen.add(_record_key(line))
+                        out.write(line)
+
+        for path in shard_files:
+            if not os.path.exists(path):
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    key = _record_key(line)
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    out.write(line if line.endswith("\n") else line + "\n")
+                    added += 1
+
+        out.flush()
+        os.fsync(out.fileno())
+
+    os.replace(tmp_file, output_file)
+    print(f"Merged {added} new samples into {output_file} ({len(seen)} unique)")
+    return added
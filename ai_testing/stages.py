@@ -0,0 +1,102 @@
+# Stages - Bounded-queue asyncio pipeline stages with live stats
+# Each Stage owns an inbox queue and a pool of workers running one handler.
+# Bounded inboxes give backpressure: a fast stage blocks on put() instead
+# of piling up work for a slow one. StageMonitor prints queue depth, busy
+# workers and throughput per stage while the pipeline runs.
+
+import time
+import asyncio
+
+# End-of-input marker passed down the pipeline
+DONE = object()
+
+
+class Stage:
+    """
+    `workers` coroutines take items from `inbox` and await handler(item).
+    Handlers forward work by putting into other stages' inboxes. When DONE
+    arrives and every worker has finished, run() passes DONE to `downstream`.
+    Handler errors are counted and printed, then passed to `on_error(item,
+    exception)` (a coroutine) so the item can still be accounted for; types
+    in `abort_on` propagate and stop the pipeline.
+    """
+
+    def __init__(self, name: str, handler, workers: int, queue_size: int = None, abort_on: tuple = (),
+                 on_error=None):
+        self.name = name
+        self.handler = handler
+        self.abort_on = abort_on
+        self.on_error = on_error
+        self.workers = max(1, workers)
+        self.inbox = asyncio.Queue(queue_size or self.workers * 2)
+        self.busy = 0
+        self.processed = 0
+        self.errors = 0
+        self.closed = False
+        self.started = None
+
+    async def _worker(self):
+        while True:
+            item = await self.inbox.get()
+            if item is DONE:
+                # Leave the marker for the sibling workers
+                self.closed = True
+                await self.inbox.put(DONE)
+                return
+            self.busy += 1
+            try:
+                await self.handler(item)
+            except self.abort_on:
+                raise
+            except Exception as e:
+                self.errors += 1
+                print(f"  [{self.name}] error: {e}")
+                if self.on_error is not None:
+                    try:
+                        await self.on_error(item, e)
+                    except self.abort_on:
+                        raise
+                    except Exception as e2:
+                        print(f"  [{self.name}] error handler failed: {e2}")
+            finally:
+                self.busy -= 1
+                self.processed += 1
+
+    async def run(self, downstream: "Stage" = None):
+        self.started = time.perf_counter()
+        await asyncio.gather(*(self._worker() for _ in range(self.workers)))
+        if downstream is not None:
+            await downstream.inbox.put(DONE)
+
+    def stats(self) -> dict:
+        elapsed = time.perf_counter() - self.started if self.started else 0
+        return {
+            "queued": self.inbox.qsize() - (1 if self.closed else 0),
+            "queue_size": self.inbox.maxsize,
+            "busy": self.busy,
+            "workers": self.workers,
+            "processed": self.processed,
+            "errors": self.errors,
+            "per_sec": round(self.processed / elapsed, 2) if elapsed else 0.0
+        }
+
+
+class StageMonitor:
+    """Prints one status line for all stages every `interval` seconds."""
+
+    def __init__(self, stages: list, interval: float = 5.0):
+        self.stages = stages
+        self.interval = interval
+
+    def line(self) -> str:
+        parts = []
+        for stage in self.stages:
+            s = stage.stats()
+            parts.append(f"{stage.name}: q {s['queued']}/{s['queue_size']} busy {s['busy']}/{s['workers']} "
+                         f"done {s['processed']} ({s['per_sec']}/s)")
+        return " | ".join(parts)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            print(f"  [stages] {self.line()}")
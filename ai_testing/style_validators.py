@@ -0,0 +1,166 @@
+# Style Validators - Deterministic local checks for each PromptStyler style
+# Every style has a list of weighted checks (strict JSON parse, TOON grammar,
+# Markdown header structure, the CoT "### Final Answer:" marker, ...). A
+# failed check costs its weight out of 10; a failed *fatal* check means the
+# output is clearly broken, so JudgeRaterAI labels it DONT without a judge
+# call. test_extension.py scores outputs with the same checks.
+#
+# Usage:
+#   from style_validators import validate
+#   result = validate("toon", output)   # {"score": 7, "failed": False, "checks": [...], ...}
+
+import re
+import json
+import toon
+
+FATAL_SCORE_CAP = 3     # a fatal failure never scores above this
+
+_HEADER_LINE = re.compile(r"^(#{1,6})\s+(\S.*)$")
+_STEP_LINE = re.compile(r"^\s*(?:\d+[.)]|[-*•]|(?:step\s*\d+|first|then|next|finally)\b)", re.IGNORECASE)
+FINAL_ANSWER = "### Final Answer:"
+
+
+def _check(name: str, ok: bool, weight: int, message: str, fatal: bool = False) -> dict:
+    return {"name": name, "ok": bool(ok), "weight": weight, "fatal": fatal, "message": message}
+
+
+def _fenced(output: str) -> bool:
+    return output.lstrip().startswith("```")
+
+
+def _json_checks(output: str) -> list:
+    try:
+        data = json.loads(output)
+        error = None
+    except ValueError as e:
+        data, error = None, str(e).split(":")[0]
+    checks = [_check("parses", error is None, 7, f"Invalid JSON ({error})" if error else "", fatal=True)]
+    if error is None:
+        checks.append(_check("object", isinstance(data, dict), 5, "Top level is not an object", fatal=True))
+    if isinstance(data, dict):
+        checks.append(_check("task_field", bool(data.get("task")), 2, "Missing task field"))
+        constraints = data.get("constraints", [])
+        checks.append(_check("constraints_list", isinstance(constraints, list), 1, "constraints is not a list"))
+    return checks
+
+
+def _toon_checks(output: str) -> list:
+    try:
+        data = toon.parse(output)
+        error = None
+    except toon.ToonError as e:
+        data, error = None, str(e)
+    checks = [_check("parses", error is None, 7, f"Invalid TOON ({error})" if error else "", fatal=True)]
+    if error is None:
+        checks.append(_check("object", isinstance(data, dict), 2, "Top level is not key: value pairs"))
+        checks.append(_check("task_field", isinstance(data, dict) and bool(data.get("task")), 2,
+                             "Missing task field"))
+        checks.append(_check("no_quotes", '"' not in output, 1, "Uses quotes (TOON should avoid them)"))
+    return checks
+
+
+def _markdown_checks(output: str) -> list:
+    headers = []
+    lines = output.splitlines()
+    for i, line in enumerate(lines):
+        match = _HEADER_LINE.match(line.strip())
+        if match:
+            headers.append((i, len(match.group(1)), match.group(2).strip()))
+
+    checks = [_check("headers", bool(headers), 7, "Missing markdown headers", fatal=True)]
+    if not headers:
+        return checks
+
+    checks.append(_check("task_section", any(h[2].lower().startswith("task") for h in headers), 2,
+                         "Missing Task section"))
+    skipped = any(b[1] > a[1] + 1 for a, b in zip(headers, headers[1:]))
+    checks.append(_check("header_levels", not skipped, 1, "Header levels skip (e.g. ## then ####)"))
+    bounds = [h[0] for h in headers] + [len(lines)]
+    empty = [h[2] for h, end in zip(headers, bounds[1:]) if not any(l.strip() for l in lines[h[0] + 1:end])]
+    checks.append(_check("no_empty_sections", not empty, 1, f"Empty section: {', '.join(empty)}" if empty else ""))
+    checks.append(_check("not_fenced", not _fenced(output), 1, "Wrapped in a code block"))
+    return checks
+
+
+def _cot_checks(output: str) -> list:
+    marker = output.find(FINAL_ANSWER)
+    checks = [_check("final_answer_marker", marker >= 0, 7, f"Missing '{FINAL_ANSWER}' marker", fatal=True)]
+    if marker < 0:
+        return checks
+    answer = output[marker + len(FINAL_ANSWER):].strip()
+    reasoning = output[:marker].splitlines()
+    checks.append(_check("final_answer_text", bool(answer), 3, "Nothing after the Final Answer marker"))
+    checks.append(_check("reasoning_steps", any(_STEP_LINE.match(l) for l in reasoning), 2,
+                         "No reasoning steps before the Final Answer"))
+    return checks
+
+
+def _persona_checks(output: str) -> list:
+    text = output.strip().lstrip("\"'")
+    return [
+        _check("persona_intro", "You are" in output, 6, "Missing persona intro", fatal=True),
+        _check("persona_first", text.startswith("You are"), 2, "Persona is not at the top")
+    ]
+
+
+def _fewshot_checks(output: str) -> list:
+    lowered = output.lower()
+    return [
+        _check("examples", "example" in lowered or "pattern" in lowered, 2, "Missing example pattern"),
+        _check("continue_line", "continue this pattern" in lowered, 2, "Missing 'Now continue this pattern' line")
+    ]
+
+
+def _professional_checks(output: str) -> list:
+    structured = output.lstrip().startswith(("{", "#", "```"))
+    return [
+        _check("length", len(output.strip()) >= 20, 2, "Too short"),
+        _check("plain_text", not structured, 1, "Not plain text")
+    ]
+
+
+VALIDATORS = {
+    "json": _json_checks,
+    "toon": _toon_checks,
+    "markdown": _markdown_checks,
+    "cot": _cot_checks,
+    "persona": _persona_checks,
+    "fewshot": _fewshot_checks,
+    "professional": _professional_checks
+}
+
+
+def validate(style: str, output: str) -> dict:
+    """
+    Run the style's checks on one styled output.
+    Returns {"style", "score" (0-10), "failed" (a fatal check failed),
+    "issues" (messages of failed checks), "checks"}.
+    """
+    if not output or not output.strip():
+        checks = [_check("non_empty", False, 10, "No output", fatal=True)]
+    else:
+        checks = VALIDATORS.get(style, lambda _: [])(output)
+
+    failed = [c for c in checks if not c["ok"]]
+    score = max(0, 10 - sum(c["weight"] for c in failed))
+    fatal = any(c["fatal"] for c in failed)
+    if fatal:
+        score = min(score, FATAL_SCORE_CAP)
+    return {
+        "style": style,
+        "score": score,
+        "failed": fatal,
+        "issues": [c["message"] for c in failed],
+        "checks": checks
+    }
+
+
+def local_rating(result: dict) -> dict:
+    """A judge-shaped DONT rating for an output that failed validation."""
+    return {
+        "overall": result["score"],
+        "verdict": "DONT",
+        "feedback": "Failed local validation: " + "; ".join(result["issues"]),
+        "validation": {c["name"]: c["ok"] for c in result["checks"]},
+        "local": True
+    }
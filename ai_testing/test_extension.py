@@ -3,7 +3,6 @@ Extension Performance Test - Uses shared system prompt
 """
 import os
 import sys
-import requests
 import json
 import time
 
@@ -11,26 +10,26 @@ import time
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from shared.system_prompt import SYSTEM_PROMPT
+from config import GROQ_API_KEY, GROQ_MODEL
+from transport import post_chat, stream_chat, get_transport
+from promptstyler import apply_styles, max_tokens_for
+from style_validators import validate
 
-# Groq API Configuration
-GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
-GROQ_MODEL = "llama-3.3-70b-versatile"
-GROQ_API_KEY = os.environ.get("GROQ_API_KEY", "")
 
-
-def test_style(prompt, style, api_key=None):
-    """Test a style using the extension's API call pattern"""
+def test_style(prompt, style, api_key=None, timings=None, stream=False):
+    """
+    Test a style using the extension's API call pattern.
+    If `timings` is a list, the connect/TTFB/total split is appended to it.
+    With stream=True the response is read over SSE and the appended timing
+    is the stream's TTFT / inter-token latency / tokens-per-second metrics.
+    """
     key = api_key or GROQ_API_KEY
     if not key:
         return None, 0, "No API key - set GROQ_API_KEY environment variable"
     
+    # One attempt per call, like the extension (max_attempts=1 below)
     user_prompt = f"Style: {style.upper()}\n\nUser Input:\n{prompt}"
     
-    headers = {
-        "Authorization": f"Bearer {key}",
-        "Content-Type": "application/json"
-    }
-    
     payload = {
         "model": GROQ_MODEL,
         "messages": [
@@ -38,18 +37,26 @@ def test_style(prompt, style, api_key=None):
             {"role": "user", "content": user_prompt}
         ],
         "temperature": 0.7,
-        "max_tokens": 2048
+        "max_tokens": max_tokens_for(style)
     }
     
     try:
-        start = time.time()
-        response = requests.post(
-            GROQ_API_URL,
-            headers=headers,
-            json=payload,
-            timeout=60
-        )
-        elapsed = time.time() - start
+        if stream:
+            response = stream_chat(payload, key, timeout=60, max_attempts=1)
+            for _ in response:
+                pass
+            metrics = response.metrics()
+            elapsed = metrics["total"]
+            if timings is not None:
+                timings.append(metrics)
+            if response.status_code == 200:
+                return response.text, elapsed, None
+        else:
+            response = post_chat(payload, key, timeout=60, max_attempts=1)
+            # Network time only - excludes any wait in the shared rate limiter
+            elapsed = response.timing["total"]
+            if timings is not None:
+                timings.append(response.timing)
         
         if response.status_code == 200:
             data = response.json()
@@ -65,68 +72,35 @@ def test_style(prompt, style, api_key=None):
 
 
 def rate_output(style, output):
-    """Simple quality check for each style"""
-    if not output:
-        return 0, "No output"
-    
-    issues = []
-    score = 10
-    
-    if style == "json":
-        try:
-            json.loads(output)
-        except:
-            score -= 5
-            issues.append("Invalid JSON")
-        if "task" not in output.lower():
-            score -= 2
-            issues.append("Missing task field")
-    
-    elif style == "toon":
-        # TOON should NOT have braces or quotes
-        lines = output.strip().split('\n')
-        if '{' in output and '"' in output:
-            score -= 4
-            issues.append("Contains JSON-like syntax (should be TOON)")
-        if ':' not in output:
-            score -= 3
-            issues.append("Missing TOON key:value format")
-        # Check for tabular array syntax
-        if '[' in output and '{' in output.split('\n')[0]:
-            score += 1  # Bonus for proper array declaration
-    
-    elif style == "markdown":
-        if "## " not in output and "# " not in output:
-            score -= 3
-            issues.append("Missing markdown headers")
-        if "Task" not in output:
-            score -= 2
-            issues.append("Missing Task section")
-    
-    elif style == "persona":
-        if "You are" not in output:
-            score -= 4
-            issues.append("Missing persona intro")
-    
-    elif style == "cot":
-        if "Consider" not in output and "Then" not in output:
-            score -= 2
-            issues.append("Missing CoT structure")
-    
-    elif style == "fewshot":
-        if "Example" not in output and "pattern" not in output.lower():
-            score -= 2
-            issues.append("Missing example pattern")
-    
-    elif style == "professional":
-        if len(output) < 20:
-            score -= 2
-            issues.append("Too short")
-    
-    return max(0, score), ", ".join(issues) if issues else "Good"
+    """Quality check for each style (style_validators.py, shared with judge_rater_ai)"""
+    result = validate(style, output)
+    return result["score"], ", ".join(result["issues"]) if result["issues"] else "Good"
+
+
+def summarize_latency(metrics: list) -> dict:
+    """Average streaming metrics (from test_style(stream=True)) for one style."""
+    def avg(key):
+        values = [m[key] for m in metrics if m.get(key) is not None]
+        return round(sum(values) / len(values), 3) if values else None
+    
+    ttft = avg("ttft")
+    return {
+        "ttft_ms": round(ttft * 1000, 1) if ttft is not None else None,
+        "inter_token_ms": avg("inter_token_ms"),
+        "tokens_per_sec": avg("tokens_per_sec"),
+        "total_s": avg("total"),
+        "samples": len(metrics)
+    }
 
 
-def main():
+def main(batch: bool = False, stream: bool = False):
+    """
+    Run every style against the test prompts.
+    batch=True requests all styles of a prompt in one completion (apply_styles)
+    instead of one request per style.
+    stream=True reads each response over SSE and reports time-to-first-token,
+    inter-token latency and tokens/sec per style.
+    """
     test_prompts = [
         "help me write a python script that sorts a list of numbers",
         "explain machine learning to a beginner",
@@ -136,6 +110,7 @@ def main():
     styles = ["professional", "markdown", "json", "toon", "persona", "cot", "fewshot"]
     
     results = []
+    latency = {}
     
     print("="*60)
     print("PROMPTSTYLER EXTENSION PERFORMANCE TEST")
@@ -151,12 +126,32 @@ def main():
         print("  Linux/Mac: export GROQ_API_KEY=your_key")
         return
     
+    batched = {}
+    tokens_saved = 0
+    if batch:
+        print("Mode: batched (all styles per request)")
+        for prompt in test_prompts:
+            report = {}
+            start = time.time()
+            batched[prompt] = apply_styles(prompt, styles, report=report, use_cache=False)
+            print(f"  {time.time() - start:.1f}s for {len(styles)} styles: {prompt[:40]}...")
+            tokens_saved += report["tokens_saved"]
+    
     for style in styles:
         print(f"\n--- Testing {style.upper()} ---")
         style_scores = []
+        style_metrics = []
         
         for prompt in test_prompts:
-            output, elapsed, error = test_style(prompt, style)
+            if batch:
+                output = batched[prompt][style]
+                error = None if output else "No output"
+                timings = None
+            else:
+                timings = []
+                output, elapsed, error = test_style(prompt, style, timings=timings, stream=stream)
+                if stream:
+                    style_metrics.extend(timings)
             
             if error:
                 print(f"  ERROR: {error}")
@@ -164,14 +159,25 @@ def main():
             else:
                 score, notes = rate_output(style, output)
                 style_scores.append(score)
-                print(f"  Score: {score}/10 | Time: {elapsed:.1f}s | {notes}")
+                if timings and stream:
+                    t = timings[0]
+                    print(f"  Score: {score}/10 | Time: {elapsed:.1f}s "
+                          f"(TTFT {(t['ttft'] or 0)*1000:.0f}ms, {t['tokens_per_sec'] or 0:.0f} tok/s) | {notes}")
+                elif timings:
+                    t = timings[0]
+                    print(f"  Score: {score}/10 | Time: {elapsed:.1f}s "
+                          f"(connect {t['connect']*1000:.0f}ms, TTFB {t['ttfb']*1000:.0f}ms) | {notes}")
+                else:
+                    print(f"  Score: {score}/10 | {notes}")
                 print(f"  Output: {output[:100]}...")
-            
-            time.sleep(0.1)  # Minimal rate limit for Groq
         
         avg = sum(style_scores) / len(style_scores) if style_scores else 0
         results.append((style, avg))
         print(f"  AVG: {avg:.1f}/10")
+        if style_metrics:
+            latency[style] = summarize_latency(style_metrics)
+            print(f"  TTFT: {latency[style]['ttft_ms']}ms | "
+                  f"inter-token: {latency[style]['inter_token_ms']}ms | {latency[style]['tokens_per_sec']} tok/s")
     
     # Summary
     print("\n" + "="*60)
@@ -187,6 +193,13 @@ def main():
     
     overall = sum(r[1] for r in results) / len(results)
     print(f"\nOVERALL: {overall:.1f}/10")
+    if batch:
+        print(f"Batched mode saved ~{tokens_saved} prompt tokens")
+    
+    transport = get_transport().summary()
+    if transport.get("requests"):
+        print(f"\nConnections: {transport['new_connections']} new, {transport['reused_connections']} reused "
+              f"(avg handshake {transport['avg_connect_ms']}ms, avg TTFB {transport['avg_ttfb_ms']}ms)")
     
     # Save report
     os.makedirs("output", exist_ok=True)
@@ -196,6 +209,10 @@ def main():
         "prompt_source": "shared/system_prompt.py",
         "results": {style: score for style, score in results},
         "overall": overall,
+        "transport": transport,
+        "latency": latency,
+        "batched": batch,
+        "tokens_saved": tokens_saved,
         "test_prompts": test_prompts
     }
     
@@ -206,4 +223,9 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch", action="store_true", help="One request per prompt for all styles")
+    parser.add_argument("--stream", action="store_true", help="Stream responses and report TTFT per style")
+    args = parser.parse_args()
+    main(batch=args.batch, stream=args.stream)
@@ -0,0 +1,49 @@
+# Staged pipeline tests against mock_groq.py - run with: python -m pytest test_stages.py
+
+import os
+import json
+import pytest
+import mock_groq
+
+STYLES = 7
+
+
+@pytest.fixture(scope="module")
+def judge_rater_ai(tmp_path_factory):
+    """judge_rater_ai imported against a local mock server, run from a temp directory."""
+    server = mock_groq.start(mock_groq.MockConfig(seed=1), port=0)
+    port = server.server_address[1]
+    os.environ.update(
+        GROQ_API_URL=f"http://127.0.0.1:{port}/openai/v1/chat/completions", GROQ_API_KEY="mock",
+        GROQ_REQUESTS_PER_MINUTE="1000000", GROQ_TOKENS_PER_MINUTE="100000000",
+        GROQ_TOKENS_PER_DAY="1000000000", PROMPTSTYLER_CACHE="0", PROMPTSTYLER_DEDUP="0"
+    )
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("run"))
+    import judge_rater_ai
+    yield judge_rater_ai
+    os.chdir(cwd)
+    server.shutdown()
+
+
+def test_batch_rating_survives_a_raising_style_handler(judge_rater_ai, monkeypatch):
+    styled = judge_rater_ai.apply_style
+
+    def apply_style(raw_prompt, style, **kwargs):
+        if style == "toon":
+            raise RuntimeError("styler crashed")
+        return styled(raw_prompt, style, **kwargs)
+
+    monkeypatch.setattr(judge_rater_ai, "apply_style", apply_style)
+    tasks = 4
+    ai = judge_rater_ai.JudgeRaterAI(batch_rating=True)
+    written = ai.run_batch(tasks, "output/staged.jsonl", concurrency=2,
+                           stage_workers={"generate": 1, "style": 3, "rate": 2})
+
+    with open("output/staged.jsonl") as f:
+        rows = [json.loads(line) for line in f]
+    assert written == len(rows) == tasks * (STYLES - 1)
+    assert "toon" not in {row["style"] for row in rows}
+    progress = ai.manifest.progress()
+    assert progress["done"] == tasks * (STYLES - 1)
+    assert progress["failed"] == tasks
@@ -0,0 +1,22 @@
+# TOON round-trip tests - run with: python -m pytest test_toon.py
+
+import pytest
+from toon import dumps, parse
+
+QUOTED = ['"Moby Dick" summary', '"', '"a"', '"a" "b"', 'say "hi"']
+
+
+@pytest.mark.parametrize("value", QUOTED)
+def test_strings_with_quotes_round_trip(value):
+    doc = {
+        "title": value,
+        "tags": [value, "plain"],
+        "rows": [{"name": value, "n": 1}, {"name": "other", "n": 2}]
+    }
+    assert parse(dumps(doc)) == doc
+
+
+@pytest.mark.parametrize("value", ["true", "null", "12", "-3", " padded", "a: b", "x,y", ""])
+def test_strings_that_look_like_other_values_round_trip(value):
+    doc = {"v": value, "l": [value, "z"]}
+    assert parse(dumps(doc)) == doc
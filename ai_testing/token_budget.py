@@ -0,0 +1,185 @@
+# Token Budget - Local token accounting with per-run and per-day budgets
+# Every chat request is counted with the local tokenizer before it is sent:
+# its prompt plus max_tokens must fit what is left of the run budget and
+# of today's budget for its API key, or BudgetExceeded is raised instead of
+# spending quota Groq would reject. Responses are charged with the usage
+# they report (or the local count of their text). Daily usage lives in
+# SQLite (keyed by UTC date and a hash of the key), so the daily limit holds
+# across restarts and shard processes; the run budget is per process.
+#
+# Usage:
+#   python token_budget.py              # today's usage per key
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+from config import TOKEN_USAGE_PATH, RUN_TOKEN_BUDGET, DAY_TOKEN_BUDGET
+from tokenizer import count_tokens
+
+
+class BudgetExceeded(RuntimeError):
+    """A request would go over the run or daily token budget."""
+
+
+def _key_id(api_key: str) -> str:
+    # Never store keys themselves
+    return hashlib.sha1((api_key or "").encode("utf-8")).hexdigest()[:12]
+
+
+def _today() -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime())
+
+
+class TokenLedger:
+    """
+    Token usage for this run (in memory) and per key per day (SQLite).
+    Reservations for requests in flight count against both budgets until
+    the response is recorded or the reservation released. 0 = no limit.
+    """
+
+    def __init__(self, path: str = TOKEN_USAGE_PATH, run_budget: int = RUN_TOKEN_BUDGET,
+                 day_budget: int = DAY_TOKEN_BUDGET):
+        self.path = path
+        self.run_budget = run_budget
+        self.day_budget = day_budget
+        self.run = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "truncated": 0}
+        self._in_flight = {}    # key id -> reserved tokens
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS usage (
+                day TEXT,
+                key TEXT,
+                requests INTEGER DEFAULT 0,
+                prompt_tokens INTEGER DEFAULT 0,
+                completion_tokens INTEGER DEFAULT 0,
+                PRIMARY KEY (day, key)
+            )
+        """)
+
+    def _day_used(self, key: str) -> int:
+        row = self.db.execute("SELECT prompt_tokens + completion_tokens FROM usage WHERE day = ? AND key = ?",
+                              (_today(), key)).fetchone()
+        return row[0] if row else 0
+
+    def reserve(self, api_key: str, prompt_tokens: int, max_tokens: int = 0) -> int:
+        """
+        Hold prompt_tokens + max_tokens against both budgets (raises
+        BudgetExceeded if either would be exceeded). Returns the amount held.
+        """
+        key = _key_id(api_key)
+        amount = prompt_tokens + (max_tokens or 0)
+        with self._lock:
+            in_flight = sum(self._in_flight.values())
+            run_used = self.run["prompt_tokens"] + self.run["completion_tokens"]
+            if self.run_budget and run_used + in_flight + amount > self.run_budget:
+                raise BudgetExceeded(f"run token budget reached ({run_used:,}/{self.run_budget:,} used, "
+                                     f"next request needs up to {amount:,})")
+            if self.day_budget:
+                day_used = self._day_used(key)
+                if day_used + self._in_flight.get(key, 0) + amount > self.day_budget:
+                    raise BudgetExceeded(f"daily token budget reached ({day_used:,}/{self.day_budget:,} used "
+                                         f"today, next request needs up to {amount:,})")
+            self._in_flight[key] = self._in_flight.get(key, 0) + amount
+        return amount
+
+    def release(self, api_key: str, reserved: int):
+        """Drop a reservation whose request was not charged (error, non-200)."""
+        key = _key_id(api_key)
+        with self._lock:
+            self._in_flight[key] = max(0, self._in_flight.get(key, 0) - reserved)
+
+    def record(self, api_key: str, reserved: int, prompt_tokens: int, completion_tokens: int,
+               truncated: bool = False):
+        """Replace a reservation with the tokens actually used."""
+        key = _key_id(api_key)
+        with self._lock:
+            self._in_flight[key] = max(0, self._in_flight.get(key, 0) - reserved)
+            self.run["requests"] += 1
+            self.run["prompt_tokens"] += prompt_tokens
+            self.run["completion_tokens"] += completion_tokens
+            self.run["truncated"] += 1 if truncated else 0
+            self.db.execute("""
+                INSERT INTO usage (day, key, requests, prompt_tokens, completion_tokens) VALUES (?, ?, 1, ?, ?)
+                ON CONFLICT (day, key) DO UPDATE SET
+                    requests = requests + 1,
+                    prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                    completion_tokens = completion_tokens + excluded.completion_tokens
+            """, (_today(), key, prompt_tokens, completion_tokens))
+
+    def record_response(self, api_key: str, reserved: int, prompt_tokens: int, response):
+        """Charge a finished non-streaming response (usage it reports, else local counts)."""
+        if response.status_code != 200:
+            self.release(api_key, reserved)
+            return
+        try:
+            data = response.json()
+        except ValueError:
+            data = {}
+        usage = data.get("usage") or {}
+        choice = (data.get("choices") or [{}])[0]
+        completion = usage.get("completion_tokens")
+        if completion is None:
+            completion = count_tokens((choice.get("message") or {}).get("content") or "")
+        self.record(api_key, reserved, usage.get("prompt_tokens", prompt_tokens), completion,
+                    choice.get("finish_reason") == "length")
+
+    def record_stream(self, api_key: str, reserved: int, prompt_tokens: int, stream):
+        """Charge a stream that has been read to the end."""
+        usage = stream.usage or {}
+        completion = usage.get("completion_tokens")
+        if completion is None:
+            completion = count_tokens(stream.text)
+        self.record(api_key, reserved, usage.get("prompt_tokens", prompt_tokens), completion)
+
+    def today(self) -> list:
+        """Today's usage rows: [{"key", "requests", "prompt_tokens", "completion_tokens"}]."""
+        with self._lock:
+            rows = self.db.execute(
+                "SELECT key, requests, prompt_tokens, completion_tokens FROM usage WHERE day = ? ORDER BY key",
+                (_today(),)
+            ).fetchall()
+        return [{"key": k, "requests": r, "prompt_tokens": p, "completion_tokens": c} for k, r, p, c in rows]
+
+    def summary(self) -> dict:
+        with self._lock:
+            run = dict(self.run)
+        run["total_tokens"] = run["prompt_tokens"] + run["completion_tokens"]
+        return {"run": run, "run_budget": self.run_budget, "day_budget": self.day_budget, "today": self.today()}
+
+
+# Singleton
+_ledger = None
+_ledger_lock = threading.Lock()
+
+def get_ledger() -> TokenLedger:
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = TokenLedger()
+    return _ledger
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Token usage per API key")
+    parser.add_argument("--json", action="store_true", help="Print as JSON")
+    args = parser.parse_args()
+
+    ledger = TokenLedger()
+    rows = ledger.today()
+    if args.json:
+        print(json.dumps({"day": _today(), "day_budget": ledger.day_budget, "keys": rows}, indent=2))
+    else:
+        print(f"Token usage for {_today()} (UTC), daily budget {ledger.day_budget or 'unlimited'}:")
+        for row in rows or [{"key": "-", "requests": 0, "prompt_tokens": 0, "completion_tokens": 0}]:
+            total = row["prompt_tokens"] + row["completion_tokens"]
+            print(f"  key {row['key']}: {row['requests']} requests | {row['prompt_tokens']:,} prompt + "
+                  f"{row['completion_tokens']:,} completion = {total:,} tokens")
@@ -0,0 +1,69 @@
+# Tokenizer - Local token counting
+# Uses tiktoken's cl100k_base BPE when it is installed and its encoding file
+# is available (pip install tiktoken); otherwise an offline approximation
+# that mimics a BPE pre-tokenizer: common words are one token, long words,
+# digit runs and punctuation runs are split, indentation counts once.
+# Neither is the Llama tokenizer Groq bills with, but both track it closely
+# enough to compare formats and budget requests.
+
+import re
+import math
+import threading
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+ENCODING = "cl100k_base"
+
+_PIECES = re.compile(r" ?[^\W\d_]+| ?\d+| ?[^\s\w]+|\s+|_+")
+
+_encoding = None
+_encoding_lock = threading.Lock()
+_loaded = False
+
+
+def _get_encoding():
+    """The tiktoken encoding, or None (not installed / encoding file unavailable offline)."""
+    global _encoding, _loaded
+    if _loaded:
+        return _encoding
+    with _encoding_lock:
+        if not _loaded:
+            if tiktoken is not None:
+                try:
+                    _encoding = tiktoken.get_encoding(ENCODING)
+                except Exception:
+                    _encoding = None
+            _loaded = True
+    return _encoding
+
+
+def _approximate(text: str) -> int:
+    count = 0
+    for piece in _PIECES.findall(text):
+        body = piece.lstrip(" ")
+        if not body or body.isspace():
+            count += 1
+        elif body[0].isdigit():
+            count += math.ceil(len(body) / 3)
+        elif body[0].isalpha():
+            count += math.ceil(len(body) / 6)
+        else:
+            count += math.ceil(len(body) / 2)
+    return count
+
+
+def count_tokens(text: str) -> int:
+    """Tokens in `text` (exact with tiktoken, else approximate)."""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return _approximate(text)
+
+
+def tokenizer_name() -> str:
+    return f"tiktoken/{ENCODING}" if _get_encoding() is not None else "approximate"
@@ -0,0 +1,542 @@
+# TOON - Token-Oriented Object Notation codec
+# parse() reads the TOON described in shared/system_prompt.py into Python
+# values and raises ToonError (with the line number) on anything that is
+# not valid TOON; dumps() writes dicts/lists/primitives back, picking the
+# tabular form for uniform lists of flat objects. to_json/from_json convert
+# documents, and `bench` measures JSON vs TOON tokens and codec speed over
+# the styled outputs in the training data.
+#
+#   task: summarize document            key: value
+#   meta:                               nested object (indented block)
+#     owner: ops
+#   tags[3]: python,sorting,algorithms  primitive array, inline
+#   steps[2]:                           primitive array, on the next lines
+#     scan for pair,return None
+#   params[2]{name,type}:               tabular array: N rows of len(fields)
+#     nums,list
+#     target,number
+#   items[2]:                           list items
+#     - first
+#     - second
+#
+# Values may be "quoted" (JSON escapes); unquoted values are numbers,
+# true/false/null or plain strings. Counts and row widths are checked.
+#
+# Usage:
+#   python toon.py encode data.json          # JSON -> TOON (stdin if no file)
+#   python toon.py decode prompt.toon        # TOON -> JSON
+#   python toon.py bench                     # token savings over output/training_data.jsonl
+
+import re
+import sys
+import json
+import time
+import argparse
+
+INDENT_STEP = 2
+
+_HEADER = re.compile(
+    r'^(?P<key>"(?:[^"\\]|\\.)*"|[^:\[\]{}"\s][^:\[\]{}"]*?)?\s*'
+    r'(?:\[(?P<count>\d+)\](?:\{(?P<fields>[^{}]*)\})?)?:(?P<rest>.*)$'
+)
+_NUMBER = re.compile(r"^-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?$")
+
+
+class ToonError(ValueError):
+    def __init__(self, message: str, line: int = None):
+        self.line = line
+        super().__init__(f"line {line}: {message}" if line else message)
+
+
+def _lines(text: str) -> list:
+    """(line number, indent, content) for every non-blank line."""
+    lines = []
+    for number, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+        stripped = line.lstrip(" ")
+        if stripped.startswith("\t"):
+            raise ToonError("tab indentation", number)
+        lines.append((number, len(line) - len(stripped), stripped.rstrip()))
+    return lines
+
+
+def _unquote(token: str, line: int) -> str:
+    try:
+        value, end = json.JSONDecoder().raw_decode(token)
+    except ValueError:
+        raise ToonError(f"bad quoted string {token!r}", line)
+    if end != len(token) or not isinstance(value, str):
+        raise ToonError(f"unexpected text after quoted string {token!r}", line)
+    return value
+
+
+def scalar(token: str, line: int = None):
+    """One primitive value: "quoted", number, true/false/null or plain string."""
+    token = token.strip()
+    if token.startswith('"'):
+        return _unquote(token, line)
+    if token in ("true", "false"):
+        return token == "true"
+    if token == "null":
+        return None
+    if _NUMBER.match(token):
+        return float(token) if any(c in token for c in ".eE") else int(token)
+    return token
+
+
+def _split(text: str, line: int = None, delimiter: str = ",") -> list:
+    values, current, quoted, escaped = [], [], False, False
+    for ch in text:
+        if quoted:
+            current.append(ch)
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                quoted = False
+        elif ch == '"':
+            quoted = True
+            current.append(ch)
+        elif ch == delimiter:
+            values.append("".join(current))
+            current = []
+        else:
+            current.append(ch)
+    if quoted:
+        raise ToonError("unterminated quoted string", line)
+    values.append("".join(current))
+    return values
+
+
+def split_row(text: str, line: int = None, delimiter: str = ",") -> list:
+    """Split on `delimiter` outside quotes and parse each value."""
+    return [scalar(v, line) for v in _split(text, line, delimiter)]
+
+
+def _has_unquoted_colon(text: str) -> bool:
+    quoted = escaped = False
+    for ch in text:
+        if quoted:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                quoted = False
+        elif ch == '"':
+            quoted = True
+        elif ch == ":":
+            return True
+    return False
+
+
+class _Parser:
+    def __init__(self, text: str):
+        self.lines = _lines(text)
+        self.i = 0
+
+    def _peek(self):
+        return self.lines[self.i] if self.i < len(self.lines) else None
+
+    def _child_indent(self, indent: int):
+        """Indent of the block under the current header, or None if there is none."""
+        nxt = self._peek()
+        return nxt[1] if nxt and nxt[1] > indent else None
+
+    def _header(self, line: int, content: str) -> tuple:
+        match = _HEADER.match(content)
+        if not match:
+            raise ToonError(f"expected 'key: value', got {content[:40]!r}", line)
+        key = match.group("key")
+        if key is None and match.group("count") is None:
+            raise ToonError("missing key", line)
+        if key is not None:
+            key = _unquote(key, line) if key.startswith('"') else key.strip()
+        count = int(match.group("count")) if match.group("count") is not None else None
+        fields = match.group("fields")
+        if fields is not None:
+            fields = [f.strip() for f in _split(fields, line)]
+            fields = [_unquote(f, line) if f.startswith('"') else f for f in fields]
+            if not all(fields):
+                raise ToonError("empty field name", line)
+        return key, count, fields, match.group("rest").strip()
+
+    def parse_object(self, indent: int) -> dict:
+        obj = {}
+        while True:
+            current = self._peek()
+            if current is None or current[1] < indent:
+                return obj
+            line, at, content = current
+            if at > indent:
+                raise ToonError("unexpected indentation", line)
+            self.i += 1
+            key, count, fields, rest = self._header(line, content)
+            if key is None:
+                raise ToonError("array header without a key inside an object", line)
+            if key in obj:
+                raise ToonError(f"duplicate key {key!r}", line)
+            obj[key] = self.parse_value(line, indent, count, fields, rest)
+
+    def parse_value(self, line: int, indent: int, count, fields, rest: str):
+        if count is None:
+            if rest:
+                return scalar(rest, line)
+            child = self._child_indent(indent)
+            return self.parse_object(child) if child is not None else {}
+
+        if fields is not None:
+            if rest:
+                raise ToonError("tabular header must end with ':'", line)
+            return self._rows(line, indent, count, fields)
+
+        if rest:
+            values = split_row(rest, line)
+        else:
+            values = self._block_array(line, indent, count)
+        if count == 0 and values == [""]:
+            values = []
+        if len(values) != count:
+            raise ToonError(f"array declares {count} values, found {len(values)}", line)
+        return values
+
+    def _rows(self, line: int, indent: int, count: int, fields: list) -> list:
+        rows = []
+        child = self._child_indent(indent)
+        while child is not None:
+            current = self._peek()
+            if current is None or current[1] < child:
+                break
+            number, at, content = current
+            if at > child:
+                raise ToonError("unexpected indentation in table", number)
+            if _has_unquoted_colon(content):
+                raise ToonError("colon in data row (quote the value or close the table)", number)
+            values = split_row(content, number)
+            if len(values) != len(fields):
+                raise ToonError(f"row has {len(values)} values, header declares {len(fields)} fields", number)
+            rows.append(dict(zip(fields, values)))
+            self.i += 1
+        if len(rows) != count:
+            raise ToonError(f"table declares {count} rows, found {len(rows)}", line)
+        return rows
+
+    def _block_array(self, line: int, indent: int, count: int) -> list:
+        child = self._child_indent(indent)
+        if child is None:
+            return []
+        if self._peek()[2].startswith("- ") or self._peek()[2] == "-":
+            return self._list_items(child)
+        values = []
+        while True:
+            current = self._peek()
+            if current is None or current[1] < child:
+                return values
+            number, at, content = current
+            if at > child:
+                raise ToonError("unexpected indentation in array", number)
+            if _has_unquoted_colon(content):
+                raise ToonError("colon in array values (quote the value)", number)
+            values.extend(split_row(content, number))
+            self.i += 1
+
+    def _list_items(self, indent: int) -> list:
+        items = []
+        while True:
+            current = self._peek()
+            if current is None or current[1] < indent:
+                return items
+            number, at, content = current
+            if at > indent or not (content.startswith("- ") or content == "-"):
+                raise ToonError("expected '- ' list item", number)
+            self.i += 1
+            body = content[2:].strip()
+            if not body:
+                child = self._child_indent(indent)
+                items.append(self.parse_object(child) if child is not None else {})
+                continue
+            match = _HEADER.match(body) if (body.startswith("[") or _has_unquoted_colon(body)) else None
+            if match is None:
+                items.append(scalar(body, number))
+                continue
+            key, count, fields, rest = self._header(number, body)
+            if key is None:
+                # - [M]: a,b   nested primitive array
+                items.append(self.parse_value(number, indent, count, fields, rest))
+                continue
+            # - key: value  object whose other fields follow at the item's content indent
+            item = {key: self.parse_value(number, indent + INDENT_STEP, count, fields, rest)}
+            nxt = self._peek()
+            if nxt and nxt[1] == indent + INDENT_STEP:
+                for k, v in self.parse_object(indent + INDENT_STEP).items():
+                    if k in item:
+                        raise ToonError(f"duplicate key {k!r}", number)
+                    item[k] = v
+            items.append(item)
+
+    def parse(self):
+        if not self.lines:
+            return {}
+        line, indent, content = self.lines[0]
+        if indent:
+            raise ToonError("document must start at column 0", line)
+        match = _HEADER.match(content)
+        if match and match.group("key") is None and match.group("count") is not None:
+            # Root array: [N]: ... / [N]{fields}:
+            self.i += 1
+            _, count, fields, rest = self._header(line, content)
+            value = self.parse_value(line, 0, count, fields, rest)
+        else:
+            value = self.parse_object(0)
+        if self._peek() is not None:
+            raise ToonError("unexpected content", self._peek()[0])
+        return value
+
+
+def parse(text: str):
+    """Parse a TOON document into dicts/lists/primitives. Raises ToonError."""
+    return _Parser(text).parse()
+
+
+# ─── Encoding ───────────────────────────────────────
+_BARE_KEY = re.compile(r"^[A-Za-z_][\w.]*$")
+
+
+def _primitive(value) -> bool:
+    return value is None or isinstance(value, (str, int, float, bool))
+
+
+def _key(key) -> str:
+    key = str(key)
+    return key if _BARE_KEY.match(key) else json.dumps(key, ensure_ascii=False)
+
+
+def _scalar_text(value, delimited: bool = False) -> str:
+    """One primitive as TOON, quoted only when it would not read back as itself."""
+    if value is None or value is True or value is False:
+        return json.dumps(value)
+    if isinstance(value, (int, float)):
+        text = json.dumps(value)
+        return "null" if text in ("NaN", "Infinity", "-Infinity") else text
+    # Anything with a quote is quoted before scalar() sees it: scalar() would
+    # read a leading '"' as the start of a quoted string and reject the rest
+    if (not value or value != value.strip() or any(c in value for c in '"\\:\n\r\t')
+            or value[0] in "-[{#" or (delimited and "," in value)):
+        return json.dumps(value, ensure_ascii=False)
+    parsed = scalar(value)
+    if not isinstance(parsed, str) or parsed != value:
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _table_fields(items: list):
+    """Field names when `items` is a non-empty list of flat objects with the same keys, else None."""
+    if not items or not all(isinstance(i, dict) and i for i in items):
+        return None
+    fields = list(items[0])
+    if any(set(i) != set(fields) or not all(_primitive(v) for v in i.values()) for i in items):
+        return None
+    return fields
+
+
+def _encode_array(key: str, items: list, indent: int, out: list):
+    pad = " " * indent
+    fields = _table_fields(items)
+    if all(_primitive(i) for i in items):
+        out.append(f"{pad}{key}[{len(items)}]:" + (" " + ",".join(_scalar_text(i, True) for i in items) if items else ""))
+    elif fields is not None:
+        out.append(f"{pad}{key}[{len(items)}]{{{','.join(_key(f) for f in fields)}}}:")
+        for item in items:
+            out.append(" " * (indent + INDENT_STEP) + ",".join(_scalar_text(item[f], True) for f in fields))
+    else:
+        out.append(f"{pad}{key}[{len(items)}]:")
+        for item in items:
+            _encode_item(item, indent + INDENT_STEP, out)
+
+
+def _encode_item(item, indent: int, out: list):
+    pad = " " * indent
+    if _primitive(item):
+        out.append(f"{pad}- {_scalar_text(item)}")
+    elif isinstance(item, list):
+        nested = []
+        _encode_array("", item, indent, nested)
+        nested[0] = f"{pad}- {nested[0].lstrip()}"
+        out.extend(nested)
+    elif not item:
+        out.append(f"{pad}-")
+    else:
+        # First field on the hyphen line, the rest aligned under it
+        fields = []
+        _encode_object(item, indent + INDENT_STEP, fields)
+        fields[0] = f"{pad}- {fields[0].lstrip()}"
+        out.extend(fields)
+
+
+def _encode_object(obj: dict, indent: int, out: list):
+    pad = " " * indent
+    for key, value in obj.items():
+        key = _key(key)
+        if isinstance(value, dict):
+            out.append(f"{pad}{key}:")
+            _encode_object(value, indent + INDENT_STEP, out)
+        elif isinstance(value, list):
+            _encode_array(key, value, indent, out)
+        elif _primitive(value):
+            out.append(f"{pad}{key}: {_scalar_text(value)}")
+        else:
+            raise TypeError(f"Object of type {type(value).__name__} is not TOON serializable")
+
+
+def dumps(value) -> str:
+    """Serialize a dict or list (of JSON-compatible values) as TOON."""
+    out = []
+    if isinstance(value, dict):
+        _encode_object(value, 0, out)
+    elif isinstance(value, list):
+        _encode_array("", value, 0, out)
+    else:
+        raise TypeError("TOON documents must be an object or an array")
+    return "\n".join(out)
+
+
+def from_json(text: str) -> str:
+    return dumps(json.loads(text))
+
+
+def to_json(text: str, indent: int = None) -> str:
+    return json.dumps(parse(text), indent=indent, ensure_ascii=False)
+
+
+# ─── Benchmark ──────────────────────────────────────
+def load_corpus(inputs: list = None) -> list:
+    """
+    (source style, value) for every distinct json/toon styled output in the
+    training data that parses as a document.
+    """
+    from extract_examples import expand_inputs, iter_records
+    from config import TRAINING_DATA_FILE
+
+    seen = set()
+    corpus = []
+    for record in iter_records(expand_inputs(inputs or [TRAINING_DATA_FILE])):
+        style, output = record.get("style"), record.get("output", "")
+        if style not in ("json", "toon") or output in seen:
+            continue
+        seen.add(output)
+        try:
+            value = json.loads(output) if style == "json" else parse(output)
+        except ValueError:
+            continue
+        if isinstance(value, (dict, list)) and value:
+            corpus.append((style, value))
+    return corpus
+
+
+def _time_per_doc(fn, items: list, repeat: int) -> float:
+    """Best-of-`repeat` microseconds per item."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            fn(item)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best / len(items) * 1e6, 2)
+
+
+def bench(inputs: list = None, repeat: int = 5) -> dict:
+    """Tokens (JSON compact / pretty vs TOON) and encode/decode speed over the corpus."""
+    from tokenizer import count_tokens, tokenizer_name
+
+    corpus = load_corpus(inputs)
+    if not corpus:
+        return {"documents": 0}
+
+    values = [v for _, v in corpus]
+    compact = [json.dumps(v, ensure_ascii=False, separators=(",", ":")) for v in values]
+    pretty = [json.dumps(v, ensure_ascii=False, indent=2) for v in values]
+    encoded = [dumps(v) for v in values]
+
+    by_source = {}
+    for (style, _), c, p, t in zip(corpus, compact, pretty, encoded):
+        totals = by_source.setdefault(style, {"documents": 0, "json_compact": 0, "json_pretty": 0, "toon": 0})
+        totals["documents"] += 1
+        totals["json_compact"] += count_tokens(c)
+        totals["json_pretty"] += count_tokens(p)
+        totals["toon"] += count_tokens(t)
+
+    tokens = {k: sum(s[k] for s in by_source.values()) for k in ("json_compact", "json_pretty", "toon")}
+    return {
+        "documents": len(values),
+        "tokenizer": tokenizer_name(),
+        "tokens": tokens,
+        "savings_vs_compact": round(1 - tokens["toon"] / tokens["json_compact"], 3),
+        "savings_vs_pretty": round(1 - tokens["toon"] / tokens["json_pretty"], 3),
+        "by_source": by_source,
+        "round_trip_failures": sum(1 for v, t in zip(values, encoded) if parse(t) != v),
+        "us_per_doc": {
+            "json_encode": _time_per_doc(lambda v: json.dumps(v, ensure_ascii=False, separators=(",", ":")),
+                                         values, repeat),
+            "toon_encode": _time_per_doc(dumps, values, repeat),
+            "json_decode": _time_per_doc(json.loads, compact, repeat),
+            "toon_decode": _time_per_doc(parse, encoded, repeat)
+        }
+    }
+
+
+def _read(path: str) -> str:
+    if not path or path == "-":
+        return sys.stdin.read()
+    with open(path, "r", encoding="utf-8-sig") as f:
+        return f.read()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TOON codec and JSON vs TOON benchmark")
+    sub = parser.add_subparsers(dest="command", required=True)
+    enc = sub.add_parser("encode", help="JSON -> TOON")
+    enc.add_argument("file", nargs="?", help="JSON file (default: stdin)")
+    dec = sub.add_parser("decode", help="TOON -> JSON")
+    dec.add_argument("file", nargs="?", help="TOON file (default: stdin)")
+    dec.add_argument("--indent", type=int, default=2)
+    bn = sub.add_parser("bench", help="Token counts and codec speed over json/toon styled outputs")
+    bn.add_argument("inputs", nargs="*", help="JSONL files (.gz/.zst ok), shard directories or globs")
+    bn.add_argument("--repeat", type=int, default=5, help="Timing repetitions (best is kept)")
+    bn.add_argument("--output", "-o", help="Also save the results as JSON")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "encode":
+            print(from_json(_read(args.file)))
+        elif args.command == "decode":
+            print(to_json(_read(args.file), indent=args.indent))
+        else:
+            results = bench(args.inputs, args.repeat)
+            if not results["documents"]:
+                print("No json/toon styled outputs found")
+                sys.exit(1)
+            tokens = results["tokens"]
+            print(f"Documents: {results['documents']} | Tokenizer: {results['tokenizer']}\n")
+            print(f"{'Format':14} {'Tokens':>9}")
+            print(f"{'JSON compact':14} {tokens['json_compact']:9}")
+            print(f"{'JSON pretty':14} {tokens['json_pretty']:9}")
+            print(f"{'TOON':14} {tokens['toon']:9}")
+            print(f"\nTOON saves {results['savings_vs_compact']:.1%} vs compact JSON, "
+                  f"{results['savings_vs_pretty']:.1%} vs pretty JSON")
+            for style, s in sorted(results["by_source"].items()):
+                print(f"  from {style} outputs ({s['documents']} docs): "
+                      f"{1 - s['toon'] / s['json_compact']:.1%} vs compact")
+            speed = results["us_per_doc"]
+            print(f"\nEncode: JSON {speed['json_encode']}us | TOON {speed['toon_encode']}us per doc")
+            print(f"Decode: JSON {speed['json_decode']}us | TOON {speed['toon_decode']}us per doc")
+            print(f"Round-trip failures: {results['round_trip_failures']}")
+            if args.output:
+                with open(args.output, "w", encoding="utf-8") as f:
+                    json.dump(results, f, indent=2)
+                print(f"Saved to {args.output}")
+    except (ValueError, TypeError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
@@ -0,0 +1,356 @@
+# Transport - Pooled HTTP layer for every Groq call
+# Keep-alive sessions (requests) with a configurable pool size, or HTTP/2
+# via httpx when GROQ_HTTP2=1 and httpx[http2] is installed.
+# Every response carries a `timing` dict split into connect / TTFB / total.
+# stream_chat() yields tokens over SSE and records TTFT / inter-token latency.
+# post_chat/stream_chat retry under the shared policy in retry_policy.py.
+
+import json
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from config import GROQ_API_URL, GROQ_POOL_SIZE, GROQ_HTTP2
+from rate_limiter import get_limiter, estimate_tokens, synced_tokens
+from token_budget import get_ledger
+from retry_policy import get_policy
+
+try:
+    import httpx
+    import h2  # noqa: F401  (httpx needs it for http2=True)
+except ImportError:
+    httpx = None
+
+# Connect time is measured inside urllib3's connection objects, which run on
+# the calling thread, so a thread-local hands it back to post().
+_local = threading.local()
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        _local.connect = getattr(_local, "connect", 0.0) + time.perf_counter() - start
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        # Covers TCP + TLS handshake
+        start = time.perf_counter()
+        super().connect()
+        _local.connect = getattr(_local, "connect", 0.0) + time.perf_counter() - start
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedAdapter(HTTPAdapter):
+    """HTTPAdapter whose pools use the timed connection classes."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool
+        }
+
+
+class ChatStream:
+    """
+    Iterator over the content deltas of a streamed (SSE) chat completion.
+    Metrics are filled in as tokens arrive; read them after iterating.
+    """
+
+    def __init__(self, response, start: float, lines):
+        self.response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.start = start
+        self._lines = lines
+        self.chunks = []
+        self.arrivals = []
+        self.usage = {}
+        self.end = None
+        # Called with a 200 stream once it is closed: read to the end, broken
+        # midway or abandoned by the caller
+        self.on_finish = None
+        self._closed = False
+
+    def __iter__(self):
+        try:
+            if self.status_code != 200:
+                self.end = time.perf_counter()
+                return
+            for line in self._lines:
+                if isinstance(line, bytes):
+                    line = line.decode("utf-8")
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    event = json.loads(data)
+                except ValueError:
+                    continue
+                # Groq reports usage on the last chunk under x_groq; OpenAI under usage
+                usage = event.get("usage") or (event.get("x_groq") or {}).get("usage")
+                if usage:
+                    self.usage = usage
+                for choice in event.get("choices", []):
+                    delta = (choice.get("delta") or {}).get("content")
+                    if delta:
+                        self.arrivals.append(time.perf_counter())
+                        self.chunks.append(delta)
+                        yield delta
+            self.end = time.perf_counter()
+        finally:
+            # Also on non-200s, errors mid-stream and abandoned iteration
+            self.close()
+
+    def close(self):
+        """Return the connection to the pool and run on_finish, once."""
+        if self._closed:
+            return
+        self._closed = True
+        if self.end is None:
+            self.end = time.perf_counter()
+        self.response.close()
+        if self.on_finish and self.status_code == 200:
+            self.on_finish(self)
+
+    @property
+    def text(self) -> str:
+        return "".join(self.chunks).strip()
+
+    def metrics(self) -> dict:
+        """TTFT, inter-token latency and throughput for the finished stream."""
+        end = self.end or time.perf_counter()
+        tokens = self.usage.get("completion_tokens") or len(self.chunks)
+        gaps = [b - a for a, b in zip(self.arrivals, self.arrivals[1:])]
+        gaps.sort()
+        ttft = self.arrivals[0] - self.start if self.arrivals else None
+        generation = end - self.arrivals[0] if self.arrivals else 0.0
+        return {
+            "ttft": ttft,
+            "total": end - self.start,
+            "tokens": tokens,
+            "inter_token_ms": round(sum(gaps) / len(gaps) * 1000, 2) if gaps else None,
+            "inter_token_p95_ms": round(gaps[int(len(gaps) * 0.95)] * 1000, 2) if gaps else None,
+            "tokens_per_sec": round(tokens / generation, 1) if generation > 0 else None
+        }
+
+
+class Transport:
+    """
+    One pooled client shared by GroqClient, apply_style, rate_output and
+    test_extension. Thread-safe: the connection pool is shared across threads.
+    """
+
+    def __init__(self, pool_size: int = GROQ_POOL_SIZE, http2: bool = GROQ_HTTP2):
+        self.pool_size = pool_size
+        self.http2 = bool(http2 and httpx is not None)
+        if http2 and not self.http2:
+            print("  HTTP/2 requested but httpx[http2] is not installed; using HTTP/1.1 keep-alive")
+
+        if self.http2:
+            self.client = httpx.Client(
+                http2=True,
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+            )
+        else:
+            self.client = requests.Session()
+            adapter = _TimedAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            self.client.mount("https://", adapter)
+            self.client.mount("http://", adapter)
+
+        self._stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "new_connections": 0, "connect": 0.0, "ttfb": 0.0, "total": 0.0}
+
+    def _post_requests(self, url: str, headers: dict, payload: dict, timeout: float):
+        _local.connect = 0.0
+        start = time.perf_counter()
+        # stream=True returns as soon as the headers are parsed -> TTFB
+        response = self.client.post(url, headers=headers, json=payload, timeout=timeout, stream=True)
+        ttfb = time.perf_counter() - start
+        response.content  # read the body
+        total = time.perf_counter() - start
+        return response, {"connect": _local.connect, "ttfb": ttfb, "total": total}
+
+    def _post_httpx(self, url: str, headers: dict, payload: dict, timeout: float):
+        marks = {}
+
+        def trace(event_name, info):
+            marks[event_name] = time.perf_counter()
+
+        start = time.perf_counter()
+        request = self.client.build_request(
+            "POST", url, headers=headers, json=payload, timeout=timeout,
+            extensions={"trace": trace}
+        )
+        response = self.client.send(request, stream=True)
+        ttfb = time.perf_counter() - start
+        response.read()
+        response.close()
+        total = time.perf_counter() - start
+
+        connect = 0.0
+        if "connection.connect_tcp.started" in marks:
+            end = marks.get("connection.start_tls.complete", marks.get("connection.connect_tcp.complete", start))
+            connect = end - marks["connection.connect_tcp.started"]
+        return response, {"connect": connect, "ttfb": ttfb, "total": total}
+
+    def post(self, payload: dict, api_key: str, timeout: float = 60, url: str = None):
+        """
+        POST a chat payload. Returns the response with a `timing` attribute:
+        {"connect": s, "ttfb": s, "total": s, "reused": bool}.
+        Connect is 0 when a pooled keep-alive connection was reused.
+        """
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+        post = self._post_httpx if self.http2 else self._post_requests
+        response, timing = post(url or GROQ_API_URL, headers, payload, timeout)
+        timing["reused"] = timing["connect"] == 0.0
+
+        with self._stats_lock:
+            self.stats["requests"] += 1
+            self.stats["new_connections"] += 0 if timing["reused"] else 1
+            for k in ("connect", "ttfb", "total"):
+                self.stats[k] += timing[k]
+
+        response.timing = timing
+        return response
+
+    def stream(self, payload: dict, api_key: str, timeout: float = 60, url: str = None) -> ChatStream:
+        """POST a chat payload with stream=True and return a ChatStream over its tokens."""
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream"
+        }
+        payload = dict(payload, stream=True)
+        start = time.perf_counter()
+
+        if self.http2:
+            request = self.client.build_request("POST", url or GROQ_API_URL, headers=headers,
+                                                json=payload, timeout=timeout)
+            response = self.client.send(request, stream=True)
+            if response.status_code != 200:
+                response.read()
+            return ChatStream(response, start, response.iter_lines())
+
+        response = self.client.post(url or GROQ_API_URL, headers=headers, json=payload,
+                                    timeout=timeout, stream=True)
+        return ChatStream(response, start, response.iter_lines())
+
+    def summary(self) -> dict:
+        """Average timings so far, and how many requests skipped the handshake."""
+        with self._stats_lock:
+            n = self.stats["requests"]
+            if not n:
+                return {"requests": 0}
+            new = self.stats["new_connections"]
+            return {
+                "requests": n,
+                "new_connections": new,
+                "reused_connections": n - new,
+                "avg_connect_ms": round(self.stats["connect"] / max(new, 1) * 1000, 1),
+                "avg_ttfb_ms": round(self.stats["ttfb"] / n * 1000, 1),
+                "avg_total_ms": round(self.stats["total"] / n * 1000, 1),
+                "http2": self.http2
+            }
+
+    def close(self):
+        self.client.close()
+
+
+# Singleton
+_transport = None
+_transport_lock = threading.Lock()
+
+def get_transport() -> Transport:
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = Transport()
+    return _transport
+
+
+def _post_once(payload: dict, api_key: str, timeout: float, url: str):
+    limiter = get_limiter(api_key)
+    ledger = get_ledger()
+    prompt_tokens = estimate_tokens(payload)
+    held = ledger.reserve(api_key, prompt_tokens, payload.get("max_tokens"))
+    limiter.acquire(prompt_tokens)
+
+    try:
+        response = get_transport().post(payload, api_key, timeout=timeout, url=url)
+    except Exception:
+        ledger.release(api_key, held)
+        raise
+    limiter.observe(response, prompt_tokens)
+    ledger.record_response(api_key, held, prompt_tokens, response)
+    return response
+
+
+def post_chat(payload: dict, api_key: str, timeout: float = 60, url: str = None, max_attempts: int = None):
+    """
+    Rate-limited (per key) chat completion POST over the shared pooled transport.
+    429s, 5xx and network errors are retried under the shared retry policy
+    (max_attempts=1 sends once). Raises BudgetExceeded if the request would
+    go over the token budget.
+    """
+    return get_policy().run(lambda: _post_once(payload, api_key, timeout, url), url or GROQ_API_URL,
+                            max_attempts)
+
+
+def _stream_once(payload: dict, api_key: str, timeout: float, url: str) -> ChatStream:
+    limiter = get_limiter(api_key)
+    ledger = get_ledger()
+    reserved = estimate_tokens(payload)
+    held = ledger.reserve(api_key, reserved, payload.get("max_tokens"))
+    limiter.acquire(reserved)
+
+    try:
+        stream = get_transport().stream(payload, api_key, timeout=timeout, url=url)
+    except Exception:
+        ledger.release(api_key, held)
+        raise
+    if stream.status_code == 429:
+        limiter.observe(stream.response, reserved)
+    else:
+        limiter.update_from_headers(stream.headers)
+    if stream.status_code != 200:
+        ledger.release(api_key, held)
+
+    # Also runs for a stream that broke or was abandoned: its reservation must not stay in flight
+    def charge(finished):
+        if "total_tokens" in finished.usage:
+            limiter.record_usage(reserved, finished.usage["total_tokens"], synced_tokens(stream.headers))
+        ledger.record_stream(api_key, held, reserved, finished)
+
+    stream.on_finish = charge
+    return stream
+
+
+def stream_chat(payload: dict, api_key: str, timeout: float = 60, url: str = None,
+                max_attempts: int = None) -> ChatStream:
+    """
+    Rate-limited streaming chat completion. Iterate the result for tokens;
+    the limiter and token ledger are charged with the reported usage once
+    the stream ends (or with what arrived, if it breaks or is abandoned;
+    call close() on a stream that is never iterated). Failures before the
+    first byte are retried like post_chat; a stream that breaks midway is
+    not. Raises BudgetExceeded like post_chat.
+    """
+    return get_policy().run(lambda: _stream_once(payload, api_key, timeout, url), url or GROQ_API_URL,
+                            max_attempts, discard=lambda stream: stream.close())
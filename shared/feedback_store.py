@@ -0,0 +1,303 @@
+"""
+PromptStyler Feedback Store - Python port of shared/db.js + shared/smart_prompt.js
+
+Stores refinements and their feedback signals (rating, copied, used, edited)
+in SQLite, like the extension does in IndexedDB, and builds the same
+"USER'S PREFERRED EXAMPLES" few-shot block that smart_prompt.js appends to
+the system prompt.
+
+Top examples for a style come straight off a partial compound index on
+(style, was_edited, rating, timestamp) that only holds positive records, so
+a lookup reads `limit` index entries instead of scanning and sorting every
+record of the style. The few-shot block is cached per style and rebuilt
+only after a write that touches that style (or a write by another process,
+detected with PRAGMA data_version).
+
+Usage:
+    store = FeedbackStore("output/feedback.sqlite")
+    record_id = store.save_refinement("raw prompt", "styled prompt", "PROFESSIONAL")
+    store.update_feedback(record_id, rating=1)
+    prompt = store.build_prompt(SYSTEM_PROMPT, "PROFESSIONAL")
+"""
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import threading
+
+DEFAULT_PATH = "output/feedback.sqlite"
+
+DAY_MS = 24 * 60 * 60 * 1000
+POSITIVE_MAX_AGE_MS = 90 * DAY_MS       # liked / copied / used, not edited
+OTHER_MAX_AGE_MS = 30 * DAY_MS          # negative or no feedback
+
+INPUT_CHARS = 200
+OUTPUT_CHARS = 500
+
+FEEDBACK_FIELDS = ("rating", "was_edited", "edited_version", "was_copied", "was_used")
+COLUMNS = ("id", "timestamp", "input_prompt", "output_prompt", "style") + FEEDBACK_FIELDS
+
+# A record counts as a good example if it has any positive signal (same test as getTopExamples)
+POSITIVE = "(rating = 1 OR was_copied = 1 OR was_used = 1 OR was_edited = 1)"
+
+SEPARATOR = "-----------------------------------------------"
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def truncate(text: str, max_len: int) -> str:
+    """Truncate text to max_len characters with an ellipsis."""
+    if not text or len(text) <= max_len:
+        return text or ""
+    return text[:max_len] + "..."
+
+
+def format_examples(examples: list) -> str:
+    """The few-shot context smart_prompt.js appends for a list of records ('' if none)."""
+    if not examples:
+        return ""
+    parts = [
+        f"\n\n{SEPARATOR}\n",
+        "USER'S PREFERRED EXAMPLES FOR THIS STYLE\n",
+        f"{SEPARATOR}\n",
+        "The user has rated these as good outputs. Match their preferences:\n\n"
+    ]
+    for i, ex in enumerate(examples):
+        # Edited version is the gold standard when there is one
+        preferred = ex["edited_version"] if ex["was_edited"] and ex["edited_version"] else ex["output_prompt"]
+        parts.append(f"Example {i + 1}:\n")
+        parts.append(f"Input: {truncate(ex['input_prompt'], INPUT_CHARS)}\n")
+        parts.append(f"Output: {truncate(preferred, OUTPUT_CHARS)}\n")
+        if ex["was_edited"]:
+            parts.append("(Note: User manually edited this output — treat as gold standard)\n")
+        parts.append("\n")
+    parts.append("Adapt your style to match these user preferences while following the style rules above.\n")
+    return "".join(parts)
+
+
+class FeedbackStore:
+    """
+    Refinement feedback in SQLite, with cached few-shot blocks per style.
+    Styles are stored upper-case, as the extension sends them.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = path
+        self._blocks = {}           # (style, limit) -> few-shot block
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS refinements (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp INTEGER NOT NULL,
+                input_prompt TEXT NOT NULL DEFAULT '',
+                output_prompt TEXT NOT NULL DEFAULT '',
+                style TEXT NOT NULL,
+                rating INTEGER NOT NULL DEFAULT 0,
+                was_edited INTEGER NOT NULL DEFAULT 0,
+                edited_version TEXT NOT NULL DEFAULT '',
+                was_copied INTEGER NOT NULL DEFAULT 0,
+                was_used INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        # Top-k: walk this index backwards and stop after `limit` rows
+        self.db.execute(f"""
+            CREATE INDEX IF NOT EXISTS idx_top_examples
+            ON refinements (style, was_edited, rating, timestamp) WHERE {POSITIVE}
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_style_rating ON refinements (style, rating)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_timestamp ON refinements (timestamp)")
+        self._data_version = self._version()
+
+    def _version(self) -> int:
+        return self.db.execute("PRAGMA data_version").fetchone()[0]
+
+    def _invalidate(self, styles=None):
+        """Drop cached blocks for `styles` (all styles if None). Caller holds the lock."""
+        if styles is None:
+            self._blocks.clear()
+            return
+        for key in [k for k in self._blocks if k[0] in styles]:
+            del self._blocks[key]
+
+    # ─── Writes ──────────────────────────────────────────
+
+    def save_refinement(self, input_prompt: str, output_prompt: str, style: str = "PROFESSIONAL") -> int:
+        """Store a refinement with no feedback yet. Returns its id."""
+        style = (style or "PROFESSIONAL").upper()
+        with self._lock:
+            cursor = self.db.execute(
+                "INSERT INTO refinements (timestamp, input_prompt, output_prompt, style) VALUES (?, ?, ?, ?)",
+                (_now_ms(), input_prompt or "", output_prompt or "", style)
+            )
+            # No feedback yet, so cached blocks are still right
+            return cursor.lastrowid
+
+    def add_rated(self, rows: list) -> int:
+        """
+        Store already-rated refinements in one transaction, e.g. pipeline rows
+        ({"input", "output", "style", "label"}): DO is a thumbs up, anything
+        else a thumbs down. Returns the number stored.
+        """
+        now = _now_ms()
+        values = [
+            (now, row.get("input", ""), row.get("output", ""), (row.get("style") or "PROFESSIONAL").upper(),
+             1 if row.get("label") == "DO" else -1)
+            for row in rows
+        ]
+        if not values:
+            return 0
+        with self._lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                self.db.executemany(
+                    "INSERT INTO refinements (timestamp, input_prompt, output_prompt, style, rating) "
+                    "VALUES (?, ?, ?, ?, ?)", values
+                )
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+            self._invalidate({v[3] for v in values if v[4] == 1})
+        return len(values)
+
+    def update_feedback(self, record_id: int, **updates) -> dict:
+        """
+        Merge feedback into a record (rating, was_edited, edited_version,
+        was_copied, was_used). Returns the updated record.
+        """
+        unknown = set(updates) - set(FEEDBACK_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown feedback fields: {', '.join(sorted(unknown))}")
+        fields = [(name, value) for name, value in updates.items() if value is not None]
+
+        with self._lock:
+            record = self._get(record_id)
+            if record is None:
+                raise KeyError(f"Record {record_id} not found")
+            if fields:
+                assignments = ", ".join(f"{name} = ?" for name, _ in fields)
+                values = [int(v) if isinstance(v, bool) else v for _, v in fields]
+                self.db.execute(f"UPDATE refinements SET {assignments} WHERE id = ?", values + [record_id])
+                record.update(fields)
+                self._invalidate({record["style"]})
+        return record
+
+    def cleanup(self, now: int = None) -> int:
+        """
+        Age-based pruning, as db.js does on init: edited records are kept,
+        positive ones for 90 days, negative or unrated ones for 30.
+        Returns the number of records deleted.
+        """
+        now = now if now is not None else _now_ms()
+        with self._lock:
+            deleted = self.db.execute(f"""
+                DELETE FROM refinements WHERE was_edited = 0 AND (
+                    ({POSITIVE} AND timestamp < ?) OR (NOT {POSITIVE} AND timestamp < ?)
+                )
+            """, (now - POSITIVE_MAX_AGE_MS, now - OTHER_MAX_AGE_MS)).rowcount
+            if deleted:
+                self._invalidate()
+        return deleted
+
+    def clear_all(self):
+        with self._lock:
+            self.db.execute("DELETE FROM refinements")
+            self._invalidate()
+
+    # ─── Reads ───────────────────────────────────────────
+
+    def _get(self, record_id: int) -> dict:
+        row = self.db.execute(f"SELECT {', '.join(COLUMNS)} FROM refinements WHERE id = ?",
+                              (record_id,)).fetchone()
+        return dict(zip(COLUMNS, row)) if row else None
+
+    def _top_examples(self, style: str, limit: int) -> list:
+        rows = self.db.execute(f"""
+            SELECT {', '.join(COLUMNS)} FROM refinements INDEXED BY idx_top_examples
+            WHERE style = ? AND {POSITIVE}
+            ORDER BY was_edited DESC, rating DESC, timestamp DESC
+            LIMIT ?
+        """, (style.upper(), limit)).fetchall()
+        return [dict(zip(COLUMNS, row)) for row in rows]
+
+    def get_top_examples(self, style: str, limit: int = 3) -> list:
+        """Positive records for a style: edited (gold) first, then by rating, then newest."""
+        with self._lock:
+            return self._top_examples(style, limit)
+
+    def few_shot_block(self, style: str, limit: int = 3) -> str:
+        """The cached few-shot context for a style ('' when it has no positive examples)."""
+        key = (style.upper(), limit)
+        with self._lock:
+            self.lookups += 1
+            version = self._version()
+            if version != self._data_version:
+                # Another connection (e.g. a shard process) wrote since we last looked
+                self._data_version = version
+                self._invalidate()
+            block = self._blocks.get(key)
+            if block is None:
+                block = self._blocks[key] = format_examples(self._top_examples(style, limit))
+            else:
+                self.hits += 1
+            return block
+
+    def build_prompt(self, base_prompt: str, style: str, limit: int = 3) -> str:
+        """base_prompt plus the style's few-shot block (SmartPromptBuilder.build)."""
+        return base_prompt + self.few_shot_block(style, limit)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            by_style = dict(self.db.execute("SELECT style, COUNT(*) FROM refinements GROUP BY style").fetchall())
+            positive, negative, edited = self.db.execute("""
+                SELECT COALESCE(SUM(rating = 1), 0), COALESCE(SUM(rating = -1), 0),
+                       COALESCE(SUM(was_edited = 1), 0)
+                FROM refinements
+            """).fetchone()
+        return {"total": sum(by_style.values()), "byStyle": by_style,
+                "positive": positive, "negative": negative, "edited": edited}
+
+
+# One store per database file
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_store(path: str = DEFAULT_PATH) -> FeedbackStore:
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = FeedbackStore(path)
+        return _stores[path]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PromptStyler feedback store")
+    parser.add_argument("command", choices=["stats", "examples", "cleanup", "clear"])
+    parser.add_argument("--db", default=DEFAULT_PATH, help=f"Database file (default {DEFAULT_PATH})")
+    parser.add_argument("--style", default="PROFESSIONAL", help="Style for 'examples'")
+    parser.add_argument("-k", type=int, default=3, help="Examples to show")
+    args = parser.parse_args()
+
+    store = FeedbackStore(args.db)
+    if args.command == "stats":
+        stats = store.get_stats()
+        print(f"{stats['total']} records | {stats['positive']} positive | {stats['negative']} negative | "
+              f"{stats['edited']} edited")
+        for style, n in sorted(stats["byStyle"].items()):
+            print(f"  {style:14} {n}")
+    elif args.command == "examples":
+        sys.stdout.write(store.few_shot_block(args.style, args.k) or f"No positive examples for {args.style}\n")
+    elif args.command == "cleanup":
+        print(f"Deleted {store.cleanup()} old records")
+    else:
+        store.clear_all()
+        print("Cleared all records")